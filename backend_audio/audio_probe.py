@@ -0,0 +1,197 @@
+"""Module aim to measure the exact duration of the synthesized audio,
+counting the samples of each MP3 frame instead of estimating it from the bitrate
+"""
+from typing import Iterator, List, Optional, Tuple
+import logging
+import subprocess
+import wave
+
+# bitrates in kbps indexed by [MPEG-1?][layer][bitrate index]
+BITRATES = {
+    True:  {1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+            2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+            3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)},
+    False: {1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+            2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+            3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)},
+}
+# sample rates indexed by the version bits: 0 MPEG-2.5, 2 MPEG-2, 3 MPEG-1
+SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+HEADER_SIZE = 4
+ID3V2_HEADER_SIZE = 10
+
+logger = logging.getLogger(__name__)
+
+class Mp3Frame: #pylint: disable=R0903
+    """Position and decoding parameters of a single MP3 frame."""
+    __slots__ = ("offset", "size", "samples", "sample_rate", "mpeg1", "mono")
+    def __init__(self, offset:int, size:int, samples:int, #pylint: disable=R0913,R0917
+                 sample_rate:int, mpeg1:bool, mono:bool):
+        self.offset = offset
+        self.size = size
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.mpeg1 = mpeg1
+        self.mono = mono
+
+def parse_frame_header(data:bytes, offset:int) -> Optional[Mp3Frame]:
+    """Parse the MP3 frame header at offset.
+
+    Arguments:
+        data: The MP3 file content.
+        offset: The position of the frame sync word.
+
+    Returns:
+        The frame, None if there is no valid frame header at offset.
+    """
+    if offset + HEADER_SIZE > len(data):
+        return None
+    header = int.from_bytes(data[offset:offset + HEADER_SIZE], "big")
+    version, layer = (header >> 19) & 3, 4 - ((header >> 17) & 3)
+    bitrate_idx, rate_idx = (header >> 12) & 15, (header >> 10) & 3
+    if header >> 21 != 0x7FF or version == 1 or layer == 4 or rate_idx == 3 \
+            or bitrate_idx in (0, 15):
+        return None
+    mpeg1 = version == 3
+    bitrate = BITRATES[mpeg1][layer][bitrate_idx] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_idx]
+    padding = (header >> 9) & 1
+    if layer == 1:
+        return Mp3Frame(offset, (12 * bitrate // sample_rate + padding) * 4, 384,
+                        sample_rate, mpeg1, (header >> 6) & 3 == 3)
+    samples = 1152 if mpeg1 or layer == 2 else 576
+    return Mp3Frame(offset, samples // 8 * bitrate // sample_rate + padding, samples,
+                    sample_rate, mpeg1, (header >> 6) & 3 == 3)
+
+def skip_id3v2(data:bytes) -> int:
+    """Get the offset of the first byte after the ID3v2 tag, 0 if there is no tag."""
+    offset = 0
+    while data[offset:offset + 3] == b"ID3" and len(data) >= offset + ID3V2_HEADER_SIZE:
+        size = 0
+        for byte in data[offset + 6:offset + 10]: # syncsafe integer
+            size = (size << 7) | (byte & 0x7F)
+        footer = ID3V2_HEADER_SIZE if data[offset + 5] & 0x10 else 0
+        offset += ID3V2_HEADER_SIZE + size + footer
+    return offset
+
+def iter_mp3_frames(data:bytes) -> Iterator[Mp3Frame]:
+    """Iterate over the MP3 frames, skipping tags and garbage between frames.
+
+    Arguments:
+        data: The MP3 file content.
+
+    Yields:
+        The frames in file order.
+    """
+    offset = skip_id3v2(data)
+    while offset + HEADER_SIZE <= len(data):
+        frame = parse_frame_header(data, offset)
+        if frame is None or offset + frame.size > len(data):
+            offset = data.find(b"\xff", offset + 1) # resync
+            if offset < 0:
+                return
+            continue
+        yield frame
+        offset += frame.size
+
+def get_gapless_info(data:bytes, frame:Mp3Frame) -> Optional[Tuple[int, int]]:
+    """Read the Xing/Info header of the first frame, written by LAME and most encoders.
+
+    Arguments:
+        data: The MP3 file content.
+        frame: The first frame.
+
+    Returns:
+        None if frame is an audio frame, else the (delay, padding) samples
+        added by the encoder, that decoders trim.
+    """
+    side_info = (32 if not frame.mono else 17) if frame.mpeg1 else (17 if not frame.mono else 9)
+    xing = frame.offset + HEADER_SIZE + side_info
+    if data[xing:xing + 4] not in (b"Xing", b"Info"):
+        return None
+    flags = int.from_bytes(data[xing + 4:xing + 8], "big")
+    lame = xing + 8 + sum(size for bit, size in ((1, 4), (2, 4), (4, 100), (8, 4))
+                          if flags & bit)
+    if data[lame:lame + 4] not in (b"LAME", b"Lavc", b"Lavf"):
+        return 0, 0
+    delay_padding = int.from_bytes(data[lame + 21:lame + 24], "big")
+    return delay_padding >> 12, delay_padding & 0xFFF
+
+def iter_audio_frames(data:bytes) -> Iterator[memoryview]:
+    """Iterate over the audio frames of an MP3 file, without tags and without the
+    Xing/Info frame, so that the frames of many files can be joined in a valid MP3 stream.
+
+    Arguments:
+        data: The MP3 file content.
+
+    Yields:
+        A view on each audio frame, in file order.
+    """
+    view = memoryview(data)
+    frames = iter_mp3_frames(data)
+    first = next(frames, None)
+    if first is None:
+        return
+    if get_gapless_info(data, first) is None:
+        yield view[first.offset:first.offset + first.size]
+    for frame in frames:
+        yield view[frame.offset:frame.offset + frame.size]
+
+def get_mp3_samples(data:bytes) -> Tuple[int, int]:
+    """Count the samples a decoder outputs for an MP3 file.
+
+    Arguments:
+        data: The MP3 file content.
+
+    Returns:
+        A tuple of the number of samples per channel and the sample rate,
+        (0, 0) if data is not MP3.
+    """
+    frames = iter_mp3_frames(data)
+    first = next(frames, None)
+    if first is None:
+        return 0, 0
+    gapless = get_gapless_info(data, first)
+    samples = 0 if gapless is not None else first.samples
+    samples += sum(frame.samples for frame in frames)
+    if gapless is not None:
+        samples = max(0, samples - sum(gapless))
+    return samples, first.sample_rate
+
+def __get_duration_wave(audio_path:str) -> float:
+    with wave.open(audio_path, "rb") as wave_file:
+        return wave_file.getnframes() / wave_file.getframerate()
+
+def __get_duration_ffprobe(audio_path:str) -> Optional[float]:
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+               "-of", "default=noprint_wrappers=1:nokey=1", audio_path]
+    try:
+        process = subprocess.run(command, capture_output=True, check=True, text=True)
+        return float(process.stdout.strip())
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        logger.warning("cannot read the duration of %s", audio_path)
+        return None
+
+def get_duration(audio_path:str) -> Optional[float]:
+    """Get the exact duration of an audio file: MP3 frames are counted,
+    WAV (written by some pyttsx3 drivers whatever the extension) is read from its header,
+    other formats are measured by ffprobe.
+
+    Arguments:
+        audio_path: The path of the audio file.
+
+    Returns:
+        The duration in seconds, None if it cannot be read.
+    """
+    with open(audio_path, "rb") as audio_file:
+        data = audio_file.read()
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return __get_duration_wave(audio_path)
+    samples, sample_rate = get_mp3_samples(data)
+    if sample_rate > 0:
+        return samples / sample_rate
+    return __get_duration_ffprobe(audio_path)
+
+def get_durations(audio_paths:List[str]) -> List[Optional[float]]:
+    """Get the exact duration in seconds of each audio file."""
+    return [get_duration(audio_path) for audio_path in audio_paths]
@@ -0,0 +1,183 @@
+"""Module aim to keep the TTS engines behind one interface: each engine is registered
+by name with the capabilities the rest of the pipeline needs to drive it
+"""
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import abc
+import asyncio
+import io
+import math
+import struct
+import wave
+from backend_audio import audio_probe
+from backend_audio import chunker
+
+WORKERS_THREADS = "threads"
+WORKERS_PROCESSES = "processes"
+WORKERS_ASYNCIO = "asyncio"
+
+FORMAT_MP3 = "mp3"
+FORMAT_WAV = "wav"
+
+# the offline NULL engine reads at this speed a quiet sine tone
+NULL_CHARS_PER_SECOND = 15
+NULL_SAMPLE_RATE = 16000
+NULL_FREQUENCY = 440
+NULL_AMPLITUDE = 0.1
+
+class Capabilities(NamedTuple):
+    """What a TTS engine accepts and how it may be driven."""
+    max_chars: int          # the longest text of a single request
+    max_concurrency: int    # the requests in flight the engine tolerates
+    output_format: str      # FORMAT_MP3 or FORMAT_WAV, whatever the file extension
+    workers: str            # WORKERS_THREADS, WORKERS_PROCESSES or WORKERS_ASYNCIO
+    offline: bool           # True if the engine needs no network
+
+class TtsBackend(abc.ABC):
+    """A TTS engine. Subclasses implement synthesize_batch, and synthesize when the
+    engine can save a whole text better than by joining its chunks."""
+    name = ""
+    capabilities = Capabilities(chunker.DEFAULT_MAX_CHARS, 1, FORMAT_MP3, WORKERS_THREADS, False)
+
+    def setup(self, cache_dir:Optional[str]=None) -> None:
+        """Initialize the engine in the calling process.
+
+        Arguments:
+            cache_dir: The directory where the engine may keep data between runs.
+        """
+
+    def get_voice(self, lang:str) -> Tuple[str, str]:
+        """Get what identifies the sound of the audio, for the audio cache key.
+
+        Arguments:
+            lang: The desired language abbreviation.
+
+        Returns:
+            The voice ID and the other engine settings.
+        """
+        return lang, ""
+
+    @abc.abstractmethod
+    def synthesize_batch(self, chunks:Iterable[str], *, lang:str="it"
+                         ) -> Iterator[Optional[bytes]]:
+        """Synthesize many chunks, each one no longer than capabilities.max_chars.
+
+        Arguments:
+            chunks: The texts used to generate the TTS.
+            lang: The desired language abbreviation.
+
+        Yields:
+            The audio of each chunk in capabilities.output_format, in the same order,
+            None where it was not synthesized.
+        """
+
+    async def synthesize_async(self, text_in:str, out_path:str, *, lang:str="it") -> bool:
+        """Synthesize a whole text in a file from a running event loop, as the asyncio
+        workers do; by default synthesize runs in a thread of the loop executor.
+
+        Arguments:
+            text_in: The text used to generate the TTS.
+            out_path: The path to save the result audio file.
+            lang: The desired language abbreviation.
+
+        Returns:
+            True if the function succesfully saves the audio file.
+        """
+        return await asyncio.to_thread(self.synthesize, text_in, out_path, lang=lang)
+
+    def synthesize(self, text_in:str, out_path:str, *, lang:str="it") -> bool:
+        """Synthesize a whole text in a file, by default the joined audio of its chunks.
+
+        Arguments:
+            text_in: The text used to generate the TTS.
+            out_path: The path to save the result audio file.
+            lang: The desired language abbreviation.
+
+        Returns:
+            True if the function succesfully saves the audio file.
+        """
+        chunks = chunker.iter_chunks(text_in, self.capabilities.max_chars)
+        audio = [data for data in self.synthesize_batch(chunks, lang=lang) if data is not None]
+        if len(audio) == 0:
+            return False
+        with open(out_path, "wb") as audio_file:
+            if self.capabilities.output_format == FORMAT_WAV:
+                write_wav(audio_file, audio)
+            else:
+                for data in audio:
+                    for frame in audio_probe.iter_audio_frames(data):
+                        audio_file.write(frame)
+        return True
+
+def write_wav(audio_file:io.BufferedIOBase, audio:List[bytes]) -> None:
+    """Join WAV files with the same format in a single WAV file.
+
+    Arguments:
+        audio_file: The binary file to write.
+        audio: The content of each WAV file.
+    """
+    with wave.Wave_write(audio_file) as out_wave:
+        for idx, data in enumerate(audio):
+            with wave.Wave_read(io.BytesIO(data)) as in_wave:
+                if idx == 0:
+                    out_wave.setparams(in_wave.getparams())
+                out_wave.writeframes(in_wave.readframes(in_wave.getnframes()))
+
+class NullBackend(TtsBackend):
+    """Offline engine reading any text as a quiet sine tone, lasting as long as
+    a voice would, to run and benchmark the pipeline without a real TTS engine."""
+    name = "NULL"
+    capabilities = Capabilities(4096, 64, FORMAT_WAV, WORKERS_THREADS, True)
+
+    def __init__(self):
+        # one second holds a whole number of periods: longer tones repeat it
+        step = 2 * math.pi * NULL_FREQUENCY / NULL_SAMPLE_RATE
+        self.__tone_second = struct.pack(f"<{NULL_SAMPLE_RATE}h", *(
+            int(NULL_AMPLITUDE * 32767 * math.sin(step * idx))
+            for idx in range(NULL_SAMPLE_RATE)))
+
+    def synthesize_batch(self, chunks:Iterable[str], *, lang:str="it"
+                         ) -> Iterator[Optional[bytes]]:
+        for chunk in chunks:
+            samples = len(chunk) * NULL_SAMPLE_RATE // NULL_CHARS_PER_SECOND
+            repeat = samples // NULL_SAMPLE_RATE + 1
+            wav_data = io.BytesIO()
+            with wave.Wave_write(wav_data) as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(NULL_SAMPLE_RATE)
+                wav_file.writeframes((self.__tone_second * repeat)[:samples * 2])
+            yield wav_data.getvalue()
+
+registry: Dict[str, TtsBackend] = {}
+
+def register_backend(backend:TtsBackend) -> TtsBackend:
+    """Make a TTS engine available by its name.
+
+    Arguments:
+        backend: The engine, its name must be unique.
+
+    Returns:
+        The same engine.
+    """
+    registry[backend.name] = backend
+    return backend
+
+def get_backend(name:str) -> TtsBackend:
+    """Get a registered TTS engine.
+
+    Arguments:
+        name: The string name of the TTS engine.
+
+    Returns:
+        The engine.
+
+    Raises:
+        ValueError: If no engine is registered with that name.
+    """
+    try:
+        return registry[name]
+    except KeyError:
+        raise ValueError(f"unknown TTS backend {name}, "
+                         f"available: {', '.join(sorted(registry))}") from None
+
+register_backend(NullBackend())
@@ -0,0 +1,156 @@
+"""Module aim to keep the synthesized audio on disk, addressed by its content,
+so the same text is never sent twice to the same TTS engine
+"""
+from typing import Optional
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "write2audiobook")
+DEFAULT_MAX_SIZE = 2 * 1024**3 # bytes
+EVICT_RATIO = 0.9 # an eviction frees the cache down to this fraction of its cap
+AUDIO_EXT = ".mp3" # by default, the entries of a WAV engine end with ".wav"
+PART_EXT = ".part"
+
+REGEX_SPACES = re.compile(r"\s+")
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text_in:str) -> str:
+    """Normalize the text so that differences not audible by the TTS share the same key.
+
+    Arguments:
+        text_in: The text used to generate the TTS.
+
+    Returns:
+        The text with collapsed white spaces.
+    """
+    return REGEX_SPACES.sub(" ", text_in).strip()
+
+def get_cache_key(text_in:str, *, backend:str, voice:str,
+                  lang:str, settings:str="") -> str:
+    """Get the content address of an audio.
+
+    Arguments:
+        text_in: The text used to generate the TTS.
+        backend: The string name of the TTS engine.
+        voice: The TTS engine voice ID.
+        lang: The desired language abbreviation.
+        settings: Any other engine setting that changes the audio.
+
+    Returns:
+        The SHA-256 hex digest of all the arguments.
+    """
+    hasher = hashlib.sha256()
+    for field in (backend, voice, lang, settings, normalize_text(text_in)):
+        hasher.update(field.encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+class AudioCache:
+    """On-disk audio store with least recently used eviction under a size cap:
+    the size is tracked as files are stored, the directory is only walked to evict."""
+    def __init__(self, cache_dir:str=DEFAULT_CACHE_DIR, max_size:int=DEFAULT_MAX_SIZE):
+        """
+        Arguments:
+            cache_dir: The directory where the audio files are stored.
+            max_size: The maximum size in bytes of the stored audio files.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.__size = None # walked at the first put
+        self.__lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __get_path(self, key:str, audio_ext:str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + audio_ext)
+
+    def get(self, key:str, out_mp3_path:str, audio_ext:str=AUDIO_EXT) -> bool:
+        """Copy the cached audio, if any, to out_mp3_path.
+
+        Arguments:
+            key: The content address of the audio.
+            out_mp3_path: The path to save the audio file.
+            audio_ext: The extension of the audio format, e.g. ".wav".
+
+        Returns:
+            True if the audio was found in cache.
+        """
+        cached_path = self.__get_path(key, audio_ext)
+        try:
+            shutil.copyfile(cached_path, out_mp3_path)
+            os.utime(cached_path) # mark it as recently used
+        except FileNotFoundError:
+            return False
+        logger.debug("cache hit %s", key)
+        return True
+
+    def put(self, key:str, mp3_path:str, audio_ext:str=AUDIO_EXT) -> None:
+        """Store a copy of mp3_path under key and evict the oldest entries
+        when the cache grows over its cap.
+
+        Arguments:
+            key: The content address of the audio.
+            mp3_path: The path of the synthesized audio file.
+            audio_ext: The extension of the audio format, e.g. ".wav".
+        """
+        cached_path = self.__get_path(key, audio_ext)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cached_path), suffix=PART_EXT)
+        os.close(fd)
+        shutil.copyfile(mp3_path, temp_path)
+        with self.__lock:
+            if self.__size is None:
+                self.__size = self.size()
+            with contextlib.suppress(FileNotFoundError):
+                self.__size -= os.stat(cached_path).st_size
+            os.replace(temp_path, cached_path)
+            self.__size += os.stat(cached_path).st_size
+            over_cap = self.__size > self.max_size
+        if over_cap:
+            self.evict(int(self.max_size * EVICT_RATIO))
+
+    def size(self) -> int:
+        """Get the size in bytes of all the stored audio files, walking the cache directory."""
+        return sum(entry.st_size for _, entry in self.__iter_entries())
+
+    def __iter_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(PART_EXT):
+                    path = os.path.join(root, file_name)
+                    try:
+                        yield path, os.stat(path)
+                    except FileNotFoundError:
+                        continue # removed by a concurrent eviction
+
+    def evict(self, max_size:Optional[int]=None) -> int:
+        """Remove the least recently used audio files until the cache fits max_size.
+
+        Arguments:
+            max_size: The size in bytes to fit, by default the cache cap.
+
+        Returns:
+            The number of removed audio files.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        with self.__lock:
+            entries = sorted(self.__iter_entries(), key=lambda entry: entry[1].st_mtime)
+            total = sum(stat.st_size for _, stat in entries)
+            removed = 0
+            for path, stat in entries:
+                if total <= max_size:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                total -= stat.st_size
+                removed += 1
+            self.__size = total
+        if removed:
+            logger.debug("cache evicted %d files", removed)
+        return removed
@@ -0,0 +1,95 @@
+"""Module aim to split a long text in chunks accepted by the TTS engines,
+cutting preferably between paragraphs, then sentences, then clauses, then words
+"""
+from typing import Generator, IO, Iterator
+import re
+import gtts
+
+MAX_CHARS_BACKEND = {"GTTS": gtts.gTTS.GOOGLE_TTS_MAX_CHARS,
+                     "EDGE_TTS": 4096,
+                     "PYTTS": 20000}
+DEFAULT_MAX_CHARS = gtts.gTTS.GOOGLE_TTS_MAX_CHARS
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# boundaries from the preferred to the least preferred, a chunk ends with the match
+BOUNDARIES = (re.compile(r"\n\s*\n"),
+              re.compile(r"[.!?…]+[\"'»”’)\]]*\s+"),
+              re.compile(r"[,;:—–]\s+"),
+              re.compile(r"\s+"))
+
+def get_max_chars(backend:str) -> int:
+    """Get the maximum length of a chunk accepted by a TTS engine.
+
+    Arguments:
+        backend: The string name of the TTS engine.
+
+    Returns:
+        The maximum number of characters of a chunk.
+    """
+    return MAX_CHARS_BACKEND.get(backend, DEFAULT_MAX_CHARS)
+
+def __find_last_boundary(boundary:re.Pattern, text:str, start:int, end:int) -> int:
+    last_end = -1
+    for match in boundary.finditer(text, start, end):
+        last_end = match.end()
+    return last_end
+
+def __find_cut(text:str, start:int, end:int) -> int:
+    # a strong boundary too close to start is skipped, it would produce a tiny chunk
+    lowest = start + (end - start) // 2
+    for boundary in BOUNDARIES[:-1]:
+        cut = __find_last_boundary(boundary, text, lowest, end)
+        if cut > start:
+            return cut
+    cut = __find_last_boundary(BOUNDARIES[-1], text, start, end)
+    if cut > start:
+        return cut
+    return end # no boundary at all: cut the word
+
+def __iter_cut_chunks(text:str, max_chars:int) -> Generator[str, None, int]:
+    # yields the chunks while the rest is too long, returns where the rest starts
+    start = 0
+    while len(text) - start > max_chars:
+        cut = __find_cut(text, start, start + max_chars)
+        chunk = text[start:cut].strip()
+        if chunk:
+            yield chunk
+        start = cut
+    return start
+
+def iter_chunks(text:str, max_chars:int=DEFAULT_MAX_CHARS) -> Iterator[str]:
+    """Split text in chunks no longer than max_chars, lazily and in linear time.
+    The text is never copied but by the yielded chunks.
+
+    Arguments:
+        text: The text used to generate the TTS.
+        max_chars: The maximum number of characters of a chunk.
+
+    Yields:
+        The stripped, non empty chunks in text order.
+    """
+    start = yield from __iter_cut_chunks(text, max_chars)
+    chunk = text[start:].strip()
+    if chunk:
+        yield chunk
+
+def iter_file_chunks(text_file:IO[str], max_chars:int=DEFAULT_MAX_CHARS,
+                     block_size:int=DEFAULT_BLOCK_SIZE) -> Iterator[str]:
+    """Split a text file in chunks no longer than max_chars, reading it block by block.
+    The chunks are the same of iter_chunks on the whole file content, while at most
+    block_size + max_chars characters of the file are held at once.
+
+    Arguments:
+        text_file: The text file, opened in text mode.
+        max_chars: The maximum number of characters of a chunk.
+        block_size: The number of characters read at once.
+
+    Yields:
+        The stripped, non empty chunks in text order.
+    """
+    text = ""
+    for block in iter(lambda: text_file.read(block_size), ""):
+        text += block
+        start = yield from __iter_cut_chunks(text, max_chars)
+        text = text[start:]
+    yield from iter_chunks(text, max_chars)
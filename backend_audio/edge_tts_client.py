@@ -0,0 +1,175 @@
+"""Module aim to keep many EDGE-TTS requests in flight on one event loop,
+within a concurrency limit and a request rate limit, retrying the failed ones
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import time
+import aiohttp
+import edge_tts
+import edge_tts.communicate
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_RATE = 5.0 # requests per second
+DEFAULT_BURST = 10
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 1.0 # seconds before the first retry, doubled at each retry
+VOICES_FILE_NAME = "edge-tts-voices.json"
+VOICES_MAX_AGE = 7 * 24 * 3600 # seconds
+
+RETRY_EXCEPTIONS = (aiohttp.ClientError, asyncio.TimeoutError, edge_tts.exceptions.EdgeTTSException)
+
+logger = logging.getLogger(__name__)
+
+def set_endpoint(wss_url:str) -> None:
+    """Send the EDGE-TTS requests to another websocket endpoint,
+    e.g. a local stand-in of the service to test or benchmark without network.
+
+    Arguments:
+        wss_url: The websocket URL, with its query string, as edge_tts.constants.WSS_URL.
+    """
+    edge_tts.communicate.WSS_URL = wss_url
+
+class TokenBucket: #pylint: disable=R0903
+    """Rate limiter allowing rate acquisitions per second on average,
+    up to burst acquisitions at once after an idle period."""
+    def __init__(self, rate:float=DEFAULT_RATE, burst:int=DEFAULT_BURST):
+        """
+        Arguments:
+            rate: The tokens added per second, None for no limit.
+            burst: The maximum number of tokens kept.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        if not self.rate:
+            return
+        async with self.__lock:
+            while True:
+                now = time.monotonic()
+                self.__tokens = min(self.burst,
+                                    self.__tokens + (now - self.__updated) * self.rate)
+                self.__updated = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.__tokens) / self.rate)
+
+class EdgeTtsClient: #pylint: disable=R0903
+    """EDGE-TTS client to be used from a single event loop: each save is a
+    edge_tts.Communicate stream, at most max_concurrency of them in flight."""
+    def __init__(self, voice:str, *, #pylint: disable=R0913
+                 max_concurrency:int=DEFAULT_MAX_CONCURRENCY,
+                 rate:Optional[float]=DEFAULT_RATE, burst:int=DEFAULT_BURST,
+                 retries:int=DEFAULT_RETRIES, backoff:float=DEFAULT_BACKOFF):
+        """
+        Arguments:
+            voice: The TTS engine voice ID.
+            max_concurrency: The maximum number of requests in flight.
+            rate: The maximum number of requests started per second, None for no limit.
+            burst: The number of requests started at once after an idle period.
+            retries: The number of retries of a failed request.
+            backoff: The seconds before the first retry, doubled at each retry.
+        """
+        self.voice = voice
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self.__semaphore = asyncio.Semaphore(max_concurrency)
+        self.__bucket = TokenBucket(rate, burst)
+
+    async def fetch(self, text_in:str) -> Optional[bytes]:
+        """Synthesize a text in memory, retrying with exponential backoff.
+
+        Arguments:
+            text_in: The text used to generate the TTS.
+
+        Returns:
+            The MP3 audio, None after the last retry failed.
+        """
+        async with self.__semaphore:
+            for attempt in range(self.retries + 1):
+                await self.__bucket.acquire()
+                self.stats["requests"] += 1
+                try:
+                    return await self.__stream(text_in)
+                except RETRY_EXCEPTIONS as ex:
+                    await self.__wait_retry(attempt, ex)
+        self.stats["failures"] += 1
+        return None
+
+    async def __stream(self, text_in:str) -> bytes:
+        audio = io.BytesIO()
+        async for message in edge_tts.Communicate(text_in, self.voice).stream():
+            if message["type"] == "audio":
+                audio.write(message["data"])
+        return audio.getvalue()
+
+    async def __wait_retry(self, attempt:int, error:Exception) -> None:
+        if attempt == self.retries:
+            logger.error("edge-tts failed %d times: %s", attempt + 1, error)
+            return
+        delay = self.backoff * 2 ** attempt
+        logger.warning("edge-tts error, retrying in %.1fs: %s", delay, error)
+        self.stats["retries"] += 1
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def save(self, text_in:str, out_mp3_path:str) -> bool:
+        """Synthesize a text and save it, retrying with exponential backoff.
+
+        Arguments:
+            text_in: The text used to generate the TTS.
+            out_mp3_path: The path to save the result MP3 file.
+
+        Returns:
+            True if the MP3 file was saved, False after the last retry failed.
+        """
+        audio = await self.fetch(text_in)
+        if audio is None:
+            return False
+        with open(out_mp3_path, "wb") as mp3_file:
+            mp3_file.write(audio)
+        return True
+
+def __load_voices_file(voices_path:str, max_age:float) -> Optional[List[Dict[str, Any]]]:
+    try:
+        if time.time() - os.path.getmtime(voices_path) > max_age:
+            return None
+        with open(voices_path, "r", encoding="UTF-8") as voices_file:
+            return json.load(voices_file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def __save_voices_file(voices_path:str, voices:List[Dict[str, Any]]) -> None:
+    os.makedirs(os.path.dirname(voices_path) or os.curdir, exist_ok=True)
+    temp_path = voices_path + ".part"
+    with open(temp_path, "w", encoding="UTF-8") as voices_file:
+        json.dump(voices, voices_file)
+    os.replace(temp_path, voices_path)
+
+async def get_voices_manager(voices_path:Optional[str]=None,
+                             max_age:float=VOICES_MAX_AGE) -> edge_tts.VoicesManager:
+    """Get the EDGE-TTS voices, downloading the list only when the copy on disk is too old.
+
+    Arguments:
+        voices_path: The JSON file keeping the list of voices, None to always download it.
+        max_age: The seconds after which the list on disk is downloaded again.
+
+    Returns:
+        The voices manager, with all the available voices.
+    """
+    voices = __load_voices_file(voices_path, max_age) if voices_path else None
+    if voices is None:
+        voices = await edge_tts.list_voices()
+        if voices_path:
+            __save_voices_file(voices_path, voices)
+    return await edge_tts.VoicesManager.create(voices)
@@ -2,43 +2,49 @@
 __doc__ = """
 Goal: generate metadata to inject in m4b format file
 """
-from tinytag import TinyTag
+from backend_audio import audio_probe
 
 def __get_ffmetadata1(**kwargs) -> str:
-    isok = (kwargs['title'] is not None) or (kwargs['author'] is not None)
-    metadata = ""
-    if isok:
-        metadata = ";FFMETADATA1"
-        if kwargs['author']:
-            metadata = f"{metadata}\nartist={kwargs['author']}"
-        if kwargs['title']:
-            metadata = f"{metadata}\ntitle={kwargs['title']}"
+    # the header is mandatory, ffmpeg refuses the file without it
+    metadata = ";FFMETADATA1\n"
+    if kwargs['author']:
+        metadata = f"{metadata}artist={kwargs['author']}\n"
+    if kwargs['title']:
+        metadata = f"{metadata}title={kwargs['title']}\n"
     return metadata
 
-def __get_track_times(input_audio_paths:list) -> list:
+def __get_track_times(durations:list, pause_duration:float) -> list:
     starttimes = []
     time = 0 #cummulative start time (nanoseconds)
-    for audio_path in input_audio_paths:
-        tag = TinyTag.get(audio_path)
-        duration_audio : float = tag.duration*1e9
-        time += duration_audio
-        starttimes.append(str(int(time)))
+    for idx, duration in enumerate(durations):
+        time += round((duration or 0)*1e9)
+        if idx < len(durations) - 1:
+            time += round(pause_duration*1e9) # silence inserted after the chapter
+        starttimes.append(str(time))
     return starttimes
 
-def generate_ffmetadata(input_audio_paths:list,
+def generate_ffmetadata(input_audio_paths:list, #pylint: disable=R0913,R0917
                         chapter_titles:list=None,
                         author:str=None,
-                        title:str=None) -> str:
+                        title:str=None,
+                        durations:list=None,
+                        pause_duration:float=0) -> str:
     """Generate metadata in ffmpeg format.
 
     Arguments:
         input_audio_paths: List[str] - path of audiable files
         chapter_titles:    List[str] - name of chapters defined on each files
+        durations:         List[float] - exact seconds of each chapter, as reported by the
+                           synthesis, when None they are measured from input_audio_paths
+        pause_duration:    float - seconds of silence between chapters,
+                           the same given to generate_m4b
 
     Returns:
         metadata: str
     """
-    starttimes=__get_track_times(input_audio_paths)
+    if durations is None:
+        durations = audio_probe.get_durations(input_audio_paths)
+    starttimes=__get_track_times(durations, pause_duration)
     if chapter_titles is None:
         chapter_titles = []
     # https://ffmpeg.org/ffmpeg-formats.html#Metadata-1
@@ -0,0 +1,183 @@
+"""Module aim to fetch many gTTS chunks at once on a bounded pool of threads,
+slowing down only when the service answers 429 Too Many Requests
+"""
+from typing import Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import logging
+import re
+import threading
+import time
+import gtts
+import requests
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5 # seconds before the first retry, doubled at each retry
+MAX_BACKOFF = 30.0
+DEFAULT_TIMEOUT = 30.0
+THROTTLED_INTERVAL = 0.2 # seconds between two requests right after the first 429
+MAX_INTERVAL = 10.0
+SUCCESS_DECAY = 0.9 # the interval shrinks by this factor at each successful request
+
+REGEX_AUDIO = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveRateLimiter:
+    """Space out the requests of every thread: the interval between two requests
+    grows at each throttled answer and shrinks back at each successful one."""
+    def __init__(self, min_interval:float=0.0, max_interval:float=MAX_INTERVAL):
+        """
+        Arguments:
+            min_interval: The seconds between two requests while nothing is throttled.
+            max_interval: The upper bound of the interval.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.__next_start = 0.0
+        self.__lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Wait for the turn of a new request."""
+        with self.__lock:
+            now = time.monotonic()
+            start = max(now, self.__next_start)
+            self.__next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def throttled(self, retry_after:Optional[float]=None) -> None:
+        """Slow down after a 429 answer.
+
+        Arguments:
+            retry_after: The seconds asked by the service before the next request, if any.
+        """
+        with self.__lock:
+            self.interval = min(self.max_interval, max(self.interval * 2, THROTTLED_INTERVAL))
+            pause = retry_after if retry_after is not None else self.interval
+            self.__next_start = max(self.__next_start, time.monotonic() + pause)
+
+    def succeeded(self) -> None:
+        """Speed up after a successful answer."""
+        with self.__lock:
+            self.interval = max(self.min_interval, self.interval * SUCCESS_DECAY)
+
+class GttsClient: #pylint: disable=R0902
+    """gTTS client sharing one HTTP session per thread and one rate limiter
+    among all the requests, safe to use from many threads."""
+    def __init__(self, max_workers:int=DEFAULT_MAX_WORKERS, *, #pylint: disable=R0913
+                 retries:int=DEFAULT_RETRIES, backoff:float=DEFAULT_BACKOFF,
+                 timeout:float=DEFAULT_TIMEOUT, url:Optional[str]=None):
+        """
+        Arguments:
+            max_workers: The maximum number of requests in flight.
+            retries: The number of retries of a throttled or failed request.
+            backoff: The seconds before the first retry, doubled at each retry.
+            timeout: The seconds to wait for an answer.
+            url: Send the requests to this URL instead of the Google one,
+                 e.g. a local stand-in of the service to test or benchmark without network.
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.url = url
+        self.limiter = AdaptiveRateLimiter()
+        self.stats = {"requests": 0, "throttled": 0, "failures": 0}
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __get_retry_after(response:requests.Response) -> Optional[float]:
+        try:
+            return float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+
+    def __get_session(self) -> requests.Session:
+        if not hasattr(self.__local, "session"):
+            self.__local.session = requests.Session()
+        return self.__local.session
+
+    def __count(self, name:str) -> None:
+        with self.__lock:
+            self.stats[name] += 1
+
+    def __adapt_rate(self, response:requests.Response) -> Optional[float]:
+        # speed up after a success, slow down after a 429 answer keeping its Retry-After
+        if response.ok:
+            self.limiter.succeeded()
+            return None
+        if response.status_code != 429:
+            return None
+        self.__count("throttled")
+        retry_after = self.__get_retry_after(response)
+        self.limiter.throttled(retry_after)
+        return retry_after
+
+    def __wait_retry(self, attempt:int, error:str, retry_after:Optional[float]) -> None:
+        if attempt < self.retries:
+            delay = min(MAX_BACKOFF, self.backoff * 2 ** attempt)
+            logger.warning("gtts error, retrying in %.1fs: %s", delay, error)
+            time.sleep(max(delay, retry_after or 0.0))
+
+    def __send(self, prepared:requests.PreparedRequest) -> Optional[requests.Response]:
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            self.__count("requests")
+            try:
+                response = self.__get_session().send(prepared, timeout=self.timeout)
+            except requests.RequestException as ex:
+                error, retry_after = str(ex), None
+            else:
+                retry_after = self.__adapt_rate(response)
+                if response.ok:
+                    return response
+                if response.status_code != 429 and response.status_code < 500:
+                    logger.error("gtts error: HTTP %d", response.status_code)
+                    return None
+                error = f"HTTP {response.status_code}"
+            self.__wait_retry(attempt, error, retry_after)
+        logger.error("gtts failed %d times: %s", self.retries + 1, error)
+        return None
+
+    def fetch(self, text_in:str, lang:str="it") -> Optional[bytes]:
+        """Synthesize a chunk of text, short enough for a single gTTS request.
+
+        Arguments:
+            text_in: The text used to generate the TTS.
+            lang: The gTTS language code.
+
+        Returns:
+            The MP3 audio, None if the service did not return it.
+        """
+        tts = gtts.gTTS(text_in, lang=lang, slow=False, tld="com")
+        audio = b""
+        for prepared in tts._prepare_requests(): #pylint: disable=W0212
+            if self.url is not None:
+                prepared.url = self.url
+            response = self.__send(prepared)
+            match = REGEX_AUDIO.search(response.text) if response is not None else None
+            if match is None:
+                self.__count("failures")
+                return None
+            audio += base64.b64decode(match.group(1))
+        return audio
+
+    def fetch_all(self, chunks:Iterable[str], lang:str="it") -> List[Optional[bytes]]:
+        """Synthesize many chunks concurrently.
+
+        Arguments:
+            chunks: The texts used to generate the TTS.
+            lang: The gTTS language code.
+
+        Returns:
+            The MP3 audio of each chunk, in the same order, None where it was not returned.
+        """
+        return list(self.__executor.map(lambda chunk: self.fetch(chunk, lang), chunks))
+
+    def close(self) -> None:
+        """Stop the threads, waiting for the requests in flight."""
+        self.__executor.shutdown()
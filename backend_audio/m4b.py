@@ -1,35 +1,57 @@
 """Module aim to generate audio and the file result in M4B
 """
-from typing import List, Callable, Dict, Any
+from typing import List, Dict, Any, Callable, Coroutine, Iterable, Iterator, Optional, Tuple
+import argparse
 import logging
 import sys
-import time
 import os
 import tempfile
+import subprocess
 import asyncio
+import threading
 import pyttsx3
-import gtts
 import edge_tts
 import ffmpeg
+from backend_audio import audio_probe
+from backend_audio import backends
+from backend_audio import cache
+from backend_audio import chunker
+from backend_audio import edge_tts_client
+from backend_audio import ffmetadata_generator
+from backend_audio import gtts_client
 
 LANGUAGE_DICT = {"it":"it"}
 LANGUAGE_DICT_PYTTS = {"it":"italian", "en":"default"}
 voice_edge = "" #pylint: disable=C0103
+BACKEND_ENV_VAR = "WRITE2AUDIOBOOK_TTS"
 
 BIT_RATE_HUMAN = "40k"
+SAMPLE_RATE = 44100
+ASSEMBLY_FILTER = "filter"
+ASSEMBLY_CONCAT = "concat"
+ASSEMBLY_MODES = (ASSEMBLY_FILTER, ASSEMBLY_CONCAT)
 
 engine_ptts = None #pylint: disable=C0103
+voice_ptts = None #pylint: disable=C0103
 loop = None #pylint: disable=C0103
+loop_thread = None #pylint: disable=C0103
+edge_client = None #pylint: disable=C0103
+gtts_fetcher = None #pylint: disable=C0103
+gtts_lock = threading.Lock()
+audio_cache = None #pylint: disable=C0103
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def get_back_end_tts() -> str:
-    """Get the TTS engine for the system's operating system.
+    """Get the TTS engine for the system's operating system,
+    unless an engine is chosen by name in the WRITE2AUDIOBOOK_TTS environment variable.
     
     Returns:
         The string name of the engine used for the caller's operating system.
     """
+    if os.environ.get(BACKEND_ENV_VAR):
+        return os.environ[BACKEND_ENV_VAR]
     os_engine_map = {
         "win32": "EDGE_TTS",
         "cygwin": "EDGE_TTS",
@@ -37,17 +59,19 @@ def get_back_end_tts() -> str:
     }
     return os_engine_map.get(sys.platform, "PYTTS")
 
-async def get_voices_edge_tts(lang:str=LANGUAGE_DICT["it"]) -> List[Dict[str, Any]]:
+async def get_voices_edge_tts(lang:str=LANGUAGE_DICT["it"],
+                              voices_path:Optional[str]=None) -> List[Dict[str, Any]]:
     """get FEMALE voices in target language from EDGE-TTS.
     
     Arguments:
         lang: The desired language abbreviation.
+        voices_path: The JSON file keeping the list of voices between runs, if any.
     
     Returns:
         ret: A list of matching voice mappings based on lang.
     """
     try:
-        vs = await edge_tts.VoicesManager.create()
+        vs = await edge_tts_client.get_voices_manager(voices_path)
         ret = vs.find(Gender="Female", Language=lang)
     except Exception: #TODO add a best exception handling #pylint: disable=W0511,W0718
         ret = []
@@ -72,40 +96,20 @@ async def generate_audio_edge_tts(text_in:str,
     await com.save(out_mp3_path)
     return True
 
-def __split_text_into_chunks(string:str, max_chars:int=gtts.gTTS.GOOGLE_TTS_MAX_CHARS):
-    result = []
-    temp = string
-    while len(temp)>max_chars:
-        # Find the last space within the maximum character limit
-        last_space = temp.rfind(' ', 0, max_chars)
-        if last_space != -1:
-            # If a space is found, cut the string at that point
-            result.append(temp[:last_space])
-        else:
-            # If no space is found within the limit, just cut at max_chars
-            break
-        temp = temp[last_space+1:]
-    result.append(temp)
-    return result
-
-def __save_tts_audio_gtts(text_to_speech_str:str, mp3_path:str, lang:str) -> bool:
-    re_try = True
-    while re_try:
-        try:
-            tts = gtts.gTTS(text_to_speech_str, lang=LANGUAGE_DICT[lang],
-                            slow=False, tld="com")
-            tts.save(mp3_path)
-            time.sleep(1)
-            re_try = False
-        except gtts.gTTSError as ex:
-            re_try = False
-            time.sleep(1)
-            logger.error("gtts error: %s", ex.msg)
-            return False
-    return True
+def get_gtts_client() -> gtts_client.GttsClient:
+    """Get the gTTS client shared by every chapter, creating it at the first call.
+
+    Returns:
+        The gTTS client.
+    """
+    global gtts_fetcher #pylint: disable=W0603
+    with gtts_lock:
+        if gtts_fetcher is None:
+            gtts_fetcher = gtts_client.GttsClient()
+        return gtts_fetcher
 
 def generate_audio_gtts(text_in:str, out_mp3_path:str, *, lang:str="it") -> bool:
-    """Generate audio using GTTS apis.
+    """Generate audio using GTTS apis, fetching the chunks of the text concurrently.
     
     Arguments:
         text_in: The text used to generate the TTS.
@@ -115,11 +119,19 @@ def generate_audio_gtts(text_in:str, out_mp3_path:str, *, lang:str="it") -> bool
     Returns:
         True if the function succesfully saves the MP3 file.
     """
-    chunks = __split_text_into_chunks(text_in)
-    if len(chunks)>1:
-        __sub_audio(__save_tts_audio_gtts, out_mp3_path, chunks, lang)
+    chunks = list(chunker.iter_chunks(text_in, chunker.get_max_chars("GTTS")))
+    audio_chunks = get_gtts_client().fetch_all(chunks, lang=LANGUAGE_DICT[lang])
+    if None in audio_chunks:
+        logger.error("gtts: %d of %d chunks missing in %s",
+                     audio_chunks.count(None), len(chunks), out_mp3_path)
+    audio_chunks = [audio for audio in audio_chunks if audio is not None]
+    if len(audio_chunks) == 0:
+        return False
+    if len(audio_chunks) == 1:
+        with open(out_mp3_path, "wb") as mp3_file:
+            mp3_file.write(audio_chunks[0])
     else:
-        return __save_tts_audio_gtts(text_in, out_mp3_path, lang)
+        return __sub_audio(out_mp3_path, audio_chunks)
     return True
 
 def generate_audio_pytts(text_in:str, out_mp3_path:str, *, lang:str="it") -> bool:
@@ -133,79 +145,403 @@ def generate_audio_pytts(text_in:str, out_mp3_path:str, *, lang:str="it") -> boo
     Returns:
         True if the function succesfully saves the MP3 file.
     """
-    if engine_ptts.getProperty("voice") != lang:
+    global voice_ptts #pylint: disable=W0603
+    # the engine reports a voice id, not a language: remember the voice set last
+    if voice_ptts != LANGUAGE_DICT_PYTTS[lang]:
         engine_ptts.setProperty("voice", LANGUAGE_DICT_PYTTS[lang])
+        voice_ptts = LANGUAGE_DICT_PYTTS[lang]
     engine_ptts.save_to_file(text_in, out_mp3_path)
     engine_ptts.runAndWait()
     return True
 
-def __sub_audio(audio_generator:Callable[[str, str], bool],
-              output_path_mp3:str, chunks_sub_text:str, lang:str):
-    dummy_mp3 = []
-    with tempfile.TemporaryDirectory() as dummy_temp_folder:
-        for idx, chunk in enumerate(chunks_sub_text, start=1):
-            dummy_mp3_path = os.path.join(dummy_temp_folder, f"dummy{idx}.mp3")
-            if audio_generator(chunk, dummy_mp3_path, lang):
-                dummy_mp3.append(ffmpeg.input(dummy_mp3_path))
-        if len(dummy_mp3)>0:
-            dummy_concat = ffmpeg.concat(*dummy_mp3, v=0, a=1)
-            out = ffmpeg.output(dummy_concat, output_path_mp3, f='mp3')
-            out.run()
+def __sub_audio(output_path_mp3:str, audio_chunks:List[bytes]) -> bool:
+    # MP3 frames can be joined as they are: no temporary file and no transcoding
+    frames = 0
+    with open(output_path_mp3, "wb") as mp3_file:
+        for audio in audio_chunks:
+            for frame in audio_probe.iter_audio_frames(audio):
+                mp3_file.write(frame)
+                frames += 1
+    return frames > 0
 
-def generate_m4b(output_path: str, chapter_paths: List[str],
-                 ffmetadata: str, pause_duration:int=0) -> None:
-    """Generate the final audiobook starting from MP3s and METADATAs.
-    
-    Arguments:
-        output_path: The path to save the final audiobook.
-        chapter_paths: The paths where each chapter was saved.
-        ffmetadata: The ffmetadata file content.
-        pause_duration: the time pass between chapters, by default no pause
-    """
+def __generate_m4b_filter(output_path: str, chapter_paths: List[str],
+                          ffmetadata_path: str, pause_duration:int) -> None:
     silence = None
     if pause_duration > 0:
-        silence = ffmpeg.input('anullsrc=channel_layout=stereo:sample_rate=44100',
+        silence = ffmpeg.input(f'anullsrc=channel_layout=stereo:sample_rate={SAMPLE_RATE}',
                                f='lavfi', t=pause_duration).audio
     inputs_mp3 = [seg for cp in chapter_paths[:-1]
-                      for seg in (ffmpeg.input(cp).audio, silence)] + [ffmpeg.input(chapter_paths[-1]).audio]
-    inputs_mp3 = list(filter(lambda x: x is not None, inputs_mp3))
+                      for seg in (ffmpeg.input(cp).audio, silence)]
+    inputs_mp3 = [seg for seg in inputs_mp3 if seg is not None]
+    inputs_mp3.append(ffmpeg.input(chapter_paths[-1]).audio)
     joined = ffmpeg.concat(*inputs_mp3, v=0, a=1)
     # Build FFmpeg command for setting metadata
     out = ffmpeg.output(joined, output_path, f='mp4', map_metadata=0, audio_bitrate=BIT_RATE_HUMAN)
-    ffmetadata_path = "ffmetada"
-    with open(ffmetadata_path, "w", encoding="UTF-8") as file_ffmetadata:
-        file_ffmetadata.write(ffmetadata)
     out = out.global_args('-f', 'ffmetadata', '-i', ffmetadata_path)
-    try:
-        ffmpeg.run(out)
-    except ffmpeg.Error as e:
-        logger.error(e.stderr.decode())
-        raise e
+    ffmpeg.run(out)
 
-def init(backend:str) -> None:
-    """Init back end code per text-to-speech
-    SUPPORTED: EDGE_TTS, PYTTS, GTTS.
+def __normalize_audio(input_stream, output_path:str) -> None:
+    out = ffmpeg.output(input_stream, output_path, f='mp4', acodec='aac',
+                        audio_bitrate=BIT_RATE_HUMAN, ar=SAMPLE_RATE, ac=2)
+    ffmpeg.run(out, overwrite_output=True, quiet=True)
+
+def get_concat_entry(path:str) -> str:
+    """Get the line of a file in a list of the ffmpeg concat demuxer,
+    the path is made absolute and its quotes are escaped."""
+    escaped_path = os.path.abspath(path).replace("'", "'\\''")
+    return f"file '{escaped_path}'\n"
+
+def __generate_m4b_concat(output_path: str, chapter_paths: List[str],
+                          ffmetadata_path: str, pause_duration:int) -> None:
+    with tempfile.TemporaryDirectory() as norm_dir:
+        silence_path = None
+        if pause_duration > 0:
+            silence_path = os.path.join(norm_dir, "silence.m4a")
+            __normalize_audio(ffmpeg.input(f'anullsrc=channel_layout=stereo:'
+                                           f'sample_rate={SAMPLE_RATE}',
+                                           f='lavfi', t=pause_duration).audio, silence_path)
+        list_path = os.path.join(norm_dir, "concat.txt")
+        with open(list_path, "w", encoding="UTF-8") as list_file:
+            # one ffmpeg process per chapter: open files stay flat with the chapter count
+            for idx, chapter_path in enumerate(chapter_paths):
+                norm_path = os.path.join(norm_dir, f"{idx}.m4a")
+                __normalize_audio(ffmpeg.input(chapter_path).audio, norm_path)
+                if silence_path and idx > 0:
+                    list_file.write(get_concat_entry(silence_path))
+                list_file.write(get_concat_entry(norm_path))
+        mux_ffmetadata(['-f', 'concat', '-safe', '0', '-i', list_path],
+                       ffmetadata_path, output_path)
+
+def mux_ffmetadata(input_args: List[str], ffmetadata_path: str, output_path: str) -> None:
+    """Copy an already encoded audio stream in the final audiobook, adding the METADATAs.
+
+    Arguments:
+        input_args: The ffmpeg arguments of the audio input, as ['-i', path].
+        ffmetadata_path: The path of the ffmetadata file.
+        output_path: The path to save the final audiobook.
+    """
+    # the metadata input has no stream to map, ffmpeg-python graphs cannot express it
+    command = ['ffmpeg', '-y', *input_args,
+               '-f', 'ffmetadata', '-i', ffmetadata_path,
+               '-map', '0:a', '-map_metadata', '1',
+               '-c:a', 'copy', '-f', 'mp4', output_path]
+    process = subprocess.run(command, capture_output=True, check=False)
+    if process.returncode != 0:
+        raise ffmpeg.Error('ffmpeg', process.stdout, process.stderr)
+
+class AudioJoiner: #pylint: disable=R0902
+    """Join audio files in a single MP3 file while they are still being synthesized.
+    MP3 files are joined copying their audio frames one file at a time, without
+    re-encoding; other formats, as the .wav files of get_audio_ext, are listed as they
+    come and read one at a time by the concat demuxer of a single ffmpeg process.
+    """
+    def __init__(self, output_path:str, copy_frames:bool=True):
+        """
+        Arguments:
+            output_path: The path to save the joined MP3 file.
+            copy_frames: True if all the audio files are MP3 files.
+        """
+        self.output_path = output_path
+        self.joined = 0
+        self.missing = 0
+        self.__pending: Dict[int, Optional[str]] = {}
+        self.__next_idx = 0
+        # the frames are written next to the output, so it is saved without a copy
+        self.__part_path = output_path + ".part"
+        self.__list_dir = None
+        if not copy_frames:
+            self.__list_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+            self.__part_path = os.path.join(self.__list_dir.name, "concat.txt")
+        self.__part_file = open(self.__part_path, "wb") #pylint: disable=R1732
+
+    def submit(self, idx:int, audio_path:Optional[str]) -> None:
+        """Hand over a finished audio file, files may finish in any order
+        but they are joined in idx order.
+
+        Arguments:
+            idx: The position of the file, starting from 0 without gaps.
+            audio_path: The path of the audio file, None if it was not saved.
+        """
+        self.__pending[idx] = audio_path
+        while self.__next_idx in self.__pending:
+            audio_path = self.__pending.pop(self.__next_idx)
+            self.__next_idx += 1
+            if audio_path is None:
+                self.missing += 1
+            else:
+                self.__append(audio_path)
+                self.joined += 1
+
+    def __append(self, audio_path:str) -> None:
+        if self.__list_dir is not None:
+            self.__part_file.write(get_concat_entry(audio_path).encode("UTF-8"))
+            return
+        with open(audio_path, "rb") as audio_file:
+            self.__part_file.writelines(audio_probe.iter_audio_frames(audio_file.read()))
+
+    def finish(self) -> None:
+        """Save the MP3 file with the files submitted so far, nothing if none was saved."""
+        self.__part_file.close()
+        if self.__list_dir is None:
+            if self.joined == 0:
+                os.remove(self.__part_path)
+            else:
+                os.replace(self.__part_path, self.output_path)
+            return
+        try:
+            if self.joined > 0:
+                self.__encode_list()
+        finally:
+            self.__list_dir.cleanup()
+
+    def __encode_list(self) -> None:
+        out = (ffmpeg.input(self.__part_path, f='concat', safe=0)
+               .output(self.output_path, f='mp3'))
+        try:
+            ffmpeg.run(out, overwrite_output=True, quiet=True)
+        except ffmpeg.Error as e:
+            logger.error(e.stderr.decode())
+            raise e
+
+def concat_audio(output_path: str, audio_paths: List[str]) -> None:
+    """Join many audio files, in order, in a single MP3 file, as AudioJoiner.
+
+    Arguments:
+        output_path: The path to save the joined MP3 file.
+        audio_paths: The paths of the audio files, in the final order.
+    """
+    joiner = AudioJoiner(output_path, copy_frames=all(
+        os.path.splitext(audio_path)[1] == ".mp3" for audio_path in audio_paths))
+    for idx, audio_path in enumerate(audio_paths):
+        joiner.submit(idx, audio_path)
+    joiner.finish()
+
+def generate_m4b(output_path: str, chapter_paths: List[str],
+                 ffmetadata: str, pause_duration:int=0,
+                 mode:str=ASSEMBLY_FILTER) -> None:
+    """Generate the final audiobook starting from MP3s and METADATAs.
     
     Arguments:
-        backend: The string name of the TTS engine.
+        output_path: The path to save the final audiobook.
+        chapter_paths: The paths where each chapter was saved.
+        ffmetadata: The ffmetadata file content.
+        pause_duration: the time pass between chapters, by default no pause
+        mode: ASSEMBLY_FILTER joins all the chapters in a single ffmpeg filter graph,
+              ASSEMBLY_CONCAT encodes each chapter once and joins them
+              with the concat demuxer and stream copy, suited to books with many chapters.
+    """
+    assemblers = {ASSEMBLY_FILTER: __generate_m4b_filter,
+                  ASSEMBLY_CONCAT: __generate_m4b_concat}
+    # a file of its own: many documents may be assembled at the same time
+    with tempfile.TemporaryDirectory() as metadata_dir:
+        ffmetadata_path = os.path.join(metadata_dir, "ffmetadata")
+        with open(ffmetadata_path, "w", encoding="UTF-8") as file_ffmetadata:
+            file_ffmetadata.write(ffmetadata)
+        try:
+            assemblers[mode](output_path, chapter_paths, ffmetadata_path, pause_duration)
+        except ffmpeg.Error as e:
+            logger.error(e.stderr.decode())
+            raise e
+
+def generate_m4b_chapters(output_path: str, chapter_paths: List[str], #pylint: disable=R0913
+                          durations: List[Optional[float]], *,
+                          chapter_titles:Optional[List[str]]=None,
+                          title:Optional[str]=None, author:Optional[str]=None,
+                          mode:str=ASSEMBLY_FILTER) -> None:
+    """Generate the final audiobook of the synthesized chapters, with a chapter mark each,
+    leaving out the chapters that were not saved.
+
+    Arguments:
+        output_path: The path to save the final audiobook.
+        chapter_paths: The path of the audio of each chapter, in chapter order.
+        durations: The duration in seconds of each chapter, None if it was not saved,
+                   as returned by the scheduler.
+        chapter_titles: The title of each chapter, by default c{chapter number}.
+        title: The title of the audiobook.
+        author: The author of the audiobook.
+        mode: How the chapters are joined, as in generate_m4b.
     """
-    global engine_ptts #pylint: disable=W0603
-    global voice_edge  #pylint: disable=W0603
-    global loop        #pylint: disable=W0603
-    if backend == "PYTTS":
+    saved = [idx for idx, duration in enumerate(durations) if duration is not None]
+    saved_paths = [chapter_paths[idx] for idx in saved]
+    metadata = ffmetadata_generator.generate_ffmetadata(
+        saved_paths,
+        chapter_titles=[chapter_titles[idx] for idx in saved] if chapter_titles else None,
+        title=title, author=author,
+        durations=[durations[idx] for idx in saved])
+    generate_m4b(output_path, saved_paths, metadata, mode=mode)
+
+class GttsBackend(backends.TtsBackend):
+    """Google Translate TTS, chunks fetched concurrently by the shared GttsClient."""
+    name = "GTTS"
+    capabilities = backends.Capabilities(chunker.get_max_chars("GTTS"),
+                                         gtts_client.DEFAULT_MAX_WORKERS, backends.FORMAT_MP3,
+                                         backends.WORKERS_THREADS, False)
+
+    def get_voice(self, lang:str) -> Tuple[str, str]:
+        return LANGUAGE_DICT.get(lang, lang), "tld=com,slow=False"
+
+    def synthesize_batch(self, chunks:Iterable[str], *, lang:str="it"
+                         ) -> Iterator[Optional[bytes]]:
+        return iter(get_gtts_client().fetch_all(chunks, lang=LANGUAGE_DICT[lang]))
+
+    def synthesize(self, text_in:str, out_path:str, *, lang:str="it") -> bool:
+        return generate_audio_gtts(text_in, out_path, lang=lang)
+
+class PyttsBackend(backends.TtsBackend):
+    """Local pyttsx3 engine, one per process: its drivers may write WAV files."""
+    name = "PYTTS"
+    capabilities = backends.Capabilities(chunker.get_max_chars("PYTTS"), os.cpu_count() or 1,
+                                         backends.FORMAT_WAV, backends.WORKERS_PROCESSES, True)
+
+    def setup(self, cache_dir:Optional[str]=None) -> None:
+        global engine_ptts #pylint: disable=W0603
+        global voice_ptts  #pylint: disable=W0603
         engine_ptts = pyttsx3.init()
+        voice_ptts = None
         engine_ptts.setProperty('volume',1.0)    # setting up volume level  between 0 and 1
-    elif backend == "EDGE_TTS":
-        #assert os.
-        asyncio.set_event_loop(asyncio.ProactorEventLoop())
-        loop = asyncio.get_event_loop_policy().get_event_loop()
-        voices = loop.run_until_complete(get_voices_edge_tts(lang="it"))
+
+    def get_voice(self, lang:str) -> Tuple[str, str]:
+        return LANGUAGE_DICT_PYTTS.get(lang, lang), "volume=1.0"
+
+    def synthesize_batch(self, chunks:Iterable[str], *, lang:str="it"
+                         ) -> Iterator[Optional[bytes]]:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for idx, chunk in enumerate(chunks):
+                chunk_path = os.path.join(temp_dir, f"{idx}.wav")
+                generate_audio_pytts(chunk, chunk_path, lang=lang)
+                if not os.path.isfile(chunk_path):
+                    yield None
+                    continue
+                with open(chunk_path, "rb") as chunk_file:
+                    yield chunk_file.read()
+
+    def synthesize(self, text_in:str, out_path:str, *, lang:str="it") -> bool:
+        return generate_audio_pytts(text_in, out_path, lang=lang)
+
+class EdgeTtsBackend(backends.TtsBackend):
+    """Microsoft Edge online TTS, on the event loop of the shared EdgeTtsClient."""
+    name = "EDGE_TTS"
+    capabilities = backends.Capabilities(chunker.get_max_chars("EDGE_TTS"),
+                                         edge_tts_client.DEFAULT_MAX_CONCURRENCY,
+                                         backends.FORMAT_MP3, backends.WORKERS_ASYNCIO, False)
+
+    def setup(self, cache_dir:Optional[str]=None) -> None:
+        global voice_edge  #pylint: disable=W0603
+        global loop        #pylint: disable=W0603
+        global loop_thread #pylint: disable=W0603
+        global edge_client #pylint: disable=W0603
+        # one event loop, in its own thread, runs every EDGE-TTS request
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+        loop_thread.start()
+        voices_path = os.path.join(cache_dir or cache.DEFAULT_CACHE_DIR,
+                                   edge_tts_client.VOICES_FILE_NAME)
+        voices = run_edge_tts(get_voices_edge_tts(lang="it", voices_path=voices_path))
         assert isinstance(voices, list) and len(voices) > 0, "Please check you internet connection"
         voice_edge = voices[0]["Name"]
+        edge_client = edge_tts_client.EdgeTtsClient(voice_edge)
+
+    def get_voice(self, lang:str) -> Tuple[str, str]:
+        return voice_edge, ""
+
+    def synthesize_batch(self, chunks:Iterable[str], *, lang:str="it"
+                         ) -> Iterator[Optional[bytes]]:
+        async def fetch_all() -> List[Optional[bytes]]:
+            return await asyncio.gather(*[edge_client.fetch(chunk) for chunk in chunks])
+        return iter(run_edge_tts(fetch_all()))
+
+    def synthesize(self, text_in:str, out_path:str, *, lang:str="it") -> bool:
+        return run_edge_tts(edge_client.save(text_in, out_path))
+
+    async def synthesize_async(self, text_in:str, out_path:str, *, lang:str="it") -> bool:
+        return await edge_client.save(text_in, out_path)
+
+backends.register_backend(GttsBackend())
+backends.register_backend(PyttsBackend())
+backends.register_backend(EdgeTtsBackend())
+
+def init(backend:str, cache_dir:str=cache.DEFAULT_CACHE_DIR,
+         cache_max_size:int=cache.DEFAULT_MAX_SIZE) -> None:
+    """Init back end code per text-to-speech
+    SUPPORTED: every engine of backends.registry, e.g. EDGE_TTS, PYTTS, GTTS, NULL.
+    
+    Arguments:
+        backend: The string name of the TTS engine.
+        cache_dir: The directory of the audio cache, None to disable it.
+        cache_max_size: The maximum size in bytes of the audio cache.
+    """
+    global audio_cache #pylint: disable=W0603
+    audio_cache = cache.AudioCache(cache_dir, cache_max_size) if cache_dir else None
+    backends.get_backend(backend).setup(cache_dir)
+
+def run_edge_tts(coroutine:Coroutine) -> Any:
+    """Run a coroutine on the EDGE-TTS event loop and wait for its result,
+    from any thread but the loop one.
+
+    Arguments:
+        coroutine: The coroutine to run, e.g. an EdgeTtsClient.save call.
+
+    Returns:
+        The result of the coroutine.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+def get_cache_key(text_in:str, *, lang:str, backend:str) -> str:
+    """Get the audio cache key of a text, given the current engine settings.
+
+    Arguments:
+        text_in: The text used to generate the TTS.
+        lang: The desired language abbreviation.
+        backend: The string name of the TTS engine.
+
+    Returns:
+        The content address of the audio.
+    """
+    voice, settings = backends.get_backend(backend).get_voice(lang)
+    return cache.get_cache_key(text_in, backend=backend, voice=voice,
+                               lang=lang, settings=settings)
+
+def get_audio_ext(backend:str) -> str:
+    """Get the extension of the audio files saved by a TTS engine, after the format
+    it writes: an engine writing WAV data gets .wav files, not .mp3 ones.
+
+    Arguments:
+        backend: The string name of the TTS engine.
+
+    Returns:
+        The extension with its dot, e.g. ".mp3".
+    """
+    return f".{backends.get_backend(backend).capabilities.output_format}"
 
 def generate_audio(text_in:str, out_mp3_path:str, *,
                    lang:str="it", backend:str="PYTTS") -> bool:
-    """Generating audio using tts apis.
+    """Generating audio using tts apis, or taking it from the audio cache
+    when the same text was already synthesized with the same settings.
+    Arguments:
+        text_in: The text used to generate the TTS.
+        out_mp3_path: The path to save the result MP3 file.
+        lang: The desired language abbreviation.
+        backend: The string name of the TTS engine.
+    Returns:
+        True if the function succesfully saves the MP3 file.
+    """
+    text_in = text_in.strip()
+    if len(text_in) == 0:
+        return False
+    if audio_cache is None:
+        return __generate_audio_backend(text_in, out_mp3_path, lang=lang, backend=backend)
+    key = get_cache_key(text_in, lang=lang, backend=backend)
+    if audio_cache.get(key, out_mp3_path, get_audio_ext(backend)):
+        return True
+    ret_val = __generate_audio_backend(text_in, out_mp3_path, lang=lang, backend=backend)
+    if ret_val and os.path.isfile(out_mp3_path):
+        audio_cache.put(key, out_mp3_path, get_audio_ext(backend))
+    return ret_val
+
+async def generate_audio_async(text_in:str, out_mp3_path:str, *,
+                               lang:str="it", backend:str="EDGE_TTS") -> bool:
+    """Generating audio from a running event loop, with an engine driven by asyncio
+    workers, or taking it from the audio cache like generate_audio.
     Arguments:
         text_in: The text used to generate the TTS.
         out_mp3_path: The path to save the result MP3 file.
@@ -214,28 +550,47 @@ def generate_audio(text_in:str, out_mp3_path:str, *,
     Returns:
         True if the function succesfully saves the MP3 file.
     """
-    ret_val = True
     text_in = text_in.strip()
     if len(text_in) == 0:
         return False
-    if backend == "GTTS":
-        ret_val = generate_audio_gtts(text_in, out_mp3_path, lang=lang)
-    elif backend == "PYTTS":
-        ret_val = generate_audio_pytts(text_in, out_mp3_path, lang=lang)
-    elif backend == "EDGE_TTS":
-        loop_audio = asyncio.get_event_loop_policy().get_event_loop()
-        loop_audio.run_until_complete(generate_audio_edge_tts(text_in, out_mp3_path,
-                                                              lang=lang, voice=voice_edge))
+    key = get_cache_key(text_in, lang=lang, backend=backend)
+    if audio_cache is not None and audio_cache.get(key, out_mp3_path, get_audio_ext(backend)):
+        return True
+    ret_val = await backends.get_backend(backend).synthesize_async(text_in, out_mp3_path,
+                                                                   lang=lang)
+    if ret_val and audio_cache is not None and os.path.isfile(out_mp3_path):
+        audio_cache.put(key, out_mp3_path, get_audio_ext(backend))
     return ret_val
 
+def __generate_audio_backend(text_in:str, out_mp3_path:str, *,
+                             lang:str, backend:str) -> bool:
+    return backends.get_backend(backend).synthesize(text_in, out_mp3_path, lang=lang)
+
 def close_edge_tts() -> None:
     """Need to close the async io process."""
-    global loop #pylint: disable=W0603,W0602
+    global loop #pylint: disable=W0603
     if loop:
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
         loop.close()
+        loop = None
+
+def run_converter(backend:str, convert:Callable[[argparse.Namespace], None],
+                  args:argparse.Namespace) -> None:
+    """Convert a document with a TTS engine initialized for it, released at the end.
+
+    Arguments:
+        backend: The string name of the TTS engine.
+        convert: The converter of the document format.
+        args: The options supplied by the user, `file` and `output_path` included.
+    """
+    init(backend, args.cache_dir, args.cache_size * 1024**2)
+    try:
+        convert(args)
+    finally:
+        close_edge_tts()
 
 def add_cover_to_audiobook(audio_path: str, cover_path: str, output_path: str) -> None:
-    import subprocess
     command = [
         'ffmpeg',
         '-i', audio_path,
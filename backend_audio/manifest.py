@@ -0,0 +1,111 @@
+"""Module aim to record the progress of a conversion in a persistent work directory,
+so a conversion stopped in the middle can be resumed
+"""
+from typing import Dict, Any, Optional
+import json
+import logging
+import os
+
+MANIFEST_FILE_NAME = "manifest.jsonl"
+MANIFEST_VERSION = 2
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+def get_work_dir(output_path:str) -> str:
+    """Get the work directory of a conversion, next to its result file.
+
+    Arguments:
+        output_path: The path to save the final audiobook.
+
+    Returns:
+        The path of the work directory.
+    """
+    return os.path.splitext(output_path)[0] + ".work"
+
+class JobManifest:
+    """Chapters of a conversion with their text hash, status, output path and duration."""
+    def __init__(self, work_dir:str, resume:bool=False):
+        """
+        Arguments:
+            work_dir: The directory where the chapters and the manifest are saved.
+            resume: If True, load the chapters recorded by a previous run.
+        """
+        self.work_dir = work_dir
+        self.path = os.path.join(work_dir, MANIFEST_FILE_NAME)
+        self.chapters: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(work_dir, exist_ok=True)
+        if resume:
+            self.__load()
+        self.save()
+
+    def __load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="UTF-8") as manifest_file:
+                header = json.loads(manifest_file.readline())
+                if header.get("version") == MANIFEST_VERSION:
+                    self.__read_chapters(manifest_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            logger.warning("no valid manifest in %s, starting from scratch", self.work_dir)
+
+    def __read_chapters(self, manifest_file) -> None:
+        # a later line records a newer result of the same chapter
+        for line in manifest_file:
+            try:
+                chapter = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("ignoring the last line of %s, cut by a stopped run", self.path)
+                return
+            self.chapters[chapter.pop("path")] = chapter
+
+    def save(self) -> None:
+        """Write the manifest atomically, one line per chapter after the version line,
+        a killed process never leaves it corrupted."""
+        temp_path = self.path + ".part"
+        with open(temp_path, "w", encoding="UTF-8") as manifest_file:
+            manifest_file.write(json.dumps({"version": MANIFEST_VERSION}) + "\n")
+            for output_path, chapter in self.chapters.items():
+                manifest_file.write(json.dumps({"path": output_path, **chapter}) + "\n")
+        os.replace(temp_path, self.path)
+
+    def is_done(self, output_path:str, text_hash:str) -> bool:
+        """Check if a chapter was already finished and its audio is still valid.
+
+        Arguments:
+            output_path: The path of the chapter audio file.
+            text_hash: The hash of the chapter text and of the engine settings.
+
+        Returns:
+            True if the chapter audio can be used without synthesizing it again.
+        """
+        chapter = self.chapters.get(output_path)
+        if chapter is None or chapter["status"] != STATUS_DONE or chapter["hash"] != text_hash:
+            return False
+        try:
+            return os.path.getsize(output_path) == chapter["size"]
+        except OSError:
+            return False
+
+    def get_duration(self, output_path:str) -> Optional[float]:
+        """Get the duration in seconds recorded for a finished chapter, None if unknown."""
+        return self.chapters.get(output_path, {}).get("duration")
+
+    def mark(self, output_path:str, text_hash:str, duration:Optional[float]) -> None:
+        """Record the result of a chapter, appending a line to the manifest: the cost of
+        a mark does not grow with the number of chapters.
+
+        Arguments:
+            output_path: The path of the chapter audio file.
+            text_hash: The hash of the chapter text and of the engine settings.
+            duration: The chapter duration in seconds, None if the chapter failed.
+        """
+        chapter = {"hash": text_hash, "status": STATUS_FAILED,
+                   "size": None, "duration": None}
+        if duration is not None and os.path.isfile(output_path):
+            chapter.update(status=STATUS_DONE,
+                           size=os.path.getsize(output_path),
+                           duration=duration)
+        self.chapters[output_path] = chapter
+        with open(self.path, "a", encoding="UTF-8") as manifest_file:
+            manifest_file.write(json.dumps({"path": output_path, **chapter}) + "\n")
@@ -0,0 +1,197 @@
+"""Module aim to run a local TTS engine on every core: a pool of long-lived worker
+processes, each one with its own engine, where a hung engine is killed and replaced
+"""
+from typing import Callable, Deque, List, Optional, Tuple
+from concurrent.futures import Executor, Future
+from multiprocessing import connection
+import collections
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+DEFAULT_TIMEOUT = 600 # seconds a single job may run before its engine is considered hung
+POLL_INTERVAL = 0.1
+
+logger = logging.getLogger(__name__)
+
+Task = Tuple[Future, Callable, tuple, dict]
+
+def run_worker(conn:connection.Connection, initializer:Optional[Callable],
+               initargs:tuple) -> None:
+    """Main loop of a worker process: run the jobs received from conn until None.
+
+    Arguments:
+        conn: The worker end of the pipe, jobs come in and results go out.
+        initializer: Called once before the first job, e.g. to initialize the engine.
+        initargs: The arguments of initializer.
+    """
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        fn, args, kwargs = task
+        try:
+            conn.send((True, fn(*args, **kwargs)))
+        except Exception as ex: #pylint: disable=W0718
+            conn.send((False, ex))
+
+class WorkerProcess:
+    """A worker process with the pipe to feed it and the job it is running, if any."""
+    __slots__ = ("process", "conn", "future", "deadline")
+
+    def __init__(self, initializer:Optional[Callable], initargs:tuple):
+        """
+        Arguments:
+            initializer: Called once in the new process, e.g. to initialize its engine.
+            initargs: The arguments of initializer.
+        """
+        self.conn, worker_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=run_worker,
+                                               args=(worker_conn, initializer, initargs),
+                                               daemon=True)
+        self.process.start()
+        worker_conn.close()
+        self.future: Optional[Future] = None
+        self.deadline = 0.0
+
+    def run(self, task:Task, timeout:float) -> None:
+        """Send a job to the process, which must be idle."""
+        self.future, fn, args, kwargs = task
+        self.deadline = time.monotonic() + timeout
+        self.conn.send((fn, args, kwargs))
+
+    def stop(self) -> None:
+        """Ask the process to exit once idle, waiting for it."""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join()
+        self.conn.close()
+
+    def kill(self) -> None:
+        """Kill the process at once, whatever it is doing."""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class PyttsWorkerPool(Executor):
+    """Executor of functions on max_workers long-lived processes, fed one job at a time.
+    Each process keeps its initialized engine for its whole life; a job running longer
+    than timeout fails with TimeoutError and its process is replaced by a new one.
+    """
+    def __init__(self, max_workers:Optional[int]=None, timeout:float=DEFAULT_TIMEOUT,
+                 initializer:Optional[Callable]=None, initargs:tuple=()):
+        """
+        Arguments:
+            max_workers: The number of worker processes, by default one per core.
+            timeout: The seconds a job may run before its process is killed.
+            initializer: Called once in each new process, e.g. to initialize its engine.
+            initargs: The arguments of initializer.
+        """
+        self.timeout = timeout
+        self.__initializer, self.__initargs = initializer, initargs
+        self.__tasks: "queue.Queue[Optional[Task]]" = queue.Queue()
+        self.__workers: List[WorkerProcess] = [WorkerProcess(initializer, initargs)
+                                               for _ in range(max_workers or os.cpu_count() or 1)]
+        self.__shutdown = False
+        self.__thread = threading.Thread(target=self.__dispatch, daemon=True)
+        self.__thread.start()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future: #pylint: disable=W0221
+        if self.__shutdown:
+            raise RuntimeError("cannot schedule new jobs after shutdown")
+        future: Future = Future()
+        self.__tasks.put((future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait:bool=True, *, cancel_futures:bool=False) -> None:
+        if not self.__shutdown:
+            self.__shutdown = True
+            if cancel_futures:
+                self.__cancel_pending()
+            self.__tasks.put(None)
+        if wait:
+            self.__thread.join()
+
+    def __cancel_pending(self) -> None:
+        while True:
+            try:
+                task = self.__tasks.get_nowait()
+            except queue.Empty:
+                return
+            if task is not None:
+                task[0].cancel()
+
+    def __replace(self, worker:WorkerProcess, error:Exception) -> None:
+        future = worker.future
+        worker.kill()
+        self.__workers[self.__workers.index(worker)] = WorkerProcess(self.__initializer,
+                                                                     self.__initargs)
+        future.set_exception(error)
+
+    def __receive(self, worker:WorkerProcess) -> None:
+        try:
+            succeeded, value = worker.conn.recv()
+        except (EOFError, OSError):
+            logger.error("TTS worker %d exited while running a job", worker.process.pid)
+            self.__replace(worker, RuntimeError("TTS worker process exited"))
+            return
+        future, worker.future = worker.future, None
+        if succeeded:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def __kill_hung(self) -> None:
+        now = time.monotonic()
+        for worker in [w for w in self.__workers if w.future and now > w.deadline]:
+            logger.error("TTS worker %d hung for %ds, restarting it",
+                         worker.process.pid, self.timeout)
+            self.__replace(worker, TimeoutError(f"TTS job over {self.timeout}s"))
+
+    def __collect(self, pending:Deque[Task], block:bool) -> bool:
+        """Move the submitted tasks to pending, True if shutdown was asked."""
+        closing = False
+        try:
+            task = self.__tasks.get(timeout=POLL_INTERVAL) if block \
+                else self.__tasks.get_nowait()
+            while True:
+                if task is None:
+                    closing = True
+                else:
+                    pending.append(task)
+                task = self.__tasks.get_nowait()
+        except queue.Empty:
+            pass
+        return closing
+
+    def __assign(self, pending:Deque[Task]) -> None:
+        for worker in self.__workers:
+            while worker.future is None and pending:
+                task = pending.popleft()
+                if task[0].set_running_or_notify_cancel():
+                    worker.run(task, self.timeout)
+
+    def __route_replies(self) -> None:
+        busy = {w.conn: w for w in self.__workers if w.future}
+        for conn in connection.wait(list(busy), timeout=POLL_INTERVAL) if busy else []:
+            self.__receive(busy[conn])
+
+    def __dispatch(self) -> None:
+        pending: Deque[Task] = collections.deque()
+        closing = False
+        while not closing or pending or any(w.future for w in self.__workers):
+            # block on the queue only when there is nothing else to wait for
+            idle = not closing and not pending and not any(w.future for w in self.__workers)
+            closing = self.__collect(pending, block=idle) or closing
+            self.__assign(pending)
+            self.__route_replies()
+            self.__kill_hung()
+        for worker in self.__workers:
+            worker.stop()
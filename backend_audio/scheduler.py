@@ -0,0 +1,433 @@
+"""Module aim to synthesize many chapters at once, keeping their original order
+"""
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import queue
+import threading
+from backend_audio import m4b
+from backend_audio import audio_probe
+from backend_audio import backends
+from backend_audio import pytts_pool
+from backend_audio.manifest import JobManifest
+
+DEFAULT_JOBS = 4
+
+logger = logging.getLogger(__name__)
+
+OnDone = Callable[[int, Optional[float]], None]
+
+shared_executor = None #pylint: disable=C0103
+shared_backend = None  #pylint: disable=C0103
+stats_lock = threading.Lock()
+stats = {"chapters": 0, "characters": 0}
+cancel_local = threading.local()
+
+class Cancelled(Exception):
+    """The synthesis was stopped by its CancelToken."""
+
+class CancelToken:
+    """Stop the synthesis of a conversion from another thread: the chapters not started
+    yet are dropped and the synthesize calls of the thread holding the token raise Cancelled,
+    so a conversion given up by its caller stops using the shared workers."""
+    def __init__(self):
+        self.__event = threading.Event()
+        self.__futures = set()
+        self.__lock = threading.Lock()
+
+    def track(self, future:Future) -> None:
+        """Drop future at the cancellation, if it has not started yet."""
+        with self.__lock:
+            self.__futures.add(future)
+        future.add_done_callback(self.__untrack)
+        if self.__event.is_set():
+            future.cancel()
+
+    def __untrack(self, future:Future) -> None:
+        with self.__lock:
+            self.__futures.discard(future)
+
+    def cancel(self) -> None:
+        """Stop the synthesis, from any thread."""
+        self.__event.set()
+        with self.__lock:
+            futures = list(self.__futures)
+        for future in futures:
+            future.cancel()
+
+    def check(self) -> None:
+        """Raise Cancelled if the synthesis was stopped."""
+        if self.__event.is_set():
+            raise Cancelled()
+
+@contextlib.contextmanager
+def cancel_scope(token:CancelToken) -> Iterator[CancelToken]:
+    """Let token stop the synthesize calls made by this thread inside the block.
+
+    Arguments:
+        token: The token to cancel from another thread.
+
+    Yields:
+        The same token.
+    """
+    cancel_local.token = token
+    try:
+        yield token
+    finally:
+        cancel_local.token = None
+
+def __check_cancelled() -> None:
+    token = getattr(cancel_local, "token", None)
+    if token is not None:
+        token.check()
+
+class EdgeTtsExecutor(Executor):
+    """Executor of coroutine functions on an event loop running in its own thread,
+    with at most max_workers coroutines in flight."""
+    def __init__(self, max_workers:int=DEFAULT_JOBS,
+                 loop:Optional[asyncio.AbstractEventLoop]=None):
+        """
+        Arguments:
+            max_workers: The maximum number of coroutines in flight.
+            loop: An event loop already running in its own thread, left running
+                  at shutdown; by default a new one, stopped at shutdown.
+        """
+        self.loop = loop or asyncio.new_event_loop()
+        self.__semaphore = asyncio.Semaphore(max_workers)
+        self.__thread = None
+        if loop is None:
+            self.__thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.__thread.start()
+
+    async def __bounded(self, coroutine_fn, *args, **kwargs) -> Any:
+        async with self.__semaphore:
+            return await coroutine_fn(*args, **kwargs)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future: #pylint: disable=W0221
+        return asyncio.run_coroutine_threadsafe(self.__bounded(fn, *args, **kwargs), self.loop)
+
+    def shutdown(self, wait:bool=True, *, cancel_futures:bool=False) -> None:
+        if self.__thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if wait:
+            self.__thread.join()
+
+def get_audio_duration(done:bool, out_mp3_path:str) -> Optional[float]:
+    """Measure a chapter right after its synthesis, in the worker that produced it.
+
+    Arguments:
+        done: True if the TTS engine reported the MP3 file as saved.
+        out_mp3_path: The path of the chapter MP3 file.
+
+    Returns:
+        The exact duration in seconds, None if the chapter has no valid audio.
+    """
+    if not done or not os.path.isfile(out_mp3_path):
+        return None
+    return audio_probe.get_duration(out_mp3_path)
+
+def __generate_audio_job(job:Tuple[str, str], lang:str, backend:str) -> Optional[float]:
+    text_in, out_mp3_path = job
+    done = m4b.generate_audio(text_in, out_mp3_path, lang=lang, backend=backend)
+    return get_audio_duration(done, out_mp3_path)
+
+async def __generate_audio_job_async(job:Tuple[str, str], lang:str,
+                                     backend:str) -> Optional[float]:
+    text_in, out_mp3_path = job
+    done = await m4b.generate_audio_async(text_in, out_mp3_path, lang=lang, backend=backend)
+    return get_audio_duration(done, out_mp3_path)
+
+def create_executor(backend:str, max_workers:int=DEFAULT_JOBS) -> Executor:
+    """Create the workers suited to a TTS engine, as told by its capabilities:
+    asyncio tasks (EDGE_TTS), threads (GTTS, NULL) or long-lived processes (PYTTS),
+    each one with its own engine, where a hung engine is killed and its chapter
+    reported as not saved.
+
+    Arguments:
+        backend: The string name of the TTS engine.
+        max_workers: The maximum number of chapters synthesized at the same time.
+
+    Returns:
+        The executor, to be shut down by the caller.
+    """
+    workers = backends.get_backend(backend).capabilities.workers
+    if workers == backends.WORKERS_ASYNCIO:
+        return EdgeTtsExecutor(max_workers, m4b.loop)
+    if workers == backends.WORKERS_PROCESSES:
+        cache_args = (None,)
+        if m4b.audio_cache is not None:
+            cache_args = (m4b.audio_cache.cache_dir, m4b.audio_cache.max_size)
+        return pytts_pool.PyttsWorkerPool(max_workers, initializer=m4b.init,
+                                          initargs=(backend, *cache_args))
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+def get_max_workers(backend:str, max_workers:int) -> int:
+    """Bound the workers asked by the user to the concurrency the TTS engine tolerates.
+
+    Arguments:
+        backend: The string name of the TTS engine.
+        max_workers: The maximum number of chapters synthesized at the same time.
+
+    Returns:
+        The number of workers to use.
+    """
+    return max(1, min(max_workers, backends.get_backend(backend).capabilities.max_concurrency))
+
+@contextlib.contextmanager
+def shared_pool(backend:str, max_workers:int=DEFAULT_JOBS) -> Iterator[Executor]:
+    """Share one pool of TTS workers among every synthesize_chapters call in the block,
+    also from different threads, e.g. to convert many documents at once.
+
+    Arguments:
+        backend: The string name of the TTS engine.
+        max_workers: The maximum number of chapters synthesized at the same time.
+
+    Yields:
+        The shared executor.
+    """
+    global shared_executor #pylint: disable=W0603
+    global shared_backend  #pylint: disable=W0603
+    executor = create_executor(backend, get_max_workers(backend, max_workers))
+    shared_executor, shared_backend = executor, backend
+    try:
+        yield executor
+    finally:
+        shared_executor, shared_backend = None, None
+        executor.shutdown()
+
+@contextlib.contextmanager
+def __borrow_executor(backend:str, max_workers:int) -> Iterator[Optional[Executor]]:
+    max_workers = get_max_workers(backend, max_workers)
+    if shared_executor is not None and shared_backend == backend:
+        yield shared_executor
+    elif max_workers <= 1:
+        yield None
+    else:
+        logger.info("synthesizing chapters with %d workers", max_workers)
+        executor = create_executor(backend, max_workers)
+        try:
+            yield executor
+        finally:
+            executor.shutdown()
+
+def __submit(executor:Executor, job:Tuple[str, str], lang:str, backend:str) -> Future:
+    __check_cancelled()
+    if backends.get_backend(backend).capabilities.workers == backends.WORKERS_ASYNCIO:
+        future = executor.submit(__generate_audio_job_async, job, lang, backend)
+    else:
+        future = executor.submit(__generate_audio_job, job, lang, backend)
+    token = getattr(cancel_local, "token", None)
+    if token is not None:
+        token.track(future)
+    return future
+
+def __get_duration(future:Future) -> Optional[float]:
+    __check_cancelled()
+    try:
+        return future.result()
+    except Exception as ex: #pylint: disable=W0718
+        # a chapter failing in its worker must not stop the others
+        logger.error("chapter not saved: %r", ex)
+        return None
+
+def __run_executor(executor:Executor, jobs:List[Tuple[str, str]],
+                   lang:str, backend:str, on_done:OnDone) -> None:
+    futures = {__submit(executor, job, lang, backend): idx for idx, job in enumerate(jobs)}
+    for future in as_completed(futures):
+        on_done(futures[future], __get_duration(future))
+
+def __run_serial(jobs:List[Tuple[str, str]], lang:str, backend:str, on_done:OnDone) -> None:
+    for idx, job in enumerate(jobs):
+        __check_cancelled()
+        on_done(idx, __generate_audio_job(job, lang, backend))
+
+def __run(jobs:List[Tuple[str, str]], lang:str, backend:str,
+          max_workers:int, on_done:OnDone) -> None:
+    with __borrow_executor(backend, min(max_workers, len(jobs))) as executor:
+        if executor is None:
+            __run_serial(jobs, lang, backend, on_done)
+        else:
+            __run_executor(executor, jobs, lang, backend, on_done)
+
+def __get_pending(jobs:List[Tuple[str, str]], hashes:List[str],
+                  manifest:Optional[JobManifest]) -> List[int]:
+    if manifest is None:
+        return list(range(len(jobs)))
+    pending = [idx for idx, (_, out_mp3_path) in enumerate(jobs)
+               if not manifest.is_done(out_mp3_path, hashes[idx])]
+    if len(pending) < len(jobs):
+        logger.info("resuming: %d of %d chapters already done",
+                    len(jobs) - len(pending), len(jobs))
+    return pending
+
+def __update_stats(jobs:Iterable[Tuple[str, str]]) -> None:
+    with stats_lock:
+        for text_in, _ in jobs:
+            stats["chapters"] += 1
+            stats["characters"] += len(text_in)
+
+def synthesize_chapters(jobs:List[Tuple[str, str]], *, #pylint: disable=R0913
+                        lang:str="it", backend:str="PYTTS",
+                        max_workers:int=DEFAULT_JOBS,
+                        manifest:Optional[JobManifest]=None,
+                        on_done:Optional[Callable[[int, bool], None]]=None
+                        ) -> List[Optional[float]]:
+    """Generate the audio of many chapters concurrently, on the shared pool if any.
+
+    Arguments:
+        jobs: A list of (chapter text, output MP3 path) in the final chapter order.
+        lang: The desired language abbreviation.
+        backend: The string name of the TTS engine.
+        max_workers: The maximum number of chapters synthesized at the same time.
+        manifest: If given, chapters already finished are skipped
+                  and each chapter is recorded as soon as it finishes.
+        on_done: Called with (job index, True if its MP3 file was saved) as soon as
+                 each chapter finishes, in completion order, skipped chapters first.
+
+    Returns:
+        A list with, for each job and in the same order, the exact duration in seconds
+        of its MP3 file, None if the file was not saved.
+    """
+    results: List[Optional[float]] = [None] * len(jobs)
+    hashes = [m4b.get_cache_key(text_in, lang=lang, backend=backend) for text_in, _ in jobs]
+    pending = __get_pending(jobs, hashes, manifest)
+    on_done = on_done or (lambda idx, done: None)
+    for idx in sorted(set(range(len(jobs))) - set(pending)):
+        results[idx] = manifest.get_duration(jobs[idx][1])
+        on_done(idx, True)
+    def on_pending_done(pending_idx:int, duration:Optional[float]) -> None:
+        idx = pending[pending_idx]
+        results[idx] = duration
+        if manifest is not None:
+            manifest.mark(jobs[idx][1], hashes[idx], duration)
+        on_done(idx, duration is not None)
+    __run([jobs[idx] for idx in pending], lang, backend, max_workers, on_pending_done)
+    __update_stats(jobs)
+    return results
+
+class StreamRecorder: #pylint: disable=R0902
+    """Results of a synthesize_stream call, in chapter order: each chapter is recorded
+    from the calling thread as soon as it finishes, with at most max_queued chapters
+    handed to the workers and not recorded yet."""
+    def __init__(self, manifest:Optional[JobManifest], #pylint: disable=R0913
+                 on_done:Callable[[int, bool], None], max_queued:int,
+                 get_duration:Callable[[Future], Optional[float]], keep_results:bool=True):
+        """
+        Arguments:
+            manifest: If given, each chapter is recorded as soon as it finishes.
+            on_done: Called with (job index, True if its MP3 file was saved).
+            max_queued: The maximum number of chapters in the workers.
+            get_duration: Get the duration of a chapter from its future.
+            keep_results: If False, results stays empty and the chapters
+                          are only reported to on_done.
+        """
+        self.results: List[Optional[float]] = []
+        self.count = 0
+        self.__keep_results = keep_results
+        self.__manifest = manifest
+        self.__on_done = on_done
+        self.__max_queued = max_queued
+        self.__get_duration = get_duration
+        self.__finished: "queue.Queue[Tuple[int, str, str, Future]]" = queue.Queue()
+        self.__in_flight = 0
+
+    def add(self) -> int:
+        """Reserve the result of the next chapter and return its index."""
+        if self.__keep_results:
+            self.results.append(None)
+        self.count += 1
+        return self.count - 1
+
+    def skip(self, idx:int, out_mp3_path:str) -> None:
+        """Record a chapter already done by a previous run."""
+        if self.__keep_results:
+            self.results[idx] = self.__manifest.get_duration(out_mp3_path)
+        self.__on_done(idx, True)
+
+    def record(self, idx:int, out_mp3_path:str, text_hash:str,
+               duration:Optional[float]) -> None:
+        """Record a finished chapter, duration is None if it was not saved."""
+        if self.__keep_results:
+            self.results[idx] = duration
+        if self.__manifest is not None:
+            self.__manifest.mark(out_mp3_path, text_hash, duration)
+        self.__on_done(idx, duration is not None)
+
+    def wait_for_slot(self) -> None:
+        """Record the finished chapters until another one can be handed to the workers."""
+        while self.__in_flight >= self.__max_queued:
+            self.__record_next_finished()
+
+    def track(self, idx:int, out_mp3_path:str, text_hash:str, future:Future) -> None:
+        """Record the chapter of future once it finishes, by wait_for_slot or drain."""
+        future.add_done_callback(lambda future: self.__finished.put(
+            (idx, out_mp3_path, text_hash, future)))
+        self.__in_flight += 1
+
+    def drain(self) -> None:
+        """Record every chapter still in the workers."""
+        while self.__in_flight > 0:
+            self.__record_next_finished()
+
+    def __record_next_finished(self) -> None:
+        idx, out_mp3_path, text_hash, future = self.__finished.get()
+        self.__in_flight -= 1
+        self.record(idx, out_mp3_path, text_hash, self.__get_duration(future))
+
+def synthesize_stream(jobs:Iterable[Tuple[str, str]], *, #pylint: disable=R0913
+                      lang:str="it", backend:str="PYTTS",
+                      max_workers:int=DEFAULT_JOBS,
+                      manifest:Optional[JobManifest]=None,
+                      on_done:Optional[Callable[[int, bool], None]]=None,
+                      max_queued:Optional[int]=None,
+                      keep_results:bool=True) -> List[Optional[float]]:
+    """Generate the audio of chapters while they are still being extracted:
+    each job is handed to the workers as soon as the jobs iterable yields it, with at most
+    max_queued chapters waiting or in synthesis, so extraction never runs far ahead.
+
+    Arguments:
+        jobs: An iterable, e.g. a generator, of (chapter text, output MP3 path)
+              in the final chapter order.
+        lang: The desired language abbreviation.
+        backend: The string name of the TTS engine.
+        max_workers: The maximum number of chapters synthesized at the same time.
+        manifest: If given, chapters already finished are skipped
+                  and each chapter is recorded as soon as it finishes.
+        on_done: Called with (job index, True if its MP3 file was saved) as soon as
+                 each chapter finishes, always from the calling thread.
+        max_queued: The bound of the queue between extraction and synthesis,
+                    by default twice max_workers.
+        keep_results: If False, the chapters are only reported to on_done, so a stream
+                      of any length holds no per-job result.
+
+    Returns:
+        A list with, for each job and in the same order, the exact duration in seconds
+        of its MP3 file, None if the file was not saved; empty if keep_results is False.
+    """
+    jobs = iter(jobs)
+    # read ahead a job per worker: a stream shorter than that, e.g. a one-line text,
+    # starts only a worker per job, as synthesize_chapters does
+    first_jobs = list(itertools.islice(jobs, get_max_workers(backend, max_workers)))
+    max_workers = max(1, min(max_workers, len(first_jobs)))
+    recorder = StreamRecorder(manifest, on_done or (lambda idx, done: None),
+                              max_queued or 2 * max_workers, __get_duration, keep_results)
+    with __borrow_executor(backend, max_workers) as executor:
+        for job in itertools.chain(first_jobs, jobs):
+            __check_cancelled()
+            idx = recorder.add()
+            text_hash = m4b.get_cache_key(job[0], lang=lang, backend=backend)
+            __update_stats([job])
+            if manifest is not None and manifest.is_done(job[1], text_hash):
+                recorder.skip(idx, job[1])
+            elif executor is None:
+                recorder.record(idx, job[1], text_hash, __generate_audio_job(job, lang, backend))
+            else:
+                recorder.wait_for_slot()
+                recorder.track(idx, job[1], text_hash, __submit(executor, job, lang, backend))
+        recorder.drain()
+    return recorder.results
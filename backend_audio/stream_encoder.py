@@ -0,0 +1,180 @@
+"""Module aim to encode the audiobook while the chapters are still being synthesized:
+each finished chapter is decoded and piped, in chapter order, into one ffmpeg encoder
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import contextlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+import ffmpeg
+from backend_audio import m4b
+from backend_audio import ffmetadata_generator
+
+CHANNELS = 2
+SAMPLE_WIDTH = 2 # bytes of a signed 16 bits sample
+FRAME_SIZE = CHANNELS * SAMPLE_WIDTH
+BLOCK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+class StderrReader(threading.Thread):
+    """Collect the stderr of an ffmpeg process in the background,
+    so a chatty process never blocks on a full pipe while its other pipes are used."""
+    def __init__(self, process):
+        """
+        Arguments:
+            process: The ffmpeg process, started with pipe_stderr=True.
+        """
+        super().__init__(daemon=True)
+        self.__stream = process.stderr
+        self.__data = b""
+        self.start()
+
+    def run(self) -> None:
+        self.__data = self.__stream.read()
+
+    def get(self) -> bytes:
+        """Wait the end of the stderr and get all of it."""
+        self.join()
+        return self.__data
+
+class M4bStreamEncoder: #pylint: disable=R0902
+    """Long-running AAC encoder fed with raw PCM, chapter after chapter.
+    Chapter boundaries are measured by counting the samples flowing into the encoder.
+    """
+    def __init__(self, output_path:str, pause_duration:int=0, remove_chapters:bool=True):
+        """
+        Arguments:
+            output_path: The path to save the final audiobook.
+            pause_duration: the time pass between chapters, by default no pause
+            remove_chapters: If True, each chapter audio file is removed once encoded.
+        """
+        self.output_path = output_path
+        self.pause_duration = pause_duration
+        self.remove_chapters = remove_chapters
+        self.chapter_paths: List[str] = []
+        self.chapter_titles: List[str] = []
+        self.chapter_samples: List[int] = []
+        self.__audio_path = output_path + ".part.m4a"
+        self.__pending: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        self.__next_idx = 0
+        self.__reserved = 0
+        self.__queue: "queue.Queue[Optional[Tuple[str, Optional[str]]]]" = queue.Queue()
+        self.__error: Optional[Exception] = None
+        self.__encoder = (ffmpeg.input('pipe:', f='s16le', ac=CHANNELS, ar=m4b.SAMPLE_RATE)
+                          .output(self.__audio_path, f='mp4', acodec='aac',
+                                  audio_bitrate=m4b.BIT_RATE_HUMAN)
+                          .global_args('-loglevel', 'error')
+                          .overwrite_output()
+                          .run_async(pipe_stdin=True, pipe_stderr=True))
+        self.__encoder_stderr = StderrReader(self.__encoder)
+        self.__writer = threading.Thread(target=self.__write_loop, daemon=True)
+        self.__writer.start()
+
+    def submit(self, idx:int, audio_path:Optional[str], title:Optional[str]=None) -> None:
+        """Hand over a finished chapter, chapters may finish in any order
+        but they are encoded in idx order.
+
+        Arguments:
+            idx: The position of the chapter, starting from 0 without gaps.
+            audio_path: The path of the chapter audio, None if the chapter has no audio.
+            title: The chapter title, by default c{chapter number}.
+        """
+        self.__pending[idx] = (audio_path, title)
+        while self.__next_idx in self.__pending:
+            audio_path, title = self.__pending.pop(self.__next_idx)
+            self.__next_idx += 1
+            if audio_path is not None:
+                self.__queue.put((audio_path, title))
+
+    def get_on_done(self, chapter_paths:List[str]) -> Callable[[int, bool], None]:
+        """Get a callback, for the chapter scheduler, that submits the finished chapters.
+        Each call gets the chapters following the ones of the previous calls,
+        so a book synthesized in many parts is encoded as one.
+
+        Arguments:
+            chapter_paths: The path of the audio of each chapter, in chapter order.
+
+        Returns:
+            A function called with (chapter index in chapter_paths, True if its audio was saved).
+        """
+        first_idx = self.__reserved
+        self.__reserved += len(chapter_paths)
+        def on_done(idx:int, done:bool) -> None:
+            self.submit(first_idx + idx, chapter_paths[idx] if done else None)
+        return on_done
+
+    def __write_loop(self) -> None:
+        item = self.__queue.get()
+        while item is not None:
+            if self.__error is None:
+                try:
+                    self.__write_chapter(*item)
+                except (OSError, ffmpeg.Error) as ex:
+                    self.__error = ex
+            item = self.__queue.get()
+
+    def __write_pcm(self, data:bytes) -> int:
+        self.__encoder.stdin.write(data)
+        return len(data) // FRAME_SIZE
+
+    def __write_chapter(self, audio_path:str, title:Optional[str]) -> None:
+        if self.chapter_samples and self.pause_duration > 0:
+            silence = bytes(int(self.pause_duration * m4b.SAMPLE_RATE) * FRAME_SIZE)
+            self.chapter_samples[-1] += self.__write_pcm(silence)
+        decoder = (ffmpeg.input(audio_path)
+                   .output('pipe:', f='s16le', acodec='pcm_s16le',
+                           ac=CHANNELS, ar=m4b.SAMPLE_RATE)
+                   .global_args('-loglevel', 'error')
+                   .run_async(pipe_stdout=True, pipe_stderr=True))
+        decoder_stderr = StderrReader(decoder)
+        samples = 0
+        for block in iter(lambda: decoder.stdout.read(BLOCK_SIZE), b""):
+            samples += self.__write_pcm(block)
+        if decoder.wait() != 0:
+            raise ffmpeg.Error('ffmpeg', None, decoder_stderr.get())
+        self.chapter_paths.append(audio_path)
+        self.chapter_titles.append(title or f"c{len(self.chapter_titles)}")
+        self.chapter_samples.append(samples)
+        logger.info("encoded chapter %s", audio_path)
+        if self.remove_chapters:
+            os.remove(audio_path)
+
+    def __close_encoder(self) -> None:
+        with contextlib.suppress(BrokenPipeError):
+            self.__encoder.stdin.close()
+        stderr = self.__encoder_stderr.get()
+        # a dead encoder breaks the pipe: its own error tells why
+        if self.__encoder.wait() != 0 and not isinstance(self.__error, ffmpeg.Error):
+            self.__error = ffmpeg.Error('ffmpeg', None, stderr)
+
+    def get_durations(self) -> List[float]:
+        """Get the exact duration in seconds of each encoded chapter, pause included."""
+        return [samples / m4b.SAMPLE_RATE for samples in self.chapter_samples]
+
+    def finish(self, author:str=None, title:str=None) -> None:
+        """Wait the encoding of all the submitted chapters and save the final audiobook.
+
+        Arguments:
+            author: The author of the audiobook.
+            title: The title of the audiobook.
+        """
+        self.__queue.put(None)
+        self.__writer.join()
+        self.__close_encoder()
+        if self.__error is not None:
+            if isinstance(self.__error, ffmpeg.Error):
+                logger.error(self.__error.stderr.decode(errors="replace"))
+            raise self.__error
+        metadata = ffmetadata_generator.generate_ffmetadata(self.chapter_paths,
+                                                            chapter_titles=self.chapter_titles,
+                                                            author=author, title=title,
+                                                            durations=self.get_durations())
+        with tempfile.TemporaryDirectory() as metadata_dir:
+            ffmetadata_path = os.path.join(metadata_dir, "ffmetadata")
+            with open(ffmetadata_path, "w", encoding="UTF-8") as file_ffmetadata:
+                file_ffmetadata.write(metadata)
+            m4b.mux_ffmetadata(['-i', self.__audio_path], ffmetadata_path, self.output_path)
+        os.remove(self.__audio_path)
@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+"""
+file: [batch2audio.py](https://github.com/deangelisdf/write2audiobook/blob/main/batch2audio.py)
+
+description: Convert a whole library of documents (epub, docx, pptx, pdf, txt) to audiobooks,
+sharing one TTS engine and one pool of TTS workers among all the documents.
+
+Usage example:
+    `python batch2audio.py library/ --output-dir audiobooks --documents 4 --jobs 8`
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from backend_audio import m4b, scheduler
+from frontend import input_tool
+import docx2audio
+import ebook2audio
+import pdf2audio
+import pptx2audio
+import txt2audio
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACK_END_TTS = m4b.get_back_end_tts()
+
+CONVERTERS: Dict[str, Tuple[Callable[[argparse.Namespace], None], str]] = {
+    ".epub": (ebook2audio.convert, "m4b"),
+    ".docx": (docx2audio.convert, "m4b"),
+    ".pptx": (pptx2audio.convert, "m4b"),
+    ".pdf":  (pdf2audio.convert, "m4b"),
+    ".txt":  (txt2audio.convert, "mp3"),
+}
+
+def find_documents(input_path:str, output_dir:str) -> List[Tuple[str, str]]:
+    """Find the documents to convert and where to save their audiobooks.
+
+    Arguments:
+        input_path: A directory tree of documents, or a text file with one document per line,
+                    relative paths are relative to the text file directory.
+        output_dir: The directory where the audiobooks are saved, mirroring the input tree.
+
+    Returns:
+        A sorted list of (document path, output path).
+    """
+    if os.path.isdir(input_path):
+        root_dir = input_path
+        documents = [os.path.join(dir_path, file_name)
+                     for dir_path, _, file_names in os.walk(input_path)
+                     for file_name in file_names]
+    else:
+        root_dir = os.path.dirname(input_path)
+        with open(input_path, "r", encoding="UTF-8") as list_file:
+            documents = [os.path.join(root_dir, line.strip()) for line in list_file
+                         if line.strip() and not line.startswith("#")]
+    jobs = []
+    for document in sorted(documents):
+        base_path, ext = os.path.splitext(document)
+        if ext.lower() not in CONVERTERS:
+            continue
+        relative_path = os.path.relpath(base_path, root_dir)
+        if relative_path.startswith(os.pardir):
+            relative_path = os.path.basename(base_path)
+        jobs.append((document, os.path.join(output_dir,
+                                            f"{relative_path}.{CONVERTERS[ext.lower()][1]}")))
+    return jobs
+
+def convert_document(document:str, output_path:str, args:argparse.Namespace) -> None:
+    """Convert a single document with the converter of its extension.
+
+    Arguments:
+        document: The path of the document.
+        output_path: The path to save the audiobook.
+        args: The batch options, shared by every document.
+    """
+    converter, _ = CONVERTERS[os.path.splitext(document)[1].lower()]
+    document_args = argparse.Namespace(**vars(args))
+    document_args.file, document_args.output_path = document, output_path
+    os.makedirs(os.path.dirname(output_path) or os.curdir, exist_ok=True)
+    converter(document_args)
+
+class BatchRunner: #pylint: disable=R0902,R0903
+    """Convert the documents on a fixed number of worker threads.
+    A document running longer than the timeout is reported as failed, its synthesis is
+    cancelled and its worker is replaced, so a stuck conversion never blocks the rest
+    of the library.
+    """
+    def __init__(self, jobs:List[Tuple[str, str]], args:argparse.Namespace):
+        """
+        Arguments:
+            jobs: A list of (document path, output path).
+            args: The batch options, shared by every document.
+        """
+        self.args = args
+        self.failed: List[str] = []
+        self.converted: List[str] = []
+        self.__todo: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self.__results: "queue.Queue[Tuple[str, Optional[Exception]]]" = queue.Queue()
+        self.__running: Dict[threading.Thread, Tuple[str, float, scheduler.CancelToken]] = {}
+        self.__abandoned = set()
+        self.__lock = threading.Lock()
+        for job in jobs:
+            self.__todo.put(job)
+        self.__remaining = len(jobs)
+
+    def __worker(self) -> None:
+        current = threading.current_thread()
+        while current not in self.__abandoned:
+            try:
+                document, output_path = self.__todo.get_nowait()
+            except queue.Empty:
+                return
+            self.__convert(current, document, output_path)
+
+    def __convert(self, current:threading.Thread, document:str, output_path:str) -> None:
+        token = scheduler.CancelToken()
+        with self.__lock:
+            self.__running[current] = (document, time.monotonic(), token)
+        error = None
+        try:
+            with scheduler.cancel_scope(token):
+                convert_document(document, output_path, self.args)
+        except Exception as ex: #pylint: disable=W0718
+            error = ex
+        with self.__lock:
+            self.__running.pop(current, None)
+            if current not in self.__abandoned:
+                self.__results.put((document, error))
+
+    def __start_worker(self) -> None:
+        threading.Thread(target=self.__worker, daemon=True).start()
+
+    def __abandon_stuck(self) -> None:
+        if self.args.timeout is None:
+            return
+        now = time.monotonic()
+        with self.__lock:
+            stuck = [(thread, document, token)
+                     for thread, (document, start, token) in self.__running.items()
+                     if now - start > self.args.timeout]
+            for thread, document, token in stuck:
+                # its chapters leave the shared pool, the thread ends at its next chapter
+                token.cancel()
+                self.__abandoned.add(thread)
+                del self.__running[thread]
+                self.__results.put((document, TimeoutError(f"over {self.args.timeout}s")))
+        for _ in stuck:
+            self.__start_worker()
+
+    def __record(self, document:str, error:Optional[Exception]) -> None:
+        self.__remaining -= 1
+        if error is None:
+            self.converted.append(document)
+            logger.info("converted %s, %d left", document, self.__remaining)
+        else:
+            self.failed.append(document)
+            logger.error("failed %s: %s", document, error)
+
+    def run(self) -> None:
+        """Convert all the documents, returning when each one is converted or failed."""
+        for _ in range(self.args.documents):
+            self.__start_worker()
+        while self.__remaining > 0:
+            try:
+                self.__record(*self.__results.get(timeout=1))
+            except queue.Empty:
+                pass
+            self.__abandon_stuck()
+
+def convert_all(args:argparse.Namespace) -> None:
+    """Convert every document of a batch, the TTS backend must be already initialized.
+
+    Arguments:
+        args: The options supplied by the user, `input` and `output_dir` included.
+    """
+    jobs = find_documents(args.input, args.output_dir)
+    logger.info("%d documents to convert", len(jobs))
+    runner = BatchRunner(jobs, args)
+    start = time.monotonic()
+    with scheduler.shared_pool(BACK_END_TTS, args.jobs):
+        runner.run()
+    elapsed = max(time.monotonic() - start, 1e-6)
+    logger.info("%d converted, %d failed in %.1fs: %.2f documents/hour, %.1f characters/s",
+                len(runner.converted), len(runner.failed), elapsed,
+                len(runner.converted) * 3600 / elapsed,
+                scheduler.stats["characters"] / elapsed)
+    for document in runner.failed:
+        logger.error("not converted: %s", document)
+
+def main():
+    """main function"""
+    args = input_tool.get_batch_args()
+    # the shared edge-tts client is closed also when the batch fails or is interrupted
+    m4b.run_converter(BACK_END_TTS, convert_all, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+"""
+file: bench_chunker.py
+description: measure the text chunking time on multi-megabyte texts,
+the time per megabyte shall stay flat as the text grows (linear scaling).
+
+Usage example:
+    `python benchmarks/bench_chunker.py`
+"""
+import sys
+import os
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import chunker #pylint: disable=C0413
+
+PARAGRAPH = ("Nel mezzo del cammin di nostra vita, mi ritrovai per una selva oscura; "
+             "ché la diritta via era smarrita. Ahi quanto a dir qual era è cosa dura! "
+             "Esta selva selvaggia e aspra e forte che nel pensier rinova la paura.\n\n")
+SIZES_MB = (1, 2, 4, 8)
+
+def bench(size_mb:int, backend:str) -> float:
+    """Return the seconds needed to chunk a text of size_mb megabytes"""
+    text = PARAGRAPH * (size_mb * 1024**2 // len(PARAGRAPH))
+    start = time.perf_counter()
+    for _ in chunker.iter_chunks(text, chunker.get_max_chars(backend)):
+        pass
+    return time.perf_counter() - start
+
+def main():
+    """main function"""
+    for backend in chunker.MAX_CHARS_BACKEND:
+        for size_mb in SIZES_MB:
+            elapsed = bench(size_mb, backend)
+            print(f"{backend:9} {size_mb:2d} MB: {elapsed:7.3f} s  "
+                  f"{elapsed / size_mb:6.3f} s/MB")
+
+if __name__ == "__main__":
+    main()
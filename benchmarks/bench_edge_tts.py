@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+"""
+file: bench_edge_tts.py
+description: measure the EDGE-TTS client throughput against a local stand-in of the
+service answering after a fixed latency, the requests per second shall grow with the
+concurrency until the rate limit is reached.
+
+Usage example:
+    `python benchmarks/bench_edge_tts.py`
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+sys.path.insert(0, os.path.join(src_path, "tests"))
+
+from edge_tts_standin import EdgeTtsStandin #pylint: disable=C0413
+from backend_audio import edge_tts_client #pylint: disable=C0413
+
+REQUESTS = 64
+LATENCY = 0.2 # seconds of the stand-in for each request
+CONCURRENCY = (1, 4, 16, 64)
+RATE = 50.0
+
+async def bench(max_concurrency:int, work_dir:str) -> float:
+    """Return the requests per second with max_concurrency requests in flight"""
+    standin = EdgeTtsStandin(delay=LATENCY)
+    edge_tts_client.set_endpoint(await standin.start())
+    client = edge_tts_client.EdgeTtsClient("it-IT-ElsaNeural", rate=RATE, burst=10,
+                                           max_concurrency=max_concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*[client.save(f"chapter {idx}", os.path.join(work_dir, f"{idx}.mp3"))
+                           for idx in range(REQUESTS)])
+    elapsed = time.perf_counter() - start
+    await standin.stop()
+    return REQUESTS / elapsed
+
+def main():
+    """main function"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        for max_concurrency in CONCURRENCY:
+            throughput = asyncio.run(bench(max_concurrency, work_dir))
+            print(f"{max_concurrency:3d} in flight: {throughput:7.1f} requests/s "
+                  f"(rate limit {RATE:.0f}/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+"""
+file: bench_gtts_fetch.py
+description: measure the gTTS chunk fetching throughput against a local stand-in of the
+Google endpoint answering after a fixed latency, the chunks per second shall grow with
+the number of workers.
+
+Usage example:
+    `python benchmarks/bench_gtts_fetch.py`
+"""
+import sys
+import os
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+sys.path.insert(0, os.path.join(src_path, "tests"))
+
+from gtts_standin import GttsStandin #pylint: disable=C0413
+from backend_audio import gtts_client #pylint: disable=C0413
+
+CHUNKS = 64
+LATENCY = 0.1 # seconds of the stand-in for each request
+WORKERS = (1, 4, 8, 16)
+
+def bench(max_workers:int) -> float:
+    """Return the chunks fetched per second with max_workers requests in flight"""
+    standin = GttsStandin(delay=LATENCY)
+    client = gtts_client.GttsClient(max_workers, url=standin.start())
+    start = time.perf_counter()
+    client.fetch_all([f"chunk number {idx}" for idx in range(CHUNKS)])
+    elapsed = time.perf_counter() - start
+    client.close()
+    standin.stop()
+    return CHUNKS / elapsed
+
+def main():
+    """main function"""
+    for max_workers in WORKERS:
+        print(f"{max_workers:3d} workers: {bench(max_workers):7.1f} chunks/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""
+file: bench_opf_index.py
+description: measure the lookup of every spine item in the content.opf manifest,
+the time per item shall stay flat as the manifest grows (linear scaling),
+while a XPath query per item grows with the manifest size (quadratic scaling).
+
+Usage example:
+    `python benchmarks/bench_opf_index.py`
+"""
+import sys
+import os
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from lxml import etree #pylint: disable=C0413
+import ebook2audio #pylint: disable=C0413
+
+SIZES = (1000, 2500, 5000, 10000)
+XPATH_MAX_SIZE = 2500 # the XPath lookup is too slow beyond
+
+def make_opf(size:int) -> etree._ElementTree:
+    """Build a content.opf with size manifest items, all of them in the spine"""
+    items = "".join(f'<item id="c{idx}" href="Text/c{idx}.xhtml" '
+                    f'media-type="application/xhtml+xml"/>' for idx in range(size))
+    itemrefs = "".join(f'<itemref idref="c{idx}"/>' for idx in range(size))
+    guide = '<reference type="cover" href="Text/c0.xhtml"/>'
+    return etree.ElementTree(etree.fromstring(
+        f'<package xmlns="http://www.idpf.org/2007/opf"><manifest>{items}</manifest>'
+        f'<spine>{itemrefs}</spine><guide>{guide}</guide></package>'))
+
+def get_idrefs(tree:etree._ElementTree) -> list:
+    """Get the spine item ids"""
+    return tree.xpath("//*[local-name()='package']/*[local-name()='spine']"
+                      "/*[local-name()='itemref']/@idref")
+
+def bench_index(tree:etree._ElementTree) -> float:
+    """Return the seconds needed to index the manifest and look up every spine item"""
+    start = time.perf_counter()
+    opf_index = ebook2audio.OpfIndex(tree, ebook2audio.get_guide_epub(tree))
+    for idref in get_idrefs(tree):
+        opf_index.get_href(idref)
+    return time.perf_counter() - start
+
+def bench_xpath(tree:etree._ElementTree) -> float:
+    """Return the seconds needed to look up every spine item with a XPath query each"""
+    start = time.perf_counter()
+    guide = ebook2audio.get_guide_epub(tree)
+    for idref in get_idrefs(tree):
+        for href in tree.xpath(f"//*[local-name()='package']"
+                               f"/*[local-name()='manifest']"
+                               f"/*[local-name()='item'][@id='{idref}']"
+                               f"/@href"):
+            _ = href in guide.values()
+    return time.perf_counter() - start
+
+def main():
+    """main function"""
+    for size in SIZES:
+        tree = make_opf(size)
+        elapsed = bench_index(tree)
+        line = f"{size:6d} items: index {elapsed:7.3f} s {elapsed * 1e6 / size:7.2f} us/item"
+        if size <= XPATH_MAX_SIZE:
+            elapsed = bench_xpath(tree)
+            line += f"  xpath {elapsed:7.3f} s {elapsed * 1e6 / size:9.2f} us/item"
+        print(line)
+
+if __name__ == "__main__":
+    main()
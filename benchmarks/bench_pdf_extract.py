@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""
+file: bench_pdf_extract.py
+description: measure the span extraction time of a many-page pdf with more and more
+worker processes, the speedup shall grow close to the number of cores.
+
+Usage example:
+    `python benchmarks/bench_pdf_extract.py`
+"""
+import sys
+import os
+import time
+import tempfile
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+import fitz #pylint: disable=C0413
+import pdf2audio #pylint: disable=C0413
+
+PAGES = 800
+LINES_PER_PAGE = 45
+
+def make_pdf(pdf_path:str, pages:int) -> None:
+    """Write a pdf of pages pages, each one with a header, a footer and many lines"""
+    pdf_doc = fitz.open()
+    for page_num in range(pages):
+        page = pdf_doc.new_page()
+        page.insert_text((72, 40), "Quarterly report", fontsize=9)
+        for line in range(LINES_PER_PAGE):
+            page.insert_text((72, 72 + line * 15),
+                             f"Line {line} of page {page_num}, some text to read aloud.",
+                             fontsize=11)
+        page.insert_text((72, 800), f"pag. {page_num + 1}", fontsize=9)
+    pdf_doc.save(pdf_path)
+
+def bench(pdf_path:str, max_workers:int) -> float:
+    """Return the seconds needed to extract all the spans with max_workers processes"""
+    with fitz.open(pdf_path) as pdf_doc:
+        start = time.perf_counter()
+        for _ in pdf2audio.iter_spans(pdf_doc, max_workers):
+            pass
+        return time.perf_counter() - start
+
+def main():
+    """main function"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "bench.pdf")
+        make_pdf(pdf_path, PAGES)
+        serial = bench(pdf_path, 1)
+        max_workers = 1
+        while max_workers <= (os.cpu_count() or 1):
+            elapsed = bench(pdf_path, max_workers) if max_workers > 1 else serial
+            print(f"{max_workers:2d} workers: {elapsed:7.3f} s  speedup {serial / elapsed:5.2f}x")
+            max_workers *= 2
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+"""
+file: bench_pipeline.py
+description: measure the text to audio pipeline throughput, chunking, scheduling and
+joining the audio, with the offline NULL TTS engine so no engine nor network is involved.
+
+Usage example:
+    `python benchmarks/bench_pipeline.py`
+"""
+import sys
+import os
+import time
+import tempfile
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import backends, chunker, scheduler #pylint: disable=C0413
+import txt2audio #pylint: disable=C0413
+
+PARAGRAPHS = 400
+JOBS = (1, 4, 8)
+
+def bench(max_workers:int, text:str, work_dir:str) -> float:
+    """Return the characters synthesized per second with max_workers jobs"""
+    max_chars = backends.get_backend("NULL").capabilities.max_chars
+    jobs = txt2audio.iter_unit_jobs(chunker.iter_chunks(text, max_chars), work_dir, ".wav")
+    start = time.perf_counter()
+    scheduler.synthesize_stream(jobs, backend="NULL", max_workers=max_workers)
+    return len(text) / (time.perf_counter() - start)
+
+def main():
+    """main function"""
+    text = "\n\n".join(f"Paragraph {idx}. " + "some words to read " * 50
+                       for idx in range(PARAGRAPHS))
+    with tempfile.TemporaryDirectory() as work_dir:
+        for max_workers in JOBS:
+            print(f"{max_workers:3d} jobs: {bench(max_workers, text, work_dir) / 1e6:7.2f} "
+                  f"M characters/s")
+
+if __name__ == "__main__":
+    main()
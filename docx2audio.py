@@ -8,17 +8,26 @@ Usage example:
     `python docx2audio.py document.docx`
 """
 
+import argparse
+import contextlib
 import os
+import posixpath
+import shutil
 import logging
-from typing import List, Tuple, Union, Generator
+import zipfile
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, IO, Iterator, List, Optional, Tuple, TypeVar, Union, Generator
+from lxml import etree
 from docx import Document
 from docx.document import Document as _Document
 from docx.oxml.text.paragraph import CT_P
 from docx.oxml.table import CT_Tbl
 from docx.table import _Cell, Table, _Row
 from docx.text.paragraph import Paragraph
-from backend_audio import ffmetadata_generator
+from docx.styles import BabelFish
 from backend_audio import m4b
+from backend_audio import manifest
+from backend_audio import scheduler
 from frontend import input_tool
 
 logging.basicConfig(level=logging.INFO)
@@ -27,12 +36,25 @@ logger = logging.getLogger(__name__)
 BACK_END_TTS = m4b.get_back_end_tts()
 LANGUAGE = "it"
 
-TITLE_KEYWORD  = {"it-IT":"TITOLO",   "en":"TITLE"}
-CHAPTER_KEYWORD= {"it-IT":"CAPITOLO", "en":"CHAPTER"}
+TITLE_KEYWORD  = {"it-IT":"TITOLO",   "it":"TITOLO",   "en":"TITLE"}
+CHAPTER_KEYWORD= {"it-IT":"CAPITOLO", "it":"CAPITOLO", "en":"CHAPTER"}
 TITLE_TOKENS   = ('Heading 1', 'Title', 'Titolo')
 LIST_ITEM_TOKEN= 'List Paragraph'
 CHAPTER_TOKEN  = 'Heading 2'
 
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+REL_TYPE_DOCUMENT = "/officeDocument"
+REL_TYPE_STYLES = "/styles"
+# text equivalent of the run children, as python-docx Run.text
+RUN_TEXT = {f"{W_NS}tab": "\t", f"{W_NS}ptab": "\t", f"{W_NS}cr": "\n",
+            f"{W_NS}noBreakHyphen": "-"}
+
+TableRows = List[List[str]]
+# ("p", (style name, text)) for a paragraph, ("tbl", rows) for a table
+Block = Tuple[str, Union[Tuple[Optional[str], str], TableRows]]
+BlockT = TypeVar("BlockT")
+
 def __get_parent_element(parent: Union[Document, _Cell, _Row]):
     if isinstance(parent, _Document):
         parent_elm = parent.element.body
@@ -67,6 +89,19 @@ def iter_block_items(
         elif isinstance(child, CT_Tbl):
             yield Table(child, parent)
 
+def __iter_chapter_blocks(blocks:Iterator[BlockT], is_start:Callable[[BlockT], bool],
+                         is_empty:Callable[[BlockT], bool]) -> Iterator[List[BlockT]]:
+    chapter: List[BlockT] = []
+    for block in blocks:
+        if is_start(block):
+            if len(chapter) > 1:
+                yield chapter
+            chapter = []
+        if not is_empty(block):
+            chapter.append(block)
+    if len(chapter) > 1:
+        yield chapter
+
 def extract_chapters(doc:Document,
                      style_start_chapter_name:Tuple[str] = TITLE_TOKENS
                      ) -> List[Union[Paragraph, Table]]:
@@ -80,57 +115,57 @@ def extract_chapters(doc:Document,
     Returns:
         A list of Paragraph or Table objects.
     """
-    temp_chapters: List[List[Union[Paragraph, Table]]] = []
-    temp:List[Union[Paragraph, Table]] = []
-    for block in iter_block_items(doc):
-        if isinstance(block, Paragraph):
-            if block.style.name in style_start_chapter_name:
-                if len(temp) > 1:
-                    temp_chapters.append(temp)
-                temp = []
-            if len(block.text) == 0:
-                continue
-        temp.append(block)
-    return [i for i in temp_chapters if len(i)>0]
+    return list(__iter_chapter_blocks(
+        iter_block_items(doc),
+        lambda block: isinstance(block, Paragraph) and \
+            block.style.name in style_start_chapter_name,
+        lambda block: isinstance(block, Paragraph) and len(block.text) == 0))
 
-def get_text_from_paragraph(block: Paragraph, language:str,
-                            idx_list:int) -> Tuple[str, int]:
-    """Generate text starting from Paragraph object
-    Arguments:
-        block (Table)
-        language (str)
-        idx_list (int)
-    Return:
-        str: table text
-        idx_list
-    """
-    text = ""
-    if block.style.name == LIST_ITEM_TOKEN:
-        text += f"\t{idx_list}: {block.text}.\n"
-        idx_list += 1
-        return text, idx_list
-    idx_list = 0
-    if block.style.name == CHAPTER_TOKEN:
-        text += f"\n.\n{CHAPTER_KEYWORD[language]}: "
-    text += f"{block.text}\n"
-    return text, idx_list
-
-def get_text_from_table(block: Table, language:str) -> str: #pylint: disable=W0613
-    """Generate text starting from Table object
-    Arguments:
-        block (Table)
-        language (str)
-    Return:
-        str: table text
-    """
-    text = ""
-    for row in block.rows:
-        row_data = []
-        for cell in row.cells:
-            for paragraph in cell.paragraphs:
-                row_data.append(paragraph.text)
-        text += "{}\n".format('\t'.join(row_data))
-    return text
+class ChapterTextBuilder:
+    """Intermediate textual representation of a chapter, built block after block,
+    adding sugar context information: title, chapter keywords and list numbering."""
+    def __init__(self, title_str:str, language:str=LANGUAGE):
+        """
+        Arguments:
+            title_str: The text of the first block of the chapter.
+            language: The desired language abbreviation.
+        """
+        self.title_str = title_str
+        self.language = language
+        self.blocks = 1
+        self.__parts = [f"{TITLE_KEYWORD[language]}: {title_str}.\n"]
+        self.__idx_list = 0
+
+    def add_paragraph(self, style_name:Optional[str], text:str) -> None:
+        """Add the text of a paragraph.
+
+        Arguments:
+            style_name: The user interface name of the paragraph style.
+            text: The paragraph text.
+        """
+        self.blocks += 1
+        if style_name == LIST_ITEM_TOKEN:
+            self.__parts.append(f"\t{self.__idx_list}: {text}.\n")
+            self.__idx_list += 1
+            return
+        self.__idx_list = 0
+        if style_name == CHAPTER_TOKEN:
+            self.__parts.append(f"\n.\n{CHAPTER_KEYWORD[self.language]}: ")
+        self.__parts.append(f"{text}\n")
+
+    def add_table(self, rows:TableRows) -> None:
+        """Add the text of a table, a line per row.
+
+        Arguments:
+            rows: For each row, the text of the paragraphs of each cell.
+        """
+        self.blocks += 1
+        for row_data in rows:
+            self.__parts.append("{}\n".format('\t'.join(row_data)))
+
+    def get_text(self) -> Tuple[str, str]:
+        """Get the chapter text and title."""
+        return ''.join(self.__parts), self.title_str
 
 def get_text_from_chapter(chapter_doc:List[Union[Paragraph, Table]],
                           language:str=LANGUAGE) -> Tuple[str, str]:
@@ -144,42 +179,244 @@ def get_text_from_chapter(chapter_doc:List[Union[Paragraph, Table]],
     Returns:
         A tuple of the object's title and its text content.
     """
-    title_str = chapter_doc[0].text
-    text = f"{TITLE_KEYWORD[language]}: {title_str}.\n"
-    idx_list = 0
+    builder = ChapterTextBuilder(chapter_doc[0].text, language)
     for block in chapter_doc[1:]:
         if isinstance(block, Paragraph):
-            temp_text, idx_list = get_text_from_paragraph(block, language, idx_list)
-            text += temp_text
+            builder.add_paragraph(block.style.name, block.text)
         elif isinstance(block, Table):
-            text += get_text_from_table(block, language)
-    return text, title_str
+            builder.add_table([[paragraph.text for cell in row.cells
+                                for paragraph in cell.paragraphs]
+                               for row in block.rows])
+    return builder.get_text()
 
-def main():
-    """main function"""
-    in_file_path, out_file_path, language = input_tool.get_sys_input(os.path.dirname(__file__))
-    chapters = []
-    chapters_path: List[str] = []
-    title_list:List[str] = []
+def __get_run_text(run:etree._Element) -> str:
+    parts = []
+    for child in run:
+        if child.tag == f"{W_NS}t":
+            parts.append(child.text or "")
+        elif child.tag == f"{W_NS}br":
+            parts.append("\n" if child.get(f"{W_NS}type", "textWrapping") == "textWrapping"
+                         else "")
+        else:
+            parts.append(RUN_TEXT.get(child.tag, ""))
+    return ''.join(parts)
+
+def get_paragraph_text(paragraph:etree._Element) -> str:
+    """Get the text of a w:p element, the same of python-docx Paragraph.text."""
+    parts = []
+    for child in paragraph:
+        if child.tag == f"{W_NS}r":
+            parts.append(__get_run_text(child))
+        elif child.tag == f"{W_NS}hyperlink":
+            parts.extend(__get_run_text(run) for run in child if run.tag == f"{W_NS}r")
+    return ''.join(parts)
+
+def __get_int_property(cell:etree._Element, name:str, default:int) -> int:
+    value = cell.find(f"{W_NS}tcPr/{W_NS}{name}")
+    if value is None:
+        return default
+    return int(value.get(f"{W_NS}val", default))
+
+def get_table_rows(table:etree._Element) -> TableRows:
+    """Get the text of a w:tbl element, the same of python-docx row.cells and cell.paragraphs:
+    a cell spanning many grid columns is repeated for each one and a vertically merged
+    cell repeats the one above, resolved row by row instead of searching the table.
+
+    Arguments:
+        table: The w:tbl element.
+
+    Returns:
+        For each row, the text of the paragraphs of each cell.
+    """
+    rows: TableRows = []
+    cells_above: Dict[int, List[str]] = {}
+    for row in table.iterchildren(f"{W_NS}tr"):
+        grid_offset = 0
+        grid_before = row.find(f"{W_NS}trPr/{W_NS}gridBefore")
+        if grid_before is not None:
+            grid_offset = int(grid_before.get(f"{W_NS}val", 0))
+        row_cells: Dict[int, List[str]] = {}
+        row_data: List[str] = []
+        for cell in row.iterchildren(f"{W_NS}tc"):
+            v_merge = cell.find(f"{W_NS}tcPr/{W_NS}vMerge")
+            if v_merge is not None and v_merge.get(f"{W_NS}val", "continue") == "continue" \
+                    and grid_offset in cells_above:
+                cell_data = cells_above[grid_offset]
+            else:
+                cell_data = [get_paragraph_text(paragraph)
+                             for paragraph in cell.iterchildren(f"{W_NS}p")]
+                cell_data = cell_data * __get_int_property(cell, "gridSpan", 1)
+            row_cells[grid_offset] = cell_data
+            row_data.extend(cell_data)
+            grid_offset += __get_int_property(cell, "gridSpan", 1)
+        cells_above = row_cells
+        rows.append(row_data)
+    return rows
+
+def __get_part_target(docx_zip:zipfile.ZipFile, part:str, rel_type:str,
+                      default:str) -> str:
+    rels_path = posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+    try:
+        with docx_zip.open(rels_path) as rels_file:
+            rels = etree.parse(rels_file).getroot()
+    except KeyError:
+        return default
+    for rel in rels.iterchildren(f"{REL_NS}Relationship"):
+        if rel.get("Type", "").endswith(rel_type):
+            return posixpath.normpath(posixpath.join(posixpath.dirname(part),
+                                                     rel.get("Target"))).lstrip('/')
+    return default
+
+def get_style_map(styles_file:IO[bytes]) -> Tuple[Dict[str, Optional[str]], Optional[str]]:
+    """Map the paragraph style ids to their user interface names, once per document.
+
+    Arguments:
+        styles_file: The word/styles.xml file.
+
+    Returns:
+        A tuple of the map and of the name of the default paragraph style.
+    """
+    style_map: Dict[str, Optional[str]] = {}
+    default_name = None
+    for style in etree.parse(styles_file).getroot().iterchildren(f"{W_NS}style"):
+        if style.get(f"{W_NS}type") != "paragraph":
+            continue
+        name = style.find(f"{W_NS}name")
+        name = None if name is None else BabelFish.internal2ui(name.get(f"{W_NS}val"))
+        style_map.setdefault(style.get(f"{W_NS}styleId"), name)
+        if style.get(f"{W_NS}default") in ("1", "true", "on"):
+            default_name = name
+    return style_map, default_name
 
-    m4b.init(BACK_END_TTS)
+def __read_style_map(docx_zip:zipfile.ZipFile, document_part:str
+                     ) -> Tuple[Dict[str, Optional[str]], Optional[str]]:
+    styles_part = __get_part_target(docx_zip, document_part, REL_TYPE_STYLES, "word/styles.xml")
+    try:
+        with docx_zip.open(styles_part) as styles_file:
+            return get_style_map(styles_file)
+    except KeyError:
+        return {}, None
 
-    document = Document(in_file_path)
-    chapters = extract_chapters(document)
-    for idref, chapter in enumerate(chapters):
-        output_mp3_path   = f"{in_file_path}.c{idref}.mp3"
-        text_chapther, title = get_text_from_chapter(chapter)
-        title_list.append(title)
+def __read_block(element:etree._Element, style_map:Dict[str, Optional[str]],
+                 default_name:Optional[str]) -> Block:
+    if element.tag == f"{W_NS}tbl":
+        return "tbl", get_table_rows(element)
+    style = element.find(f"{W_NS}pPr/{W_NS}pStyle")
+    style_id = None if style is None else style.get(f"{W_NS}val")
+    return "p", (style_map.get(style_id, default_name), get_paragraph_text(element))
+
+def iter_body_blocks(docx_zip:zipfile.ZipFile
+                     ) -> Iterator[Block]:
+    """Stream the paragraphs and tables of the document body from word/document.xml,
+    each block is cleared once read, so the memory is bounded by the largest block.
+
+    Arguments:
+        docx_zip: The opened docx file.
+
+    Yields:
+        ("p", (style name, text)) for a paragraph, ("tbl", rows) for a table.
+    """
+    document_part = __get_part_target(docx_zip, "", REL_TYPE_DOCUMENT, "word/document.xml")
+    style_map, default_name = __read_style_map(docx_zip, document_part)
+    with docx_zip.open(document_part) as document_file:
+        for _, element in etree.iterparse(document_file, events=("end",),
+                                          tag=(f"{W_NS}p", f"{W_NS}tbl")):
+            parent = element.getparent()
+            if parent is None or parent.tag != f"{W_NS}body":
+                continue
+            yield __read_block(element, style_map, default_name)
+            element.clear()
+            while element.getprevious() is not None:
+                del parent[0]
+
+def __get_blocks_text(chapter:List[Block], language:str) -> Tuple[str, str]:
+    kind, block = chapter[0]
+    builder = ChapterTextBuilder(block[1] if kind == "p" else "", language)
+    for kind, block in chapter[1:]:
+        if kind == "p":
+            builder.add_paragraph(*block)
+        else:
+            builder.add_table(block)
+    return builder.get_text()
+
+def iter_docx_chapters(docx_path:str, language:str=LANGUAGE,
+                       style_start_chapter_name:Tuple[str] = TITLE_TOKENS
+                       ) -> Iterator[Tuple[str, str]]:
+    """Fast path of extract_chapters and get_text_from_chapter: the document is streamed
+    without python-docx objects and each chapter is yielded as soon as it ends.
+
+    Arguments:
+        docx_path: The path of the docx file.
+        language: The desired language abbreviation.
+        style_start_chapter_name: Possible identifiers for titles in the Word document.
+
+    Yields:
+        A tuple of the chapter text and title, the same of get_text_from_chapter.
+    """
+    with zipfile.ZipFile(docx_path) as docx_zip:
+        for chapter in __iter_chapter_blocks(
+                iter_body_blocks(docx_zip),
+                lambda block: block[0] == "p" and block[1][0] in style_start_chapter_name,
+                lambda block: block[0] == "p" and len(block[1][1]) == 0):
+            yield __get_blocks_text(chapter, language)
+
+def __write_debug_text(debug_path:str, text:str) -> None:
+    with open(debug_path, "w", encoding="UTF-16") as out_debug_file:
+        out_debug_file.write(text)
+
+def iter_chapter_jobs(docx_path:str, work_dir:str, titles:List[str],
+                      debug_writer:Optional[Executor]=None,
+                      language:str=LANGUAGE) -> Iterator[Tuple[str, str]]:
+    """Yield the TTS job of each chapter as soon as it is extracted.
+
+    Arguments:
+        docx_path: The path of the docx file.
+        work_dir: The directory where the chapters audio files are saved.
+        titles: The list the chapter titles are appended to, in chapter order.
+        debug_writer: If given, the text of each chapter is saved next to docx_path
+                      by this executor, out of the extraction thread.
+        language: The desired language abbreviation.
+
+    Yields:
+        A tuple of the chapter text and of its audio file path.
+    """
+    audio_ext = m4b.get_audio_ext(BACK_END_TTS)
+    for idref, (text_chapther, title) in enumerate(iter_docx_chapters(docx_path, language)):
+        titles.append(title)
         logger.info("idref %s", idref)
-        with open(f"{in_file_path}.c{idref}.txt", "w", encoding="UTF-16") as out_debug_file:
-            out_debug_file.write(text_chapther)
-        if m4b.generate_audio(text_chapther, output_mp3_path,
-                              lang=language, backend=BACK_END_TTS):
-            chapters_path.append(output_mp3_path)
-    metadata_output = ffmetadata_generator.generate_ffmetadata(chapters_path,
-                                                               chapter_titles=title_list)
-    m4b.generate_m4b(out_file_path, chapters_path, metadata_output)
-    m4b.close_edge_tts()
+        if debug_writer is not None:
+            debug_writer.submit(__write_debug_text, f"{docx_path}.c{idref}.txt", text_chapther)
+        yield text_chapther, os.path.join(work_dir, f"c{idref}{audio_ext}")
+
+def convert(args:argparse.Namespace) -> None:
+    """Convert a docx file to audiobook, the TTS backend must be already initialized.
+    Each chapter is synthesized while the next ones are still being extracted.
+
+    Arguments:
+        args: The options supplied by the user, `file` and `output_path` included.
+    """
+    work_dir = manifest.get_work_dir(args.output_path)
+    title_list:List[str] = []
+    job_manifest = manifest.JobManifest(work_dir, resume=args.resume)
+    with contextlib.ExitStack() as stack:
+        debug_writer = stack.enter_context(ThreadPoolExecutor(max_workers=1)) \
+            if args.debug_dump else None
+        results = scheduler.synthesize_stream(iter_chapter_jobs(args.file, work_dir,
+                                                                title_list, debug_writer,
+                                                                language=args.language),
+                                              lang=args.language, backend=BACK_END_TTS,
+                                              max_workers=args.jobs, manifest=job_manifest)
+    audio_ext = m4b.get_audio_ext(BACK_END_TTS)
+    m4b.generate_m4b_chapters(args.output_path,
+                              [os.path.join(work_dir, f"c{idref}{audio_ext}")
+                               for idref in range(len(results))],
+                              results, chapter_titles=title_list, mode=args.assembly)
+    shutil.rmtree(work_dir)
+
+def main():
+    """main function"""
+    args = input_tool.get_sys_args(os.path.dirname(__file__), assembly=True, debug_dump=True)
+    m4b.run_converter(BACK_END_TTS, convert, args)
 
 if __name__ == "__main__":
     main()
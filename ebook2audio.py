@@ -8,15 +8,19 @@ Usage example:
     `python ebook2audio.py book.epub`
 """
 
+import argparse
 import zipfile
-import tempfile
 import os
+import posixpath
+import shutil
 import logging
-import codecs
-from typing import Dict, Tuple, List
+from typing import Dict, IO, Iterator, NamedTuple, Tuple, List, Optional
+from urllib.parse import unquote
 from lxml   import etree
 from backend_audio import m4b
-from backend_audio import ffmetadata_generator
+from backend_audio import scheduler
+from backend_audio import manifest
+from backend_audio import stream_encoder
 from frontend import input_tool
 
 logging.basicConfig(level=logging.INFO)
@@ -28,16 +32,19 @@ SKIP_IDREF = ["coverpage",
               "footnotes",
               "copyright"]
 
-def extract_by_epub(epub_path: str, directory_to_extract_path: str) -> None:
-    """Unzip the epub file and extract all in a temp directory.
+def open_epub_member(epub_zip: zipfile.ZipFile, content_dir_path: str, href: str) -> IO[bytes]:
+    """Open a file of the epub without extracting it, it is decompressed while it is read.
 
     Arguments:
-        epub_path: The path to the epub file.
-        directory_to_extract_path: The temp directory to extract epub file to.
+        epub_zip: The opened epub file.
+        content_dir_path: The directory, inside the epub, of the file referencing href.
+        href: The URL-encoded path of the file, relative to content_dir_path.
+
+    Returns:
+        A binary file object, to be closed by the caller.
     """
-    logger.debug("Extracting input to temp directory %s.", directory_to_extract_path)
-    with zipfile.ZipFile(epub_path, 'r') as zip_ref:
-        zip_ref.extractall(directory_to_extract_path)
+    member = posixpath.normpath(posixpath.join(content_dir_path, unquote(href.split('#')[0])))
+    return epub_zip.open(member.lstrip('/'))
 
 def get_guide_epub(root_tree: etree.ElementBase) -> Dict[str, str]:
     """Get information about the guide information, described in content.opf file.
@@ -55,6 +62,49 @@ def get_guide_epub(root_tree: etree.ElementBase) -> Dict[str, str]:
         guide_res[reference.attrib['type']] = reference.attrib['href']
     return guide_res
 
+class ManifestItem(NamedTuple):
+    """A file of the epub, as declared in the content.opf manifest."""
+    href: str
+    media_type: str
+    properties: str
+
+class OpfIndex: #pylint: disable=R0903
+    """The content.opf manifest, parsed once and indexed by item id."""
+    __slots__ = ("items", "guide_hrefs")
+    def __init__(self, root_tree: etree._ElementTree, guide_manifest: Dict[str,str]):
+        """
+        Arguments:
+            root_tree: The base of the XML tree in epub contents.
+            guide_manifest: A map of the guide XML node types and their hyperlink content.
+        """
+        self.items: Dict[str, ManifestItem] = {}
+        for item in root_tree.xpath("//*[local-name()='package']"
+                                    "/*[local-name()='manifest']"
+                                    "/*[local-name()='item']"):
+            item_id = item.get('id')
+            if item_id is not None and item_id not in self.items:
+                self.items[item_id] = ManifestItem(item.get('href', ''),
+                                                   item.get('media-type', ''),
+                                                   item.get('properties', ''))
+        self.guide_hrefs = frozenset(guide_manifest.values())
+
+    def get_href(self, idref: str) -> Optional[str]:
+        """Get the path of a manifest item, relative to the content.opf directory.
+
+        Arguments:
+            idref: The XML ID of the item.
+
+        Returns:
+            The item href, None if the item is missing or it is used as guide.
+        """
+        item = self.items.get(idref)
+        if item is None or item.href in self.guide_hrefs:
+            return None
+        return item.href
+
+def __normalize_segment(text_in: str) -> str:
+    return text_in.replace('\xa0', '').replace('\r\n\t', '').replace('\r\n', '\n')
+
 def prepocess_text(text_in: str) -> str:
     """Remove possibly non-audible characters.
 
@@ -64,41 +114,54 @@ def prepocess_text(text_in: str) -> str:
     Returns:
         The processed epub file's text.
     """
-    text_out = codecs.decode(bytes(text_in, encoding="utf-8"), encoding="utf-8")
-    text_out = text_out.replace('\xa0', '')
-    text_out = text_out.replace('\r\n\t', '')
-    text_out = text_out.replace('\r\n', '\n')
-    return text_out.strip()
-
-def get_text_from_chapter(root_tree: etree._ElementTree,
-                          idref_ch : str, content_dir_path: str,
-                          guide_manifest: Dict[str,str]) -> Tuple[str, Dict[str,str]]:
-    """Starting from content.opf xml tree, extract chapter html path
-       and parse it to achieve the chapter.
+    return __normalize_segment(text_in).strip()
+
+def iter_chapter_text(xhtml_file: IO[bytes]) -> Iterator[str]:
+    """Parse a chapter incrementally, each block element of the body is cleared
+    as soon as its text is extracted, so the memory is bounded by the largest block.
+
+    Arguments:
+        xhtml_file: The chapter html file, opened in binary mode.
+
+    Yields:
+        The text of each block element of the body, without non-audible characters.
+    """
+    for _, element in etree.iterparse(xhtml_file, events=("end",), html=True):
+        parent = element.getparent()
+        if parent is None or parent.tag != 'body':
+            continue
+        text_block = '\n'.join(element.itertext())
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del parent[0]
+        yield __normalize_segment(text_block)
+
+def get_text_from_chapter(opf_index: OpfIndex,
+                          idref_ch : str, epub_zip: zipfile.ZipFile,
+                          content_dir_path: str) -> Tuple[str, Dict[str,str]]:
+    """Starting from the content.opf manifest, extract chapter html path
+       and parse it, straight from the epub, to achieve the chapter.
   
     Arguments:
-        root_tree: The base of the XML tree in epub contents.
+        opf_index: The indexed manifest of the content.opf file.
         idref_ch: The XML ID of the chapter.
-        content_dir_path: The path to the XML file.
-        guide_manifest: A map of the guide XML node types and their hyperlink content.
+        epub_zip: The opened epub file.
+        content_dir_path: The directory of the content.opf file inside the epub.
 
     Returns:
-        A tuple of the chapter's text and an empty dictionary.
+        A tuple of the chapter's text, without non-audible characters, and an empty dictionary.
     """
-    text_result = ""
-    for href in root_tree.xpath(f"//*[local-name()='package']"
-                                f"/*[local-name()='manifest']"
-                                f"/*[local-name()='item'][@id='{idref_ch}']"
-                                f"/@href"):
-        if href in guide_manifest.values():
-            #Skip the chapter used as guide
-            logging.debug("skipping %s", href)
-            continue
-        xhtml_file_path = os.path.join(content_dir_path, href)
-        subtree = etree.parse(xhtml_file_path, etree.HTMLParser())
-        for ptag in subtree.xpath("//html/body/*"):
-            text_result += '\n'.join(text for text in ptag.itertext())
-    return text_result, {}
+    href = opf_index.get_href(idref_ch)
+    if href is None:
+        #Skip the chapter used as guide
+        logging.debug("skipping %s", idref_ch)
+        return "", {}
+    try:
+        with open_epub_member(epub_zip, content_dir_path, href) as xhtml_file:
+            return ''.join(iter_chapter_text(xhtml_file)), {}
+    except KeyError:
+        logger.warning("missing chapter file %s", href)
+        return "", {}
 
 def get_metadata(root_tree: etree._ElementTree) -> Dict[str,str]:
     """Extract basic metadata, as title, author and copyrights infos from content.opf.
@@ -128,82 +191,146 @@ def get_metadata(root_tree: etree._ElementTree) -> Dict[str,str]:
         metadata_result["description"] = descr[0].text
     return metadata_result
 
-def extract_chapter_and_generate_mp3(tree: etree._ElementTree,  #pylint: disable=R0913,R0917
-                                     output_file_path:str,
+def extract_chapter_and_generate_mp3(tree: etree._ElementTree,  #pylint: disable=R0913,R0914,R0917
                                      mp3_temp_dir:str,
+                                     epub_zip:zipfile.ZipFile,
                                      content_file_dir_path:str,
                                      guide:Dict[str,str],
-                                     language:str) -> List[str]:
-    """Extract id reference from container.xml file and extract chapter text.
+                                     language:str,
+                                     jobs:int=scheduler.DEFAULT_JOBS,
+                                     job_manifest:Optional[manifest.JobManifest]=None,
+                                     encoder:Optional[stream_encoder.M4bStreamEncoder]=None
+                                     ) -> List[Tuple[str, float]]:
+    """Extract id reference from container.xml file and extract chapter text,
+    then synthesize the chapters concurrently.
 
     Arguments:
         tree: The base of the XML tree in epub contents.
-        output_file_path: The path to save the result MP3 file.
-        mp3_temp_dir: The temporary directory path to save MP3 files as the XML tree is parsed.
-        content_file_dir_path: The path to the XML file.
+        mp3_temp_dir: The work directory path to save MP3 files as the XML tree is parsed.
+        epub_zip: The opened epub file.
+        content_file_dir_path: The directory of the content.opf file inside the epub.
         guide: A map of the guide XML node types and their hyperlink content.
+        language: The desired language abbreviation.
+        jobs: The maximum number of chapters synthesized at the same time.
+        job_manifest: The progress of the conversion, finished chapters are skipped.
+        encoder: If given, each chapter is encoded as soon as it and the previous ones finish.
 
     Returns:
-        A list of the saved MP3 file paths.
+        A list of the saved MP3 file paths with their exact duration in seconds, in spine order.
     """
-    chapters = []
+    tts_jobs = []
+    opf_index = OpfIndex(tree, guide)
     for idref in tree.xpath("//*[local-name()='package']"
                             "/*[local-name()='spine']"
                             "/*[local-name()='itemref']"
                             "/@idref"):
-        output_debug_path= os.path.join(os.path.dirname(output_file_path),
-                                        f"{mp3_temp_dir}/{idref}.log")
-        output_mp3_path  = os.path.join(os.path.dirname(output_file_path),
-                                        f"{mp3_temp_dir}/{idref}.mp3")
-        text_chapther, _ = get_text_from_chapter(tree, idref,
-                                                content_file_dir_path,
-                                                guide)
+        output_base_path = os.path.join(mp3_temp_dir, idref)
+        text_chapther, _ = get_text_from_chapter(opf_index, idref, epub_zip,
+                                                content_file_dir_path)
         logger.info("idref %s", idref)
         if any(idref.lower() in skippable for skippable in SKIP_IDREF):
             logger.debug("skip idref %s", idref)
             continue
-        text_chapther = prepocess_text(text_chapther)
-        with open(output_debug_path, "w", encoding="UTF-16") as out_debug_file:
+        text_chapther = text_chapther.strip()
+        with open(f"{output_base_path}.log", "w", encoding="UTF-16") as out_debug_file:
             out_debug_file.write(text_chapther)
-        if m4b.generate_audio(text_chapther, output_mp3_path,
-                              lang=language, backend=BACK_END_TTS):
-            chapters.append(output_mp3_path)
-    return chapters
+        tts_jobs.append((text_chapther, output_base_path + m4b.get_audio_ext(BACK_END_TTS)))
+    results = scheduler.synthesize_chapters(tts_jobs, lang=language,
+                                            backend=BACK_END_TTS, max_workers=jobs,
+                                            manifest=job_manifest,
+                                            on_done=encoder and encoder.get_on_done(
+                                                [path for _, path in tts_jobs]))
+    return [(output_mp3_path, duration)
+            for (_, output_mp3_path), duration in zip(tts_jobs, results) if duration is not None]
 
-def main():
-    """main function"""
-    tool_path: str = os.path.dirname(__file__)
-    in_file_path, out_file_path, language = input_tool.get_sys_input(tool_path)
-    chapters: List[str] = []
+def synthesize_content(tree: etree._ElementTree, #pylint: disable=R0913,R0917
+                       epub_zip:zipfile.ZipFile,
+                       content_file_dir_path:str,
+                       args:argparse.Namespace,
+                       job_manifest:manifest.JobManifest,
+                       encoder:Optional[stream_encoder.M4bStreamEncoder]=None
+                       ) -> List[Tuple[str, float]]:
+    """Synthesize the chapters of a content.opf file.
+
+    Arguments:
+        tree: The base of the XML tree in epub contents.
+        epub_zip: The opened epub file.
+        content_file_dir_path: The directory of the content.opf file inside the epub.
+        args: The options supplied by the user at the command-line.
+        job_manifest: The progress of the conversion, finished chapters are skipped.
+        encoder: If given, each chapter is encoded as soon as it and the previous ones finish.
+
+    Returns:
+        A list of the saved MP3 file paths with their duration in seconds.
+    """
+    return extract_chapter_and_generate_mp3(tree,
+                                            job_manifest.work_dir,
+                                            epub_zip,
+                                            content_file_dir_path,
+                                            get_guide_epub(tree),
+                                            args.language,
+                                            args.jobs,
+                                            job_manifest,
+                                            encoder)
+
+def generate_audiobook(args:argparse.Namespace,
+                       chapters:List[Tuple[str, float]],
+                       metadata_book:Dict[str, str],
+                       encoder:Optional[stream_encoder.M4bStreamEncoder]=None) -> None:
+    """Assemble the audiobook of all the chapters of the book.
+
+    Arguments:
+        args: The options supplied by the user at the command-line.
+        chapters: The MP3 file paths and durations of all the chapters, in book order.
+        metadata_book: The author and the title of the book.
+        encoder: If given, the encoder all the chapters were streamed to.
+    """
+    if encoder is not None:
+        encoder.finish(author=metadata_book["author"], title=metadata_book["title"])
+        return
+    m4b.generate_m4b_chapters(args.output_path, [path for path, _ in chapters],
+                              [duration for _, duration in chapters],
+                              title=metadata_book["title"], author=metadata_book["author"],
+                              mode=args.assembly)
+
+def convert(args:argparse.Namespace) -> None:
+    """Convert an epub file to audiobook, the TTS backend must be already initialized.
 
-    m4b.init(BACK_END_TTS)
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        extract_by_epub(in_file_path, tmp_dir)
+    Arguments:
+        args: The options supplied by the user, `file` and `output_path` included.
+    """
+    work_dir: str = manifest.get_work_dir(args.output_path)
+    chapters: List[Tuple[str, float]] = []
+    metadata_book: Dict[str, str] = {}
+    job_manifest = manifest.JobManifest(work_dir, resume=args.resume)
+    encoder = None
+    if args.stream:
+        # a later --resume run skips only the chapters whose audio is still there
+        encoder = stream_encoder.M4bStreamEncoder(args.output_path,
+                                                  remove_chapters=not args.resume)
+    with zipfile.ZipFile(args.file, 'r') as epub_zip:
         logger.info("Parsing 'container.xml' file.")
-        container_file_path=os.path.join(tmp_dir, "META-INF/container.xml")
-        tree = etree.parse(container_file_path)
+        with epub_zip.open("META-INF/container.xml") as container_file:
+            tree = etree.parse(container_file)
         for root_file_path in tree.xpath( "//*[local-name()='container']"
                                         "/*[local-name()='rootfiles']"
                                         "/*[local-name()='rootfile']"
                                         "/@full-path"):
             logger.info("Parsing '%s' file.", root_file_path)
-            content_file_path = os.path.join(tmp_dir, root_file_path)
-            content_file_dir_path = os.path.dirname(content_file_path)
-            tree = etree.parse(content_file_path)
-            guide = get_guide_epub(tree)
-            metadata_book_output = get_metadata(tree)
+            with epub_zip.open(root_file_path) as content_file:
+                tree = etree.parse(content_file)
             logger.info("Parsed '%s' file.", root_file_path)
-            with tempfile.TemporaryDirectory() as mp3_temp_dir:
-                chapters += extract_chapter_and_generate_mp3(tree,
-                                                             out_file_path,
-                                                             mp3_temp_dir,
-                                                             content_file_dir_path,
-                                                             guide,
-                                                             language)
-                metadata_output = ffmetadata_generator.generate_ffmetadata(chapters,
-                                                            title=metadata_book_output["title"],
-                                                            author=metadata_book_output["author"])
-                m4b.generate_m4b(out_file_path, chapters, metadata_output)
+            metadata_book = metadata_book or get_metadata(tree)
+            chapters += synthesize_content(tree, epub_zip, posixpath.dirname(root_file_path),
+                                           args, job_manifest, encoder)
+    generate_audiobook(args, chapters, metadata_book, encoder)
+    shutil.rmtree(work_dir)
+
+def main():
+    """main function"""
+    tool_path: str = os.path.dirname(__file__)
+    args = input_tool.get_sys_args(tool_path, assembly=True, stream=True)
+    m4b.run_converter(BACK_END_TTS, convert, args)
 
 if __name__ == "__main__":
     main()
@@ -8,10 +8,14 @@ import argparse
 import os
 from pathlib import Path
 from typing import Tuple
+from backend_audio import cache
+from backend_audio import m4b
+from backend_audio import scheduler
 
 logger = logging.getLogger(__name__)
 
 SUPPORTED_LANGUAGE = ["it", "en"]
+DEFAULT_CACHE_SIZE = cache.DEFAULT_MAX_SIZE // 1024**2 # MB
 
 def get_path(path: str) -> Path:
     """
@@ -22,16 +26,73 @@ def get_path(path: str) -> Path:
         sys.exit(1)
     return Path(path)
 
-def get_sys_input(main_path:str, format_output:str="m4b") -> Tuple[str, str, str]:
-    """Get input and output path files.
+def get_positive_int(value: str) -> int:
+    """
+    parses a positive integer given by user input, as the number of concurrent workers
+    """
+    result = int(value)
+    if result < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return result
+
+def __add_common_arguments(argparser:argparse.ArgumentParser) -> None:
+    argparser.add_argument('language',
+            nargs='?', default="it",
+            choices=SUPPORTED_LANGUAGE,
+            help='language used by TTS backend')
+    argparser.add_argument('--verbose',
+            action='store_true', dest='verbose',
+            help=('DEBUG mode.'))
+    argparser.add_argument('--jobs',
+            default=scheduler.DEFAULT_JOBS, dest='jobs',
+            type=get_positive_int, metavar='N',
+            help='number of chapters synthesized at the same time')
+    argparser.add_argument('--cache-dir',
+            default=cache.DEFAULT_CACHE_DIR, dest='cache_dir',
+            help='directory of the synthesized audio cache')
+    argparser.add_argument('--cache-size',
+            default=DEFAULT_CACHE_SIZE, dest='cache_size',
+            type=get_positive_int, metavar='MB',
+            help='maximum size of the audio cache, least recently used audio is evicted')
+    argparser.add_argument('--no-cache',
+            action='store_const', const=None, dest='cache_dir',
+            help='always synthesize the audio, without reading or writing the cache')
+    argparser.add_argument('--resume',
+            action='store_true', dest='resume',
+            help='skip the chapters finished by a previous interrupted run')
+
+def __add_assembly_argument(argparser:argparse.ArgumentParser) -> None:
+    argparser.add_argument('--assembly',
+            default=m4b.ASSEMBLY_FILTER, dest='assembly',
+            choices=m4b.ASSEMBLY_MODES,
+            help=('how chapters are joined: one ffmpeg filter graph, or the concat '
+                  'demuxer with stream copy for books with many chapters'))
+
+def __add_stream_argument(argparser:argparse.ArgumentParser) -> None:
+    argparser.add_argument('--stream',
+            action='store_true', dest='stream',
+            help=('encode each chapter while the next ones are still synthesized, '
+                  'removing its intermediate audio file unless --resume is given'))
+
+def __add_debug_dump_argument(argparser:argparse.ArgumentParser) -> None:
+    argparser.add_argument('--debug-dump',
+            action='store_true', dest='debug_dump',
+            help='save the extracted text structure next to the result file, for debugging')
+
+def get_sys_args(main_path:str, format_output:str="m4b", *,
+                 assembly:bool=False, stream:bool=False,
+                 debug_dump:bool=False) -> argparse.Namespace:
+    """Get all the options supplied by the user at the command-line.
 
     Arguments:
         main_path: The path of the calling script.
         format_output: The format to save the result file as.
+        assembly: Offer the --assembly option, for scripts joining chapters in an audiobook.
+        stream: Offer the --stream option, for scripts encoding chapters as they finish.
+        debug_dump: Offer the --debug-dump option, for scripts able to save their extracted text.
 
     Returns:
-        A tuple of the file supplied by the user at the 
-        command-line and the path the result file is saved to.
+        The parsed options, with `output_path` set to the path the result file is saved to.
     """
     argparser = argparse.ArgumentParser(
             usage='usage: %(prog)s <input.docx> <language>',
@@ -40,19 +101,65 @@ def get_sys_input(main_path:str, format_output:str="m4b") -> Tuple[str, str, str
             default=None,
             help='file to be read',
             type=get_path)
-    argparser.add_argument('language',
-            nargs='?', default="it",
-            choices=SUPPORTED_LANGUAGE,
-            help='language used by TTS backend')
-    argparser.add_argument('--verbose',
-            action='store_true', dest='verbose',
-            help=('DEBUG mode.'))
+    __add_common_arguments(argparser)
+    if assembly:
+        __add_assembly_argument(argparser)
+    if stream:
+        __add_stream_argument(argparser)
+    if debug_dump:
+        __add_debug_dump_argument(argparser)
     args = argparser.parse_args()
     output_file_name = args.file.stem
-    output_file_path = os.path.join(main_path,
+    args.output_path = os.path.join(main_path,
                                     output_file_name) + f".{format_output}"
     if args.verbose:
         logger.setLevel(logging.DEBUG)
     logger.debug("%s: read %s language: %s", sys.argv[0],
                  args.file, args.language)
-    return args.file, output_file_path, args.language
+    return args
+
+def get_batch_args() -> argparse.Namespace:
+    """Get all the options of a batch conversion supplied by the user at the command-line.
+
+    Returns:
+        The parsed options, `input` is a directory or a text file listing one document per line.
+    """
+    argparser = argparse.ArgumentParser(
+            usage='usage: %(prog)s <directory|list.txt> <language>',
+            prog=sys.argv[0])
+    argparser.add_argument('input',
+            help='directory tree of documents, or text file with one document path per line',
+            type=get_path)
+    __add_common_arguments(argparser)
+    __add_assembly_argument(argparser)
+    __add_debug_dump_argument(argparser)
+    argparser.add_argument('--output-dir',
+            default=os.getcwd(), dest='output_dir',
+            help='directory where the audiobooks are saved, mirroring the input tree')
+    argparser.add_argument('--documents',
+            default=2, dest='documents',
+            type=get_positive_int, metavar='N',
+            help='number of documents converted at the same time')
+    argparser.add_argument('--timeout',
+            default=None, dest='timeout',
+            type=get_positive_int, metavar='SECONDS',
+            help='give up on a document still running after this time')
+    argparser.set_defaults(stream=False) # the ebooks of a batch are not streamed
+    args = argparser.parse_args()
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    return args
+
+def get_sys_input(main_path:str, format_output:str="m4b") -> Tuple[str, str, str]:
+    """Get input and output path files.
+
+    Arguments:
+        main_path: The path of the calling script.
+        format_output: The format to save the result file as.
+
+    Returns:
+        A tuple of the file supplied by the user at the 
+        command-line and the path the result file is saved to.
+    """
+    args = get_sys_args(main_path, format_output)
+    return args.file, args.output_path, args.language
@@ -7,20 +7,48 @@ description: Convert your pdf to audiobook in MP3 format. <experiment>
 Usage example:
     `python pdf2audio.py document.pdf`
 """
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from array import array
+from typing import Dict, IO, Iterator, List, Optional, Set, Tuple
+import argparse
+import hashlib
+import logging
 import os
 import re
+import sys
 import tempfile
 import json
 from io import BytesIO  # Use BytesIO to create a file-like object
 import fitz
 from fitz import utils  # PyMuPDF
 from fontTools.cffLib import CFFFontSet
-from backend_audio import m4b, ffmetadata_generator
+from backend_audio import m4b, scheduler
 from frontend      import input_tool
 
+logger = logging.getLogger(__name__)
+
+# family names by font name or embedded font hash, shared by all the documents of a batch
+family_name_cache: Dict[str, str] = {}
+
 BACK_END_TTS = m4b.get_back_end_tts()
+PAGES_PER_SHARD = 16
+# a line is a header or footer if it is among the MARGIN_LINES first or last lines of a page
+# and it is repeated, at the same height within Y_BUCKET points, in enough pages
+MARGIN_LINES = 2
+Y_BUCKET = 5
+MIN_REPEATED_PAGES = 3
+REPEATED_PAGES_RATIO = 0.25
+REGEX_DIGITS = re.compile(r"[0-9]+")
+# a chapter title is a short run with a font at least HEADING_SIZE_RATIO times the body one
+HEADING_SIZE_RATIO = 1.15
+MAX_TITLE_CHARS = 200
+REGEX_NOT_WORD = re.compile(r"\W+")
 PATTERN_REFERENCE_STR = r"\[[0-9]+(, [0-9]+)*\]|\([0-9]+(, [a-zA-Z0-9]+)+\)"
 REGEX_REFERENCE = re.compile(PATTERN_REFERENCE_STR)
+REGEX_SUBSET_TAG = re.compile(r"^[A-Z]{6}\+")
+REGEX_FONT_STYLE = re.compile(r"[-,]")
 
 def read_cff(cff_data):
     """Decompile CFF font format"""
@@ -35,35 +63,57 @@ def __filter_family_name(family_name:str)->str:
     family_name = family_name.replace('book', '')
     return family_name.strip()
 
-def __add_family_name(fonts:dict)->dict:
-    result = {}
-    for font_name, font in fonts.items():
-        cfffont = read_cff(font)
-        print(cfffont.FamilyName)
-        family_name = __filter_family_name(cfffont.FamilyName)
-        result[font_name] = {'family-name': family_name}
-    return result
-
-def get_fonts(pdf_doc:utils.pymupdf.Document):
-    """..."""
-    xref_visited = []
+def __read_embedded_family_name(pdf_doc:utils.pymupdf.Document, xref:int) -> Optional[str]:
+    basename, ext, _, buffer = pdf_doc.extract_font(xref)
+    if ext == "n/a": # is the font extractable?
+        return None
+    content_hash = hashlib.sha256(buffer).hexdigest()
+    if content_hash not in family_name_cache:
+        family_name = read_cff(buffer).FamilyName if ext == "cff" else basename
+        family_name_cache[content_hash] = __filter_family_name(family_name)
+    return family_name_cache[content_hash]
+
+def get_font_family(pdf_doc:utils.pymupdf.Document, xref:int, basefont:str) -> Optional[str]:
+    """Get the family name of a font, cached across pages and documents.
+    The name comes from the pdf font dictionary, the embedded font is decompiled
+    only when the dictionary has no name.
+
+    Arguments:
+        pdf_doc: The pdf document.
+        xref: The xref of the font.
+        basefont: The BaseFont name in the font dictionary, with its subset tag if any.
+
+    Returns:
+        The family name without style, None if it cannot be found.
+    """
+    basename = REGEX_SUBSET_TAG.sub('', basefont)
+    if not basename:
+        return __read_embedded_family_name(pdf_doc, xref)
+    if basename not in family_name_cache:
+        family_name_cache[basename] = __filter_family_name(REGEX_FONT_STYLE.split(basename)[0])
+    return family_name_cache[basename]
+
+def get_fonts(pdf_doc:utils.pymupdf.Document) -> Dict[str, Dict[str, str]]:
+    """Get the family name of each font used in the document.
+
+    Arguments:
+        pdf_doc: The pdf document.
+
+    Returns:
+        A map of the font names, without subset tag, and their family name.
+    """
+    xref_visited = set()
     fonts = {}
     for page in pdf_doc:
-        fl = page.get_fonts() # list of fonts of page
-        for f in fl:
-            xref = f[0] # xref of font
+        for xref, _, _, basefont, *_ in page.get_fonts():
             if xref in xref_visited:
                 continue # skip if already processed
-            xref_visited.append(xref) # do not process a second time
-            # extract font buffer
-            basename, ext, _, buffer = pdf_doc.extract_font(xref)
-            if ext == "n/a": # is the font extractable?
-                continue
-            if xref in fonts:
-                print(xref, "is already in fonts")
-            print(ext)
-            fonts[basename] = buffer
-    fonts = __add_family_name(fonts)
+            xref_visited.add(xref)
+            family_name = get_font_family(pdf_doc, xref, basefont)
+            if family_name is not None:
+                fonts[REGEX_SUBSET_TAG.sub('', basefont) or str(xref)] = \
+                    {'family-name': family_name}
+    logger.debug("fonts %s", fonts)
     return fonts
 
 def filter_reference(text_with_ref:str)->str:
@@ -74,94 +124,373 @@ def filter_reference(text_with_ref:str)->str:
         str: the string contain all text without refences"""
     return REGEX_REFERENCE.sub('', text_with_ref)
 
-def get_chapter_text(pdf_doc:utils.pymupdf.Document, pattern_header:str, pattern_footer:str)->list:#pylint: disable=R0914,R1260
-    """..."""
-    extracted_text = []
-    block_prediction = ""
-    prev_font = None
-    regex_header = re.compile(pattern_header)
-    regex_footer = re.compile(pattern_footer)
-    for page_num in range(pdf_doc.page_count):
-        page = pdf_doc.load_page(page_num)
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            if "lines" not in block:
+Span = Tuple[str, float, str]
+Line = Tuple[float, List[Span]]
+
+def __get_page_lines(page:utils.pymupdf.Page) -> List[Line]:
+    return [(line["bbox"][1], [(span["font"], span["size"], span["text"])
+                               for span in line["spans"]])
+            for block in page.get_text("dict")["blocks"]
+            for line in block.get("lines", ())]
+
+def extract_page_lines(pdf_path:str, first_page:int, last_page:int) -> List[List[Line]]:
+    """Extract the lines of a range of pages, opening its own document
+    so it can run in a worker process.
+
+    Arguments:
+        pdf_path: The path of the pdf file.
+        first_page: The number of the first page of the range.
+        last_page: The number of the page after the range.
+
+    Returns:
+        For each page, a list of (line top y, [(font name, font size, text), ...])
+        in reading order.
+    """
+    with fitz.open(pdf_path) as pdf_doc:
+        return [__get_page_lines(pdf_doc.load_page(page_num))
+                for page_num in range(first_page, last_page)]
+
+def iter_pages(pdf_doc:utils.pymupdf.Document, max_workers:int=1) -> Iterator[List[Line]]:
+    """Iterate over the lines of all the pages, the page ranges are extracted
+    concurrently by max_workers processes and merged back in page order.
+
+    Arguments:
+        pdf_doc: The pdf document, opened from a file to use more workers.
+        max_workers: The maximum number of processes extracting pages at the same time.
+
+    Yields:
+        The lines of each page, as returned by extract_page_lines.
+    """
+    page_ranges = [(first_page, min(first_page + PAGES_PER_SHARD, pdf_doc.page_count))
+                   for first_page in range(0, pdf_doc.page_count, PAGES_PER_SHARD)]
+    if max_workers <= 1 or len(page_ranges) <= 1 or not pdf_doc.name:
+        for page in pdf_doc:
+            yield __get_page_lines(page)
+        return
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(page_ranges))) as executor:
+        for pages in executor.map(extract_page_lines, repeat(pdf_doc.name),
+                                  *zip(*page_ranges)):
+            yield from pages
+
+def __iter_margin_lines(page_lines:List[Line]) -> Iterator[Tuple[int, Tuple[int, int]]]:
+    by_top = sorted(range(len(page_lines)), key=lambda idx: page_lines[idx][0])
+    margin = set(by_top[:MARGIN_LINES] + by_top[-MARGIN_LINES:])
+    for idx in margin:
+        top, spans = page_lines[idx]
+        text_line = REGEX_DIGITS.sub('#', ''.join(text for _, _, text in spans).strip().lower())
+        yield idx, (round(top / Y_BUCKET), hash(text_line))
+
+def find_repeated_lines(pages:List[List[Line]]) -> Set[Tuple[int, int]]:
+    """Find the running headers and footers in a single pass over the pages:
+    the first and last lines of each page are hashed, digits (page numbers) ignored,
+    and bucketed by their vertical position.
+
+    Arguments:
+        pages: The lines of each page, as returned by extract_page_lines.
+
+    Returns:
+        The keys of the lines repeated at the same height in enough pages.
+    """
+    counter = Counter()
+    for page_lines in pages:
+        counter.update({key for _, key in __iter_margin_lines(page_lines)})
+    min_pages = max(MIN_REPEATED_PAGES, REPEATED_PAGES_RATIO * len(pages))
+    return {key for key, count in counter.items() if count >= min_pages}
+
+def iter_spans(pdf_doc:utils.pymupdf.Document, max_workers:int=1,
+               skip_repeated_lines:bool=True) -> Iterator[Tuple[str, float, str, int]]:
+    """Iterate over the spans of all the pages, without headers and footers.
+
+    Arguments:
+        pdf_doc: The pdf document, opened from a file to use more workers.
+        max_workers: The maximum number of processes extracting pages at the same time.
+        skip_repeated_lines: If True, the lines found by find_repeated_lines are dropped.
+
+    Yields:
+        The (font name, font size, text, page number) of each span in reading order.
+    """
+    pages = list(iter_pages(pdf_doc, max_workers))
+    repeated = find_repeated_lines(pages) if skip_repeated_lines else set()
+    for page_num, page_lines in enumerate(pages):
+        skipped = {idx for idx, key in __iter_margin_lines(page_lines) if key in repeated}
+        for idx, (_, spans) in enumerate(page_lines):
+            if idx in skipped:
+                logger.debug("skipping header/footer %s", spans)
                 continue
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    font_name = span["font"]
-                    font_size = span["size"]
-                    if (prev_font is not None) and (prev_font == (font_name, font_size)):
-                        block_prediction += span["text"]
-                        continue
-                    if regex_footer.match(block_prediction) or regex_header.match(block_prediction):
-                        print(block_prediction)
-                        block_prediction = ""
-                        prev_font = (font_name, font_size)
-                        continue
-                    extracted_text.append({
-                        'txt':filter_reference(block_prediction),
-                        'font':font_name,
-                        'size':font_size
-                    })
-                    block_prediction = span["text"]
-                    prev_font = (font_name, font_size)
+            for span in spans:
+                yield (*span, page_num)
+
+class SpanStore: #pylint: disable=R0902
+    """Text runs of a pdf in columnar form: one array per attribute, interned font names
+    and a single text buffer sliced by offsets, instead of a dict per run."""
+    __slots__ = ("font_names", "font_ids", "sizes", "pages", "offsets",
+                 "__font_index", "__parts", "__text")
+    def __init__(self):
+        self.font_names: List[str] = []
+        self.font_ids = array('I')
+        self.sizes = array('d')
+        self.pages = array('I')
+        self.offsets = array('Q', [0])
+        self.__font_index: Dict[str, int] = {}
+        self.__parts: List[str] = []
+        self.__text: Optional[str] = ""
+
+    def __len__(self) -> int:
+        return len(self.font_ids)
+
+    def append(self, font_name:str, size:float, text:str, page:int=0) -> None:
+        """Add a run at the end of the store.
+
+        Arguments:
+            font_name: The name of the font of the run.
+            size: The font size of the run.
+            text: The text of the run.
+            page: The number, from 0, of the page where the run starts.
+        """
+        font_id = self.__font_index.get(font_name)
+        if font_id is None:
+            font_id = self.__font_index[font_name] = len(self.font_names)
+            self.font_names.append(sys.intern(font_name))
+        self.font_ids.append(font_id)
+        self.sizes.append(size)
+        self.pages.append(page)
+        self.__parts.append(text)
+        self.offsets.append(self.offsets[-1] + len(text))
+        self.__text = None
+
+    @property
+    def text(self) -> str:
+        """The text of all the runs, joined once after the last append."""
+        if self.__text is None:
+            self.__text = ''.join(self.__parts)
+            self.__parts = [self.__text]
+        return self.__text
+
+    def get_text(self, idx:int) -> str:
+        """Get the text of the run idx."""
+        return self.text[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def iter_texts(self) -> Iterator[str]:
+        """Iterate over the text of each run."""
+        text = self.text
+        return (text[start:end] for start, end in zip(self.offsets, self.offsets[1:]))
+
+    def iter_runs(self) -> Iterator[Tuple[str, float, str]]:
+        """Iterate over the (font name, font size, text) of each run."""
+        return zip((self.font_names[font_id] for font_id in self.font_ids),
+                   self.sizes, self.iter_texts())
+
+def __add_run(store:SpanStore, font:Tuple[str, float, int], parts:List[str],
+              regex_skip:Optional[re.Pattern]) -> None:
+    if not parts:
+        return
+    text_run = ''.join(parts)
+    if regex_skip is not None and regex_skip.match(text_run):
+        logger.debug("skipping header/footer %s", text_run)
+        return
+    store.append(font[0], font[1], filter_reference(text_run), font[2])
+
+def get_chapter_text(pdf_doc:utils.pymupdf.Document, pattern_header:Optional[str]=None,
+                     pattern_footer:Optional[str]=None, max_workers:int=1) -> SpanStore:
+    """Join the consecutive spans with the same font in runs, dropping headers and footers.
+
+    Arguments:
+        pdf_doc: The pdf document.
+        pattern_header: A regular expression matching a page header not found automatically.
+        pattern_footer: A regular expression matching a page footer not found automatically.
+        max_workers: The maximum number of processes extracting pages at the same time.
+
+    Returns:
+        The runs, each one with its own font name and size.
+    """
+    extracted_text = SpanStore()
+    block_prediction: List[str] = []
+    prev_font = ("", -1.0, 0)
+    patterns = [pattern for pattern in (pattern_header, pattern_footer) if pattern is not None]
+    regex_skip = re.compile('|'.join(f"(?:{pattern})" for pattern in patterns)) \
+        if patterns else None
+    for font_name, font_size, span_text, page_num in iter_spans(pdf_doc, max_workers):
+        if prev_font[:2] == (font_name, font_size):
+            block_prediction.append(span_text)
+            continue
+        __add_run(extracted_text, prev_font, block_prediction, regex_skip)
+        block_prediction = [span_text]
+        prev_font = (font_name, font_size, page_num)
+    __add_run(extracted_text, prev_font, block_prediction, regex_skip)
     return extracted_text
 
-def cluster_text(raw_text:list, fonts:dict)->dict:
-    """Prototype, it shall organize the text extracted before
-    in order to have less possible instance not correlated.
-    desiderable: [{chapter title},{chapter text},{chapter title},...]"""
-    clustered_text = []
-    print(fonts)
-    if len(raw_text)<=1:
-        return raw_text
-    clustered_text.append(raw_text[0])
-    for rtext in raw_text[1:]:
-        if rtext['size'] == clustered_text[-1]['size'] and\
-              rtext['font'] == clustered_text[-1]['font']:
-            clustered_text[-1]['txt'] += f" {rtext['txt']}"
-        else:
-            clustered_text.append(rtext)
+def cluster_text(raw_text:SpanStore, fonts:Dict[str, Dict[str, str]]) -> SpanStore:
+    """Organize the text extracted before in order to have less possible instance
+    not correlated: consecutive runs with the same font size and font family,
+    e.g. the bold and italic words of a paragraph, are joined in a single run.
+    desiderable: [{chapter title},{chapter text},{chapter title},...]
+
+    Arguments:
+        raw_text: The runs, as returned by get_chapter_text.
+        fonts: The family name of each font, as returned by get_fonts;
+               a font not in it is a family of its own.
+
+    Returns:
+        The joined runs, each one with the font name of its first run.
+    """
+    clustered_text = SpanStore()
+    if len(raw_text) == 0:
+        return clustered_text
+    families = [fonts.get(font_name, {}).get('family-name') or font_name
+                for font_name in raw_text.font_names]
+    family_ids = [families[font_id] for font_id in raw_text.font_ids]
+    sizes = raw_text.sizes
+    bounds = [0] + [idx for idx in range(1, len(raw_text))
+                    if family_ids[idx] != family_ids[idx - 1] or sizes[idx] != sizes[idx - 1]]
+    texts = list(raw_text.iter_texts())
+    for start, end in zip(bounds, bounds[1:] + [len(raw_text)]):
+        clustered_text.append(raw_text.font_names[raw_text.font_ids[start]], sizes[start],
+                              ' '.join(texts[start:end]), raw_text.pages[start])
     return clustered_text
 
-def get_metadata(pdf_doc):  #pylint: disable=W0613
-    """prototype it shall take metadata by the file"""
-    return {"title":None, "author":None}
+def dump_span_store(store:SpanStore, out_file:IO[str]) -> None:
+    """Write the runs as a JSON list, one run at a time.
 
-def get_chapters(text_clustered:list)->list:
-    """protype it shall return a list of strings
-    where each one is a chapter"""
-    text_ret = ' '.join([i['txt'] for i in text_clustered])
-    return [text_ret]
+    Arguments:
+        store: The runs to write.
+        out_file: The text file to write to.
+    """
+    out_file.write("[")
+    for idx, (font_name, size, text) in enumerate(store.iter_runs()):
+        out_file.write(",\n" if idx > 0 else "\n")
+        out_file.write(json.dumps({"txt": text, "font": font_name, "size": size,
+                                   "page": store.pages[idx]}, ensure_ascii=False))
+    out_file.write("\n]\n")
 
-def main():#pylint: disable=R0914
-    """main function"""
-    in_file_path, out_file_path, language = input_tool.get_sys_input(os.path.dirname(__file__))
-    PATTERN_HEADER = r"arXiv:2310\.03605v3  \[cs.CR\]  29 Nov 2023"  #pylint: disable=C0103
-    PATTERN_FOOTER = r"pag. [0-9]+Phenomena Journal \| www\.phenomenajournal.itLuglio-Dicembre 2021 \| Volume 3 \|( Numero [0-9]+ \|)? Ipotesi e metodi di studio"  #pylint: disable=C0103,C0301
-    pdf_doc = fitz.open(in_file_path)
-    fonts = {}#get_fonts(pdf_doc)
-    text = get_chapter_text(pdf_doc, PATTERN_HEADER, PATTERN_FOOTER)
-    text = cluster_text(text, fonts)
-    with open("test.json", "w", encoding="UTF-8") as outfile:
-        outfile.write(json.dumps(text, separators=(",", ":"), indent=4))
-    chapters = get_chapters(text)
-    metadata = get_metadata(pdf_doc)
-    chapter_titles = ["1"]
-    chapters_paths = []
-    m4b.init(BACK_END_TTS)
+def get_metadata(pdf_doc:utils.pymupdf.Document) -> Dict[str, Optional[str]]:
+    """Get the title and the author stored in the pdf file, None when missing."""
+    metadata = pdf_doc.metadata or {}
+    return {"title": metadata.get("title") or None, "author": metadata.get("author") or None}
+
+def __normalize_title(title:str) -> str:
+    return REGEX_NOT_WORD.sub('', title).lower()
+
+def get_body_size(store:SpanStore) -> float:
+    """Get the font size of the body text, the one with the most characters."""
+    chars = Counter()
+    for size, start, end in zip(store.sizes, store.offsets, store.offsets[1:]):
+        chars[size] += end - start
+    return chars.most_common(1)[0][0]
+
+def find_font_headings(store:SpanStore) -> List[int]:
+    """Find the chapter titles from the font statistics: short runs larger than the body text,
+    with the largest size used by more than one title, so the document title alone
+    does not hide the chapters.
+
+    Arguments:
+        store: The clustered runs.
+
+    Returns:
+        The indexes of the chapter title runs.
+    """
+    min_size = get_body_size(store) * HEADING_SIZE_RATIO
+    candidates = [idx for idx, text in enumerate(store.iter_texts())
+                  if store.sizes[idx] >= min_size and 0 < len(text.strip()) <= MAX_TITLE_CHARS]
+    if not candidates:
+        return []
+    counter = Counter(store.sizes[idx] for idx in candidates)
+    repeated = [size for size, count in counter.items() if count > 1]
+    chapter_size = max(repeated) if repeated else max(counter)
+    return [idx for idx in candidates if store.sizes[idx] >= chapter_size]
+
+def __match_toc_entry(store:SpanStore, first_idx:int, page:int, title:str) -> int:
+    # the run of the page, from 0, beginning with the title, else the first run of the page
+    normalized = __normalize_title(title)
+    idx = first_idx
+    while idx < len(store) and store.pages[idx] == page:
+        if __normalize_title(store.get_text(idx)[:2 * len(title)]).startswith(normalized):
+            return idx
+        idx += 1
+    return first_idx
+
+def find_toc_headings(store:SpanStore, toc:list) -> List[Tuple[int, str]]:
+    """Find the runs where the top level entries of the pdf outline start:
+    the first run of the entry page beginning with the entry title,
+    else the first run of the page.
+
+    Arguments:
+        store: The clustered runs.
+        toc: The outline, as returned by `get_toc`: [[level, title, page from 1], ...].
+
+    Returns:
+        The index of the first run of each entry, with the entry title.
+    """
+    headings = []
+    idx = 0
+    for level, title, page, *_ in toc:
+        if level != 1 or page < 1:
+            continue
+        while idx < len(store) and store.pages[idx] < page - 1:
+            idx += 1
+        if idx == len(store):
+            break
+        idx = __match_toc_entry(store, idx, page - 1, title)
+        if not headings or headings[-1][0] < idx:
+            headings.append((idx, title.strip()))
+        idx += 1
+    return headings
+
+def get_chapters(text_clustered:SpanStore, toc:Optional[list]=None) -> List[Tuple[str, str]]:
+    """Split the document in chapters, where the outline entries start when the pdf
+    has an outline, else at the titles found by find_font_headings.
+
+    Arguments:
+        text_clustered: The clustered runs.
+        toc: The outline, as returned by `get_toc`.
+
+    Returns:
+        A list of (chapter title, chapter text), the text starting with the title.
+    """
+    if len(text_clustered) == 0:
+        return []
+    headings = find_toc_headings(text_clustered, toc) if toc else []
+    if not headings:
+        headings = [(idx, text_clustered.get_text(idx).strip())
+                    for idx in find_font_headings(text_clustered)]
+    if not headings or headings[0][0] != 0:
+        headings.insert(0, (0, text_clustered.get_text(0).strip()[:MAX_TITLE_CHARS]))
+    texts = list(text_clustered.iter_texts())
+    bounds = [idx for idx, _ in headings[1:]] + [len(texts)]
+    return [(title, ' '.join(texts[start:end]))
+            for (start, title), end in zip(headings, bounds)]
+
+def convert(args:argparse.Namespace) -> None:
+    """Convert a pdf file to audiobook, the TTS backend must be already initialized.
+
+    Arguments:
+        args: The options supplied by the user, `file` and `output_path` included.
+    """
+    # the document is closed once its text is extracted, before the synthesis
+    with fitz.open(args.file) as pdf_doc:
+        fonts = get_fonts(pdf_doc)
+        text = get_chapter_text(pdf_doc, max_workers=args.jobs)
+        text = cluster_text(text, fonts)
+        if args.debug_dump:
+            with open(os.path.splitext(args.output_path)[0] + ".spans.json", "w",
+                      encoding="UTF-8") as outfile:
+                dump_span_store(text, outfile)
+        chapters = get_chapters(text, pdf_doc.get_toc())
+        metadata = get_metadata(pdf_doc)
     with tempfile.TemporaryDirectory() as tempdir:
-        for idx, ch in enumerate(chapters):
-            filepath = os.path.join(tempdir, f"{idx}.txt")
-            print(ch)
-            if m4b.generate_audio(ch, filepath, lang=language, backend=BACK_END_TTS):
-                chapters_paths.append(filepath)
-    metadata_output = ffmetadata_generator.generate_ffmetadata(chapters_paths,
-                                                chapter_titles=chapter_titles,
-                                                title=metadata["title"],
-                                                author=metadata["author"])
-    m4b.generate_m4b(out_file_path, chapters, metadata_output)
+        audio_ext = m4b.get_audio_ext(BACK_END_TTS)
+        tts_jobs = [(ch, os.path.join(tempdir, f"{idx}{audio_ext}"))
+                    for idx, (_, ch) in enumerate(chapters)]
+        results = scheduler.synthesize_chapters(tts_jobs, lang=args.language,
+                                                backend=BACK_END_TTS, max_workers=args.jobs)
+        m4b.generate_m4b_chapters(args.output_path, [path for _, path in tts_jobs], results,
+                                  chapter_titles=[title for title, _ in chapters],
+                                  title=metadata["title"], author=metadata["author"],
+                                  mode=args.assembly)
+
+def main():
+    """main function"""
+    args = input_tool.get_sys_args(os.path.dirname(__file__), assembly=True, debug_dump=True)
+    m4b.run_converter(BACK_END_TTS, convert, args)
 
 if __name__ == "__main__":
     main()
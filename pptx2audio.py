@@ -2,17 +2,20 @@
 """
 file: [pptx2audio.py](https://github.com/deangelisdf/write2audiobook/blob/main/pptx2audio.py)
 
-description: Convert your pptx to audiobook in MP3 format.
+description: Convert your pptx to audiobook in M4B format, with a chapter per slide.
 
 Usage example:
     `python pptx2audio.py presentation.pptx`
 """
+from typing import List, Tuple
+import argparse
 import os
+import shutil
 import logging
 import pptx
 import pptx.parts.image
 from pptx import presentation, slide
-from backend_audio import m4b
+from backend_audio import m4b, manifest, scheduler
 from frontend import input_tool
 
 logging.basicConfig(level=logging.ERROR)
@@ -35,8 +38,10 @@ def save_image_from_pptx(image:pptx.parts.image.Image, folder_path:str) -> None:
         f.write(image.blob)
 
 def __get_notes(note: slide.NotesSlide) -> str:
-    print(note)
-    return ""
+    if note.notes_text_frame is None:
+        return ""
+    return note.notes_text_frame.text.strip()
+
 def __extract_text_from_slide(slide_obj: slide.Slide,
                               language:str="it") -> str:
     text_slide, text_note = "", ""
@@ -50,6 +55,26 @@ def __extract_text_from_slide(slide_obj: slide.Slide,
         text_slide += f"\n{TOK_SLIDE_NOTE[language]}\n{text_note}"
     return text_slide
 
+def __get_slide_title(slide_obj: slide.Slide, idx:int, language:str="it") -> str:
+    title_shape = slide_obj.shapes.title
+    if title_shape is not None and title_shape.text.strip():
+        return " ".join(title_shape.text.split())
+    return f"{TOK_NUM_SLIDES[language].strip()} {idx}"
+
+def extract_slides(path_pptx:str,
+                   language:str="it") -> List[Tuple[str, str]]:
+    """Extract the text of each slide, speaker notes included.
+    Arguments:
+        path_pptx (str): pptx presentation path
+        language (str): the language of the spoken slide numbers and notes
+    Returns:
+        List[Tuple[str, str]]: for each slide, its chapter title and the text to read
+    """
+    p: presentation.Presentation = pptx.Presentation(path_pptx)
+    return [(__get_slide_title(s, idx, language),
+             f"{TOK_NUM_SLIDES[language]} {idx}\n{__extract_text_from_slide(s, language)}")
+            for idx, s in enumerate(p.slides)]
+
 def extract_pptx_text(path_pptx:str,
                       language:str="it") -> str:
     """Extract the text from each slide and concat.
@@ -58,22 +83,32 @@ def extract_pptx_text(path_pptx:str,
     Returns:
         str: all text generated by presentation
     """
-    text_out:str = ""
-    p: presentation.Presentation = pptx.Presentation(path_pptx)
-    for idx,s in enumerate(p.slides):
-        text_out += f"\n{TOK_NUM_SLIDES[language]} {idx}\n"
-        ts = __extract_text_from_slide(s)
-        text_out += ts
-        if len(ts) == 0:
-            text_out += ""
-    return text_out
+    return "".join(f"\n{text}" for _, text in extract_slides(path_pptx, language))
+
+def convert(args:argparse.Namespace) -> None:
+    """Convert a pptx file to audiobook, the TTS backend must be already initialized.
+    Each slide is synthesized on its own and becomes a chapter of the audiobook.
+
+    Arguments:
+        args: The options supplied by the user, `file` and `output_path` included.
+    """
+    work_dir = manifest.get_work_dir(args.output_path)
+    job_manifest = manifest.JobManifest(work_dir, resume=args.resume)
+    slides = extract_slides(args.file, args.language)
+    audio_ext = m4b.get_audio_ext(BACK_END_TTS)
+    jobs = [(text, os.path.join(work_dir, f"s{idx}{audio_ext}"))
+            for idx, (_, text) in enumerate(slides)]
+    results = scheduler.synthesize_chapters(jobs, lang=args.language, backend=BACK_END_TTS,
+                                            max_workers=args.jobs, manifest=job_manifest)
+    m4b.generate_m4b_chapters(args.output_path, [path for _, path in jobs], results,
+                              chapter_titles=[title for title, _ in slides],
+                              mode=args.assembly)
+    shutil.rmtree(work_dir)
 
 def main():
     """main function"""
-    input_file_path, out_file_path, language = input_tool.get_sys_input(os.path.dirname(__file__))
-    m4b.init(BACK_END_TTS)
-    text=extract_pptx_text(input_file_path)
-    m4b.generate_audio(text, out_file_path, lang=language, backend=BACK_END_TTS)
+    args = input_tool.get_sys_args(os.path.dirname(__file__), assembly=True)
+    m4b.run_converter(BACK_END_TTS, convert, args)
 
 if __name__ == "__main__":
     main()
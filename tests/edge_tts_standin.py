@@ -0,0 +1,68 @@
+"""
+file: edge_tts_standin.py
+description: a local stand-in of the EDGE-TTS websocket service, answering each
+request with fake MP3 data, to test and benchmark the client without network
+"""
+import asyncio
+from aiohttp import web
+
+AUDIO_HEADER = b"X-RequestId:standin\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n"
+TURN_END = "X-RequestId:standin\r\nPath:turn.end\r\n\r\n{}"
+
+class EdgeTtsStandin:
+    """Websocket server speaking the EDGE-TTS protocol on localhost."""
+    def __init__(self, delay:float=0.0, failures:int=0):
+        """
+        Arguments:
+            delay: The seconds spent on each synthesis.
+            failures: The number of connections refused before serving the next ones.
+        """
+        self.delay = delay
+        self.failures = failures
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = ""
+        self.__runner = None
+
+    async def __handle(self, request:web.Request) -> web.StreamResponse:
+        self.requests += 1
+        if self.failures > 0:
+            self.failures -= 1
+            raise web.HTTPServiceUnavailable()
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            async for message in websocket:
+                if "Path:ssml" not in message.data:
+                    continue
+                await asyncio.sleep(self.delay)
+                audio = message.data.encode("UTF-8")
+                await websocket.send_bytes(len(AUDIO_HEADER).to_bytes(2, "big")
+                                           + AUDIO_HEADER + audio)
+                await websocket.send_str(TURN_END)
+        finally:
+            self.in_flight -= 1
+        return websocket
+
+    async def start(self) -> str:
+        """Start listening on a free port.
+
+        Returns:
+            The websocket URL to give to edge_tts_client.set_endpoint.
+        """
+        app = web.Application()
+        app.router.add_get("/", self.__handle)
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1] #pylint: disable=W0212
+        self.url = f"ws://127.0.0.1:{port}/?TrustedClientToken=standin"
+        return self.url
+
+    async def stop(self) -> None:
+        """Close the server."""
+        await self.__runner.cleanup()
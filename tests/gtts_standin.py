@@ -0,0 +1,78 @@
+"""
+file: gtts_standin.py
+description: a local stand-in of the Google Translate TTS endpoint, answering each
+request with its text as fake MP3 data, to test and benchmark the gTTS client without network
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import json
+import threading
+import time
+import urllib.parse
+
+class GttsStandin: #pylint: disable=R0902
+    """HTTP server speaking the gTTS batchexecute protocol on localhost."""
+    def __init__(self, delay:float=0.0, throttled:int=0):
+        """
+        Arguments:
+            delay: The seconds spent on each request.
+            throttled: The number of requests answered 429 before serving the next ones.
+        """
+        self.delay = delay
+        self.throttled = throttled
+        self.requests = 0
+        self.texts = []
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), self.__make_handler())
+        self.__server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.__server.server_address[1]}/batchexecute"
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    def answer(self, body:bytes) -> tuple:
+        """Get the HTTP status and content answering a request body"""
+        with self.__lock:
+            self.requests += 1
+            if self.throttled > 0:
+                self.throttled -= 1
+                return 429, b""
+        freq = urllib.parse.parse_qs(body.decode("UTF-8"))["f.req"][0]
+        text = json.loads(json.loads(freq)[0][0][1])[0]
+        with self.__lock:
+            self.texts.append(text)
+        time.sleep(self.delay)
+        audio = base64.b64encode(text.encode("UTF-8")).decode("ascii")
+        return 200, (')]}\'\n\n[["wrb.fr","jQ1olc","[\\"' + audio +
+                     '\\"]",null,null,null,"generic"]]').encode("UTF-8")
+
+    def __make_handler(self) -> type:
+        standin = self
+        class Handler(BaseHTTPRequestHandler):
+            """Answer the POST requests of gTTS"""
+            def do_POST(self): #pylint: disable=C0103
+                """Answer a chunk request"""
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                status, content = standin.answer(body)
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(content)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *_): #pylint: disable=W0221
+                """Keep the test output clean"""
+        return Handler
+
+    def start(self) -> str:
+        """Start serving in a background thread.
+
+        Returns:
+            The URL to give to GttsClient.
+        """
+        self.__thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        """Close the server."""
+        self.__server.shutdown()
+        self.__server.server_close()
@@ -0,0 +1,63 @@
+"""
+file: test_audio_probe.py
+description: used to test the exact audio durations and the chapter marks
+"""
+import sys
+import os
+import unittest
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import audio_probe, ffmetadata_generator #pylint: disable=C0413
+
+# MPEG-1 layer III, 128 kbps, 44100 Hz, stereo: 417 bytes and 1152 samples per frame
+FRAME_HEADER = b"\xff\xfb\x90\x00"
+FRAME = FRAME_HEADER + bytes(417 - len(FRAME_HEADER))
+
+def get_info_frame(delay:int, padding:int) -> bytes:
+    """Build a LAME Info frame without the optional Xing fields"""
+    frame = bytearray(FRAME)
+    xing = 4 + 32
+    frame[xing:xing + 8] = b"Info" + bytes(4)
+    frame[xing + 8:xing + 12] = b"LAME"
+    frame[xing + 8 + 21:xing + 8 + 24] = ((delay << 12) | padding).to_bytes(3, "big")
+    return bytes(frame)
+
+class TestAudioProbe(unittest.TestCase):
+    """Unit tests audio_probe.py and chapter marks of ffmetadata_generator.py"""
+    def test_count_cbr_frames(self):
+        """The samples of every frame are counted, tags are skipped"""
+        id3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + bytes(10)
+        samples, sample_rate = audio_probe.get_mp3_samples(id3 + FRAME * 100)
+        self.assertEqual((samples, sample_rate), (115200, 44100))
+
+    def test_gapless_info_is_trimmed(self):
+        """The Info frame is not audio and the encoder delay and padding are removed"""
+        data = get_info_frame(576, 1000) + FRAME * 10
+        self.assertEqual(audio_probe.get_mp3_samples(data), (11520 - 1576, 44100))
+
+    def test_not_mp3(self):
+        """Data without frames has no samples"""
+        self.assertEqual(audio_probe.get_mp3_samples(b"hello world"), (0, 0))
+
+    def test_audio_frames_can_be_joined(self):
+        """Tags and Info frames are dropped, the joined frames count every chunk"""
+        id3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + bytes(10)
+        chunks = [id3 + get_info_frame(576, 0) + FRAME * 3, FRAME * 2, b"not audio"]
+        joined = b"".join(frame for chunk in chunks
+                          for frame in audio_probe.iter_audio_frames(chunk))
+        self.assertEqual(joined, FRAME * 5)
+        self.assertEqual(audio_probe.get_mp3_samples(joined), (5 * 1152, 44100))
+
+    def test_chapter_marks_include_pause(self):
+        """Chapters are marked from the given durations plus the silence between them"""
+        metadata = ffmetadata_generator.generate_ffmetadata(["a", "b"], ["one", "two"],
+                                                            durations=[1.5, 2.0],
+                                                            pause_duration=1)
+        self.assertEqual(metadata, ";FFMETADATA1\n"
+                         "[CHAPTER]\nSTART=0\nEND=2500000000\ntitle=one\n"
+                         "[CHAPTER]\nSTART=2500000000\nEND=4500000000\ntitle=two\n")
+
+if __name__ == "__main__":
+    unittest.main()
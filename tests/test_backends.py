@@ -0,0 +1,108 @@
+"""
+file: test_backends.py
+description: used to test the TTS backend registry and the offline NULL backend
+"""
+import sys
+import os
+import argparse
+import tempfile
+import unittest
+from typing import Iterable, Iterator
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import audio_probe, backends, m4b, scheduler #pylint: disable=C0413
+import txt2audio #pylint: disable=C0413
+
+class AsyncioBackend(backends.TtsBackend):
+    """An engine driven by asyncio workers, saving the text in place of the audio"""
+    name = "ASYNCIO"
+    capabilities = backends.Capabilities(4096, 4, backends.FORMAT_MP3,
+                                         backends.WORKERS_ASYNCIO, True)
+
+    def synthesize_batch(self, chunks:Iterable[str], *, lang:str="it") -> Iterator[bytes]:
+        return (chunk.encode() for chunk in chunks)
+
+    async def synthesize_async(self, text_in:str, out_path:str, *, lang:str="it") -> bool:
+        Path(out_path).write_text(text_in, encoding="UTF-8")
+        return True
+
+class TestBackends(unittest.TestCase):
+    """Unit tests backends.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_registry(self):
+        """Every engine is registered with its capabilities, unknown names are refused"""
+        self.assertEqual(sorted(backends.registry), ["EDGE_TTS", "GTTS", "NULL", "PYTTS"])
+        self.assertEqual(backends.get_backend("PYTTS").capabilities.workers,
+                         backends.WORKERS_PROCESSES)
+        self.assertTrue(backends.get_backend("NULL").capabilities.offline)
+        with self.assertRaises(ValueError):
+            backends.get_backend("MISSING")
+        self.assertNotEqual(m4b.get_cache_key("a", lang="it", backend="GTTS"),
+                            m4b.get_cache_key("a", lang="it", backend="NULL"))
+
+    def test_synthesize_batch_required(self):
+        """An engine without synthesize_batch cannot be created"""
+        class IncompleteBackend(backends.TtsBackend): #pylint: disable=R0903,W0223
+            """An engine missing synthesize_batch"""
+            name = "INCOMPLETE"
+        with self.assertRaises(TypeError):
+            IncompleteBackend() #pylint: disable=E0110
+
+    def test_null_batch_in_order(self):
+        """The NULL engine lasts as long as a voice reading the text"""
+        audio = list(backends.get_backend("NULL").synthesize_batch(["a" * 15, "b" * 30]))
+        paths = [os.path.join(self.temp_dir.name, f"{idx}.wav") for idx in range(2)]
+        for path, data in zip(paths, audio):
+            with open(path, "wb") as wav_file:
+                wav_file.write(data)
+        self.assertEqual(audio_probe.get_durations(paths), [1.0, 2.0])
+
+    def test_null_joins_chunks(self):
+        """A text longer than a chunk is saved as a single WAV file"""
+        path = os.path.join(self.temp_dir.name, "c0.mp3")
+        text = ("word " * 3000).strip()
+        self.assertTrue(backends.get_backend("NULL").synthesize(text, path))
+        self.assertAlmostEqual(audio_probe.get_duration(path),
+                               len(text) / backends.NULL_CHARS_PER_SECOND, delta=1)
+
+    @patch.object(txt2audio, 'BACK_END_TTS', 'NULL')
+    @patch.object(m4b.ffmpeg, 'run')
+    def test_txt2audio_offline(self, mock_run):
+        """A long text runs the whole txt2audio pipeline with no TTS engine"""
+        text_path = os.path.join(self.temp_dir.name, "long.txt")
+        with open(text_path, "w", encoding="UTF-8") as text_file:
+            text_file.write("\n\n".join(f"Paragraph {idx}. " + "words " * 200
+                                        for idx in range(40)))
+        args = argparse.Namespace(file=text_path, language="it", jobs=4, resume=False,
+                                  output_path=os.path.join(self.temp_dir.name, "long.mp3"))
+        unit_paths = []
+        def read_concat_list(stream, **_):
+            ffmpeg_args = stream.get_args()
+            list_path = ffmpeg_args[ffmpeg_args.index("-i") + 1]
+            unit_paths.extend(Path(list_path).read_text(encoding="UTF-8").splitlines())
+        mock_run.side_effect = read_concat_list
+        characters = scheduler.stats["characters"]
+        txt2audio.convert(args)
+        self.assertGreater(len(unit_paths), 1)
+        # the NULL engine writes WAV data, its files are named after it
+        self.assertTrue(all(path.endswith(".wav'") for path in unit_paths))
+        self.assertGreater(scheduler.stats["characters"] - characters, 40 * 1200)
+
+    @patch.dict(backends.registry, {"ASYNCIO": AsyncioBackend()})
+    @patch.object(audio_probe, 'get_duration', side_effect=lambda path: os.path.getsize(path) * 1.0)
+    def test_asyncio_workers_use_registry(self, _):
+        """The asyncio workers synthesize with the engine they were created for"""
+        jobs = [("a" * (idx + 1), os.path.join(self.temp_dir.name, f"c{idx}.mp3"))
+                for idx in range(3)]
+        results = scheduler.synthesize_chapters(jobs, backend="ASYNCIO", max_workers=2)
+        self.assertEqual(results, [1.0, 2.0, 3.0])
+
+if __name__ == "__main__":
+    unittest.main()
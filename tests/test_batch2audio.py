@@ -0,0 +1,80 @@
+"""
+file: test_batch2audio.py
+description: used to test the batch conversion of a directory tree
+"""
+import sys
+import os
+import time
+import argparse
+import threading
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+import batch2audio #pylint: disable=C0413
+from backend_audio import scheduler #pylint: disable=C0413
+
+stuck_stopped = threading.Event()
+
+def fake_convert_document(document:str, *_) -> None:
+    """A stuck conversion, stopping only when cancelled, a failed one and fast ones"""
+    if "stuck" in document:
+        try:
+            for _ in range(600):
+                scheduler.cancel_local.token.check()
+                time.sleep(0.05)
+        finally:
+            stuck_stopped.set()
+    if "broken" in document:
+        raise ValueError(document)
+
+class TestBatch2Audio(unittest.TestCase):
+    """Unit tests batch2audio.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_find_documents_mirror_tree(self):
+        """Supported documents are found recursively and mapped to the output tree"""
+        root = Path(self.temp_dir.name, "library")
+        (root / "novels").mkdir(parents=True)
+        for name in ("novels/a.epub", "b.TXT", "c.odt"):
+            (root / name).write_text("x", encoding="UTF-8")
+        jobs = batch2audio.find_documents(str(root), "out")
+        self.assertEqual(jobs, [(str(root / "b.TXT"), os.path.join("out", "b.mp3")),
+                                (str(root / "novels/a.epub"),
+                                 os.path.join("out", "novels", "a.m4b"))])
+
+    @patch.object(batch2audio, 'convert_document', side_effect=fake_convert_document)
+    def test_stuck_document_does_not_block(self, mock_convert):
+        """A stuck document is reported as failed and cancelled while the others are converted"""
+        jobs = [(name, name + ".m4b") for name in ("stuck.pdf", "broken.pdf", "a.txt", "b.txt")]
+        args = argparse.Namespace(documents=1, timeout=1)
+        runner = batch2audio.BatchRunner(jobs, args)
+        start = time.monotonic()
+        runner.run()
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(sorted(runner.failed), ["broken.pdf", "stuck.pdf"])
+        self.assertEqual(sorted(runner.converted), ["a.txt", "b.txt"])
+        self.assertEqual(mock_convert.call_count, 4)
+        self.assertTrue(stuck_stopped.wait(5))
+
+    @patch.object(batch2audio.m4b, 'close_edge_tts')
+    @patch.object(batch2audio.m4b, 'init')
+    @patch.object(batch2audio, 'find_documents', side_effect=KeyboardInterrupt)
+    def test_interrupted_batch_closes_engine(self, _, mock_init, mock_close):
+        """The shared TTS engine is released also when the batch is interrupted"""
+        args = argparse.Namespace(input=self.temp_dir.name, output_dir="out",
+                                  cache_dir=None, cache_size=1)
+        with patch.object(batch2audio.input_tool, 'get_batch_args', return_value=args):
+            with self.assertRaises(KeyboardInterrupt):
+                batch2audio.main()
+        mock_init.assert_called_once()
+        mock_close.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
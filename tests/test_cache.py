@@ -0,0 +1,89 @@
+"""
+file: test_cache.py
+description: used to test the synthesized audio cache
+"""
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import cache, m4b #pylint: disable=C0413
+
+def fake_generate_audio_gtts(text_in:str, out_mp3_path:str, *, lang:str) -> bool: #pylint: disable=W0613
+    """Write the text as audio content"""
+    Path(out_mp3_path).write_text(text_in, encoding="UTF-8")
+    return True
+
+class TestCache(unittest.TestCase):
+    """Unit tests cache.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+
+    def tearDown(self):
+        m4b.audio_cache = None
+        self.temp_dir.cleanup()
+
+    def test_key_ignores_white_spaces(self):
+        """Text differing only by white spaces share the same key"""
+        key_a = cache.get_cache_key("hello  world\n", backend="GTTS", voice="it", lang="it")
+        key_b = cache.get_cache_key(" hello world", backend="GTTS", voice="it", lang="it")
+        key_c = cache.get_cache_key("hello world", backend="EDGE_TTS", voice="it", lang="it")
+        self.assertEqual(key_a, key_b)
+        self.assertNotEqual(key_a, key_c)
+
+    def test_evict_least_recently_used(self):
+        """The oldest audio is removed when the cache is over its cap"""
+        audio_cache = cache.AudioCache(self.cache_dir, max_size=12)
+        src = os.path.join(self.temp_dir.name, "src.mp3")
+        Path(src).write_bytes(b"12345")
+        for key in ("aa01", "bb02"):
+            audio_cache.put(key, src)
+        os.utime(os.path.join(self.cache_dir, "aa", "aa01.mp3"), (0, 0))
+        audio_cache.put("cc03", src)
+        out = os.path.join(self.temp_dir.name, "out.mp3")
+        self.assertFalse(audio_cache.get("aa01", out))
+        self.assertTrue(audio_cache.get("bb02", out))
+        self.assertTrue(audio_cache.get("cc03", out))
+        self.assertEqual(audio_cache.size(), 10)
+
+    def test_put_walks_only_once(self):
+        """Storing audio under the cap does not walk the cache directory each time"""
+        audio_cache = cache.AudioCache(self.cache_dir)
+        src = os.path.join(self.temp_dir.name, "src.mp3")
+        Path(src).write_bytes(b"12345")
+        with patch.object(cache.os, 'walk', wraps=os.walk) as mock_walk:
+            for idx in range(20):
+                audio_cache.put(f"{idx:04d}", src)
+        self.assertEqual(mock_walk.call_count, 1)
+
+    @patch.object(m4b, 'generate_audio_gtts', side_effect=fake_generate_audio_gtts)
+    def test_generate_audio_twice_calls_tts_once(self, mock_gtts):
+        """A second run of the same text does not call the TTS engine"""
+        m4b.audio_cache = cache.AudioCache(self.cache_dir)
+        for idx in range(2):
+            out = os.path.join(self.temp_dir.name, f"c{idx}.mp3")
+            self.assertTrue(m4b.generate_audio("ciao", out, lang="it", backend="GTTS"))
+            self.assertEqual(Path(out).read_text(encoding="UTF-8"), "ciao")
+        mock_gtts.assert_called_once()
+
+    def test_wav_engine_entries(self):
+        """The audio of a WAV engine is cached in .wav files, counted by the cap"""
+        m4b.audio_cache = cache.AudioCache(self.cache_dir, max_size=1024**2)
+        out = os.path.join(self.temp_dir.name, "c0.wav")
+        self.assertTrue(m4b.generate_audio("ciao " * 10, out, lang="it", backend="NULL"))
+        entries = [name for _, _, files in os.walk(self.cache_dir) for name in files]
+        self.assertEqual(len(entries), 1)
+        self.assertTrue(entries[0].endswith(".wav"))
+        self.assertEqual(m4b.audio_cache.size(), os.path.getsize(out))
+        os.remove(out)
+        self.assertTrue(m4b.audio_cache.get(
+            m4b.get_cache_key("ciao " * 10, lang="it", backend="NULL"), out, ".wav"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+file: test_chunker.py
+description: used to test the text splitting in TTS chunks
+"""
+import sys
+import os
+import io
+import unittest
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import chunker #pylint: disable=C0413
+
+class TestChunker(unittest.TestCase):
+    """Unit tests chunker.py"""
+    def test_short_text_single_chunk(self):
+        """A text shorter than the limit is not split"""
+        self.assertEqual(list(chunker.iter_chunks("  hi there \n", 100)), ["hi there"])
+        self.assertEqual(list(chunker.iter_chunks("   ", 100)), [])
+
+    def test_prefer_sentence_boundary(self):
+        """The text is cut after the last sentence, not after the last word"""
+        text = "First sentence is here. Second one, with a clause and more words"
+        self.assertEqual(list(chunker.iter_chunks(text, 50)),
+                         ["First sentence is here. Second one,",
+                          "with a clause and more words"])
+
+    def test_no_space_is_still_split(self):
+        """A text without any boundary is cut at the limit"""
+        chunks = list(chunker.iter_chunks("x" * 250, 100))
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+
+    def test_words_are_preserved(self):
+        """Every chunk fits the limit and no word is lost"""
+        text = " ".join(f"word{idx}" + ("." if idx % 7 == 0 else "") for idx in range(2000))
+        chunks = list(chunker.iter_chunks(text, chunker.get_max_chars("GTTS")))
+        self.assertTrue(all(len(chunk) <= chunker.get_max_chars("GTTS") for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), text.split())
+
+    def test_file_chunks_match_whole_text(self):
+        """Reading the file block by block gives the same chunks of the whole text"""
+        text = "\n\n".join(" ".join(f"word{idx}" + ("." if idx % 7 == 0 else "")
+                                    for idx in range(par, par + 40)) for par in range(300))
+        for block_size in (1, 37, 1000, len(text) + 1):
+            self.assertEqual(list(chunker.iter_file_chunks(io.StringIO(text), 500, block_size)),
+                             list(chunker.iter_chunks(text, 500)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+file: test_docx2audio.py
+description: used to test the docx text extraction
+"""
+import sys
+import os
+import tempfile
+import unittest
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from docx import Document #pylint: disable=C0413
+from backend_audio import m4b #pylint: disable=C0413
+import docx2audio #pylint: disable=C0413
+
+def make_docx(docx_path:str) -> None:
+    """Write a docx with preface, titles, lists, chapters and merged table cells"""
+    document = Document()
+    document.add_paragraph("Preface")
+    document.add_paragraph("before the first title")
+    document.add_heading("First", level=1)
+    document.add_paragraph("")
+    document.add_paragraph("item a", style="List Paragraph")
+    document.add_paragraph("item b", style="List Paragraph")
+    document.add_heading("Section", level=2)
+    run = document.add_paragraph("tab").add_run("\tand\nbreak")
+    run.bold = True
+    table = document.add_table(rows=3, cols=3)
+    for idx, cell in enumerate(cell for row in table.rows for cell in row.cells):
+        cell.text = f"cell {idx}"
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(2, 2))
+    document.add_heading("Empty", level=1)
+    document.add_heading("Last", level=1)
+    document.add_paragraph("last words")
+    document.save(docx_path)
+
+class TestDocx2Audio(unittest.TestCase):
+    """Unit tests docx2audio.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+        self.docx_path = os.path.join(self.temp_dir.name, "doc.docx")
+        make_docx(self.docx_path)
+
+    def test_streaming_reader_same_text(self):
+        """The streaming reader gives the same chapters of the python-docx one"""
+        expected = [docx2audio.get_text_from_chapter(chapter, "en")
+                    for chapter in docx2audio.extract_chapters(Document(self.docx_path))]
+        chapters = list(docx2audio.iter_docx_chapters(self.docx_path, "en"))
+        self.assertEqual(chapters, expected)
+        self.assertEqual([title for _, title in chapters], ["Preface", "First", "Last"])
+        self.assertIn("\t0: item a.\n\t1: item b.\n\n.\nCHAPTER: Section\ntab\tand\nbreak\n",
+                      chapters[1][0])
+        self.assertIn("cell 0\tcell 1\tcell 0\tcell 1\tcell 2\n"
+                      "cell 3\tcell 4\tcell 5\tcell 8\n"
+                      "cell 6\tcell 7\tcell 5\tcell 8\n", chapters[1][0])
+    def test_chapter_jobs_language(self):
+        """The chapter jobs use the keywords of the given language"""
+        titles = []
+        jobs = list(docx2audio.iter_chapter_jobs(self.docx_path, self.temp_dir.name, titles,
+                                                 language="en"))
+        self.assertEqual(titles, ["Preface", "First", "Last"])
+        self.assertTrue(jobs[1][0].startswith("TITLE: First.\n"))
+        self.assertIn("CHAPTER: Section", jobs[1][0])
+        self.assertEqual(jobs[2][1], os.path.join(
+            self.temp_dir.name, "c2" + m4b.get_audio_ext(docx2audio.BACK_END_TTS)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+file: test_ebook2audio.py
+description: used to test the epub parsing
+"""
+import sys
+import os
+import io
+import argparse
+import tempfile
+import zipfile
+import unittest
+from unittest.mock import patch
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from lxml import etree #pylint: disable=C0413
+import ebook2audio #pylint: disable=C0413
+
+CONTENT_OPF = b"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0">
+ <metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>T</dc:title></metadata>
+ <manifest>
+  <item id="cover" href="Text/cover.xhtml" media-type="application/xhtml+xml"/>
+  <item id="c1" href="Text/chapter%201.xhtml" media-type="application/xhtml+xml"/>
+  <item id="img" href="Images/big.jpg" media-type="image/jpeg"/>
+ </manifest>
+ <spine><itemref idref="cover"/><itemref idref="c1"/></spine>
+ <guide><reference type="cover" href="Text/cover.xhtml"/></guide>
+</package>"""
+
+CONTAINER_XML = b"""<?xml version="1.0"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+ <rootfiles>
+  <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+ </rootfiles>
+</container>"""
+
+def make_epub() -> io.BytesIO:
+    """Build a tiny epub with two rootfiles, its content.opf in a subdirectory"""
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as epub_zip:
+        epub_zip.writestr("mimetype", "application/epub+zip")
+        epub_zip.writestr("META-INF/container.xml", CONTAINER_XML)
+        epub_zip.writestr("OEBPS/content.opf", CONTENT_OPF)
+        epub_zip.writestr("OEBPS/Text/cover.xhtml", "<html><body><p>Cover</p></body></html>")
+        epub_zip.writestr("OEBPS/Text/chapter 1.xhtml",
+                          "<html><body><p>Hello</p><p>world</p></body></html>")
+        epub_zip.writestr("OEBPS/Images/big.jpg", bytes(1024))
+    return data
+
+class TestEbook2Audio(unittest.TestCase):
+    """Unit tests ebook2audio.py"""
+    def setUp(self):
+        self.epub_zip = zipfile.ZipFile(make_epub()) #pylint: disable=R1732
+        self.addCleanup(self.epub_zip.close)
+        with self.epub_zip.open("OEBPS/content.opf") as content_file:
+            self.tree = etree.parse(content_file)
+
+    def test_chapter_read_from_zip(self):
+        """Only the spine members are opened, straight from the zip"""
+        opf_index = ebook2audio.OpfIndex(self.tree, ebook2audio.get_guide_epub(self.tree))
+        with patch.object(zipfile.ZipFile, 'open', side_effect=self.epub_zip.open) as mock_open:
+            texts = [ebook2audio.get_text_from_chapter(opf_index, idref, self.epub_zip,
+                                                       "OEBPS")[0]
+                     for idref in ("cover", "c1")]
+        self.assertEqual(texts, ["", "Helloworld"])
+        mock_open.assert_called_once_with("OEBPS/Text/chapter 1.xhtml")
+
+    def test_opf_index(self):
+        """The manifest is indexed by id, guide items have no chapter href"""
+        opf_index = ebook2audio.OpfIndex(self.tree, ebook2audio.get_guide_epub(self.tree))
+        self.assertEqual(opf_index.items["img"],
+                         ebook2audio.ManifestItem("Images/big.jpg", "image/jpeg", ""))
+        self.assertIsNone(opf_index.get_href("cover"))
+        self.assertIsNone(opf_index.get_href("missing"))
+        self.assertEqual(opf_index.get_href("c1"), "Text/chapter%201.xhtml")
+
+    def test_iter_chapter_text(self):
+        """Each body block is a segment, loose text and comments are skipped"""
+        xhtml = io.BytesIO(b"<html><head><title>x</title></head><body>loose"
+                           b"<p>A&nbsp;b<i>c</i>d</p>tail<div><p>e</p>\r\n<p>f</p></div>"
+                           b"<!-- note --><p>g<br/>h</p></body></html>")
+        self.assertEqual(list(ebook2audio.iter_chapter_text(xhtml)),
+                         ["Ab\nc\nd", "e\n\n\nf", "g\nh"])
+
+    @patch.object(ebook2audio.scheduler, 'synthesize_chapters',
+                  side_effect=lambda jobs, **_: [1.0] * len(jobs))
+    @patch.object(ebook2audio.stream_encoder, 'M4bStreamEncoder')
+    def test_stream_one_encoder_per_book(self, mock_encoder, _):
+        """All the rootfiles of an epub are streamed to a single encoder"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            epub_path = os.path.join(temp_dir, "book.epub")
+            with open(epub_path, "wb") as epub_file:
+                epub_file.write(make_epub().getvalue())
+            args = argparse.Namespace(file=epub_path,
+                                      output_path=os.path.join(temp_dir, "book.m4b"),
+                                      language="it", jobs=1, resume=True, stream=True)
+            ebook2audio.convert(args)
+        mock_encoder.assert_called_once_with(args.output_path, remove_chapters=False)
+        self.assertEqual(mock_encoder.return_value.get_on_done.call_count, 2)
+        mock_encoder.return_value.finish.assert_called_once_with(author='', title="T")
+
+    @patch.object(ebook2audio.m4b, 'generate_m4b_chapters')
+    @patch.object(ebook2audio.scheduler, 'synthesize_chapters',
+                  side_effect=lambda jobs, **_: [1.0] * len(jobs))
+    def test_relative_output_path(self, mock_synthesize, mock_generate):
+        """The chapters are saved in the work directory of a relative output path"""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+            try:
+                os.mkdir("audiobooks")
+                with open("book.epub", "wb") as epub_file:
+                    epub_file.write(make_epub().getvalue())
+                args = argparse.Namespace(file="book.epub", output_path="audiobooks/book.m4b",
+                                          language="it", jobs=1, resume=False, stream=False,
+                                          assembly=ebook2audio.m4b.ASSEMBLY_FILTER)
+                ebook2audio.convert(args)
+                self.assertFalse(os.path.exists(os.path.join("audiobooks", "book.work")))
+            finally:
+                os.chdir(cwd)
+        paths = [path for call in mock_synthesize.call_args_list for _, path in call.args[0]]
+        self.assertTrue(paths)
+        self.assertTrue(all(os.path.dirname(path) == os.path.join("audiobooks", "book.work")
+                            for path in paths))
+        self.assertEqual(mock_generate.call_args.args[0], "audiobooks/book.m4b")
+
+if __name__ == '__main__':
+    unittest.main()
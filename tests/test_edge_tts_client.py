@@ -0,0 +1,85 @@
+"""
+file: test_edge_tts_client.py
+description: used to test the EDGE-TTS client against a local stand-in of the service
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import edge_tts #pylint: disable=C0413
+from edge_tts_standin import EdgeTtsStandin #pylint: disable=C0413
+from backend_audio import edge_tts_client #pylint: disable=C0413
+
+VOICE = "it-IT-ElsaNeural"
+
+class TestEdgeTtsClient(unittest.TestCase):
+    """Unit tests edge_tts_client.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+        wss_url = edge_tts.communicate.WSS_URL
+        self.addCleanup(edge_tts_client.set_endpoint, wss_url)
+
+    def __save_all(self, standin:EdgeTtsStandin, client_args:dict, count:int) -> list:
+        async def save_all():
+            edge_tts_client.set_endpoint(await standin.start())
+            client = edge_tts_client.EdgeTtsClient(VOICE, **client_args)
+            try:
+                return await asyncio.gather(*[
+                    client.save(f"text {idx}", os.path.join(self.temp_dir.name, f"{idx}.mp3"))
+                    for idx in range(count)])
+            finally:
+                await standin.stop()
+        return asyncio.run(save_all())
+
+    def test_concurrency_limit(self):
+        """Many requests are in flight at once, never more than max_concurrency"""
+        standin = EdgeTtsStandin(delay=0.05)
+        results = self.__save_all(standin, {"max_concurrency": 3, "rate": None}, 9)
+        self.assertEqual(results, [True] * 9)
+        self.assertEqual(standin.max_in_flight, 3)
+        self.assertIn(b"text 4", Path(self.temp_dir.name, "4.mp3").read_bytes())
+
+    def test_retry_with_backoff(self):
+        """Refused connections are retried until the service answers"""
+        standin = EdgeTtsStandin(failures=2)
+        results = self.__save_all(standin, {"backoff": 0.01, "retries": 2}, 1)
+        self.assertEqual(results, [True])
+        self.assertEqual(standin.requests, 3)
+
+    def test_give_up_after_retries(self):
+        """A request failing more than the retries is reported as not saved"""
+        standin = EdgeTtsStandin(failures=5)
+        results = self.__save_all(standin, {"backoff": 0.01, "retries": 1}, 1)
+        self.assertEqual(results, [False])
+        self.assertFalse(Path(self.temp_dir.name, "0.mp3").exists())
+
+    def test_token_bucket_rate(self):
+        """After the burst the requests start at the given rate"""
+        async def acquire_all():
+            bucket = edge_tts_client.TokenBucket(rate=50, burst=5)
+            start = time.monotonic()
+            for _ in range(15):
+                await bucket.acquire()
+            return time.monotonic() - start
+        self.assertGreaterEqual(asyncio.run(acquire_all()), 0.19)
+
+    def test_voices_cached_on_disk(self):
+        """The voices list is read from disk while it is fresh"""
+        voices_path = os.path.join(self.temp_dir.name, "voices.json")
+        Path(voices_path).write_text('[{"Name": "it-IT-ElsaNeural", "Gender": "Female",'
+                                     ' "Locale": "it-IT"}]', encoding="UTF-8")
+        manager = asyncio.run(edge_tts_client.get_voices_manager(voices_path))
+        self.assertEqual([v["Name"] for v in manager.find(Gender="Female", Language="it")],
+                         ["it-IT-ElsaNeural"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+file: test_gtts_client.py
+description: used to test the gTTS client against a local stand-in of the service
+"""
+import sys
+import os
+import time
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gtts_standin import GttsStandin #pylint: disable=C0413
+from backend_audio import gtts_client, m4b #pylint: disable=C0413
+
+# MPEG-2 layer III, 32 kbps, 24000 Hz, mono: 96 bytes per frame, as gTTS returns
+FRAME = b"\xff\xf3\x44\xc4" + bytes(92)
+
+class TestGttsClient(unittest.TestCase):
+    """Unit tests gtts_client.py"""
+    def __fetch_all(self, standin:GttsStandin, chunks:list, **client_args) -> tuple:
+        client = gtts_client.GttsClient(url=standin.start(), **client_args)
+        self.addCleanup(standin.stop)
+        self.addCleanup(client.close)
+        start = time.monotonic()
+        return client.fetch_all(chunks), time.monotonic() - start, client
+
+    def test_chunks_fetched_concurrently(self):
+        """The chunks are fetched at the same time and returned in order"""
+        chunks = [f"chunk {idx}" for idx in range(16)]
+        results, elapsed, _ = self.__fetch_all(GttsStandin(delay=0.1), chunks, max_workers=8)
+        self.assertEqual(results, [chunk.encode("UTF-8") for chunk in chunks])
+        self.assertLess(elapsed, 1.0)
+
+    def test_throttled_requests_are_retried(self):
+        """429 answers slow the client down and the requests are retried"""
+        standin = GttsStandin(throttled=3)
+        results, _, client = self.__fetch_all(standin, ["a", "b"], max_workers=1, backoff=0.01)
+        self.assertEqual(results, [b"a", b"b"])
+        self.assertEqual(client.stats["throttled"], 3)
+        self.assertEqual(standin.requests, 5)
+        self.assertGreater(client.limiter.interval, 0)
+
+    def test_give_up_after_retries(self):
+        """A chunk throttled more than the retries is reported as missing"""
+        results, _, client = self.__fetch_all(GttsStandin(throttled=10), ["a"],
+                                              retries=2, backoff=0.01)
+        self.assertEqual(results, [None])
+        self.assertEqual(client.stats["requests"], 3)
+
+    def test_rate_limiter_adapts(self):
+        """The interval grows on throttling and shrinks back on success"""
+        limiter = gtts_client.AdaptiveRateLimiter()
+        limiter.throttled(retry_after=0)
+        limiter.throttled(retry_after=0)
+        self.assertAlmostEqual(limiter.interval, 2 * gtts_client.THROTTLED_INTERVAL)
+        for _ in range(100):
+            limiter.succeeded()
+        self.assertLess(limiter.interval, 0.01)
+
+    @patch.object(m4b, 'get_gtts_client')
+    def test_chunks_joined_in_memory(self, mock_client):
+        """The chunk frames are written one after the other, a missing chunk is skipped"""
+        mock_client.return_value.fetch_all.return_value = [FRAME * 2, None, FRAME]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            mp3_path = os.path.join(temp_dir, "c0.mp3")
+            text = " ".join(["word"] * 60)
+            self.assertTrue(m4b.generate_audio_gtts(text, mp3_path, lang="it"))
+            self.assertEqual(Path(mp3_path).read_bytes(), FRAME * 3)
+
+if __name__ == "__main__":
+    unittest.main()
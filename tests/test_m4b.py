@@ -0,0 +1,139 @@
+"""
+file: test_m4b.py
+description: used to test the audiobook assembly, with ffmpeg mocked
+"""
+import sys
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+import ffmpeg #pylint: disable=C0413
+from backend_audio import m4b #pylint: disable=C0413
+
+FFMETADATA = ";FFMETADATA1\n[CHAPTER]\nTIMEBASE=1/1000\nSTART=0\nEND=1000\ntitle=One\n"
+# MPEG-1 layer III, 128 kbps, 44100 Hz, stereo: 417 bytes per frame
+FRAME = b"\xff\xfb\x90\x00" + bytes(413)
+ID3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + bytes(10)
+
+class TestM4b(unittest.TestCase):
+    """Unit tests m4b.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+        self.chapter_paths = [os.path.join(self.temp_dir.name, f"c{idx}.mp3") for idx in range(3)]
+        self.output_path = os.path.join(self.temp_dir.name, "book.m4b")
+        self.normalized = []
+        self.muxed = {}
+
+    def fake_ffmpeg_run(self, stream, **_) -> None:
+        """Record each normalize command"""
+        self.normalized.append(ffmpeg.get_args(stream))
+
+    def fake_subprocess_run(self, command:list, **_):
+        """Record the mux command with the concat list and the metadata it reads"""
+        self.muxed["command"] = command
+        self.muxed["list"] = Path(command[command.index("concat") + 4]).read_text(encoding="UTF-8")
+        metadata_path = command[command.index("ffmetadata") + 2]
+        self.muxed["ffmetadata"] = Path(metadata_path).read_text(encoding="UTF-8")
+        return m4b.subprocess.CompletedProcess(command, 0, b"", b"")
+
+    def test_concat_mode(self):
+        """Each chapter is encoded once, joined by the concat demuxer with the pauses,
+        and muxed with stream copy mapping the chapter metadata"""
+        with patch.object(m4b.ffmpeg, 'run', side_effect=self.fake_ffmpeg_run), \
+             patch.object(m4b.subprocess, 'run', side_effect=self.fake_subprocess_run):
+            m4b.generate_m4b(self.output_path, self.chapter_paths, FFMETADATA,
+                             pause_duration=2, mode=m4b.ASSEMBLY_CONCAT)
+        # the silence first, then one AAC encoding per chapter
+        self.assertEqual(len(self.normalized), 4)
+        self.assertIn("anullsrc=channel_layout=stereo:sample_rate=44100", self.normalized[0])
+        for args, chapter_path in zip(self.normalized[1:], self.chapter_paths):
+            self.assertEqual(args[args.index("-i") + 1], chapter_path)
+            self.assertEqual(args[args.index("-acodec") + 1], "aac")
+            self.assertEqual(args[args.index("-ar") + 1], str(m4b.SAMPLE_RATE))
+        entries = [line.split("/")[-1] for line in self.muxed["list"].splitlines()]
+        self.assertEqual(entries, ["0.m4a'", "silence.m4a'", "1.m4a'", "silence.m4a'", "2.m4a'"])
+        command = self.muxed["command"]
+        self.assertEqual(command[:5], ["ffmpeg", "-y", "-f", "concat", "-safe"])
+        self.assertEqual(command[-9:], ["-map", "0:a", "-map_metadata", "1",
+                                        "-c:a", "copy", "-f", "mp4", self.output_path])
+        self.assertEqual(self.muxed["ffmetadata"], FFMETADATA)
+
+    def test_metadata_file_per_call(self):
+        """Each assembly writes its metadata to a file of its own, removed at the end"""
+        metadata_paths = []
+        def record_mux(command:list, **kwargs):
+            metadata_paths.append(command[command.index("ffmetadata") + 2])
+            return self.fake_subprocess_run(command, **kwargs)
+        with patch.object(m4b.ffmpeg, 'run', side_effect=self.fake_ffmpeg_run), \
+             patch.object(m4b.subprocess, 'run', side_effect=record_mux):
+            for _ in range(2):
+                m4b.generate_m4b(self.output_path, self.chapter_paths, FFMETADATA,
+                                 mode=m4b.ASSEMBLY_CONCAT)
+        self.assertNotEqual(metadata_paths[0], metadata_paths[1])
+        self.assertFalse(any(os.path.exists(path) for path in metadata_paths))
+        self.assertNotEqual(os.path.dirname(metadata_paths[0]), "")
+
+    @patch.object(m4b, 'generate_m4b')
+    def test_generate_m4b_chapters(self, mock_generate_m4b):
+        """The chapters not saved have neither audio nor a chapter mark"""
+        m4b.generate_m4b_chapters(self.output_path, self.chapter_paths, [1.0, None, 2.0],
+                                  chapter_titles=["One", "Two", "Three"], title="Book")
+        output_path, chapter_paths, metadata = mock_generate_m4b.call_args.args
+        self.assertEqual(output_path, self.output_path)
+        self.assertEqual(chapter_paths, [self.chapter_paths[0], self.chapter_paths[2]])
+        self.assertIn("title=Book\n", metadata)
+        self.assertIn("END=3000000000\ntitle=Three\n", metadata)
+        self.assertNotIn("Two", metadata)
+
+    def test_concat_mode_error(self):
+        """A failed mux is reported with the ffmpeg stderr"""
+        failed = m4b.subprocess.CompletedProcess([], 1, b"", b"Invalid data found")
+        with patch.object(m4b.ffmpeg, 'run'), \
+             patch.object(m4b.subprocess, 'run', return_value=failed):
+            with self.assertRaises(ffmpeg.Error) as context:
+                m4b.generate_m4b(self.output_path, self.chapter_paths, FFMETADATA,
+                                 mode=m4b.ASSEMBLY_CONCAT)
+        self.assertEqual(context.exception.stderr, b"Invalid data found")
+
+    @patch.object(m4b.ffmpeg, 'run')
+    def test_concat_audio_copies_mp3_frames(self, mock_run):
+        """MP3 units are joined by their frames, without tags and without ffmpeg"""
+        for idx, chapter_path in enumerate(self.chapter_paths):
+            Path(chapter_path).write_bytes(ID3 + FRAME * (idx + 1))
+        output_path = os.path.join(self.temp_dir.name, "joined.mp3")
+        m4b.concat_audio(output_path, self.chapter_paths)
+        self.assertEqual(Path(output_path).read_bytes(), FRAME * 6)
+        mock_run.assert_not_called()
+
+    def test_joiner_keeps_order(self):
+        """Files submitted out of order are joined in order, the missing ones skipped"""
+        for idx, chapter_path in enumerate(self.chapter_paths):
+            Path(chapter_path).write_bytes(FRAME * (idx + 1))
+        output_path = os.path.join(self.temp_dir.name, "joined.mp3")
+        joiner = m4b.AudioJoiner(output_path)
+        joiner.submit(2, self.chapter_paths[2])
+        joiner.submit(1, None)
+        self.assertFalse(os.path.exists(output_path))
+        joiner.submit(0, self.chapter_paths[0])
+        joiner.finish()
+        self.assertEqual(Path(output_path).read_bytes(), FRAME * 4)
+        self.assertEqual((joiner.joined, joiner.missing), (2, 1))
+
+    def test_concat_audio_encodes_wav(self):
+        """Units of another format are encoded in MP3 by the concat demuxer"""
+        wav_paths = [os.path.splitext(path)[0] + ".wav" for path in self.chapter_paths]
+        output_path = os.path.join(self.temp_dir.name, "joined.mp3")
+        with patch.object(m4b.ffmpeg, 'run', side_effect=self.fake_ffmpeg_run):
+            m4b.concat_audio(output_path, wav_paths)
+        args = self.normalized[0]
+        self.assertEqual(args[:4], ["-f", "concat", "-safe", "0"])
+        self.assertEqual(args[-3:], ["-f", "mp3", output_path])
+
+if __name__ == "__main__":
+    unittest.main()
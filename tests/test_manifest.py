@@ -0,0 +1,73 @@
+"""
+file: test_manifest.py
+description: used to test the progress manifest of a conversion
+"""
+import sys
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import manifest #pylint: disable=C0413
+
+class TestManifest(unittest.TestCase):
+    """Unit tests manifest.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.work_dir = os.path.join(self.temp_dir.name, "book.work")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_chapter(self, name:str) -> str:
+        """Write a chapter audio file in the work directory"""
+        output_path = os.path.join(self.work_dir, name)
+        Path(output_path).write_bytes(b"audio")
+        return output_path
+
+    def test_mark_appends_a_line(self):
+        """Each mark appends one line, the lines already written are kept"""
+        job_manifest = manifest.JobManifest(self.work_dir)
+        first = self.write_chapter("c0.mp3")
+        job_manifest.mark(first, "h0", 1.0)
+        lines = Path(job_manifest.path).read_text(encoding="UTF-8").splitlines()
+        job_manifest.mark(self.write_chapter("c1.mp3"), "h1", None)
+        new_lines = Path(job_manifest.path).read_text(encoding="UTF-8").splitlines()
+        self.assertEqual(new_lines[:len(lines)], lines)
+        self.assertEqual(len(new_lines), len(lines) + 1)
+
+    def test_resume_reads_the_last_mark(self):
+        """A resumed manifest keeps the last result of each chapter"""
+        job_manifest = manifest.JobManifest(self.work_dir)
+        chapter = self.write_chapter("c0.mp3")
+        job_manifest.mark(chapter, "h0", None)
+        job_manifest.mark(chapter, "h0", 2.0)
+        resumed = manifest.JobManifest(self.work_dir, resume=True)
+        self.assertTrue(resumed.is_done(chapter, "h0"))
+        self.assertFalse(resumed.is_done(chapter, "h1"))
+        self.assertEqual(resumed.get_duration(chapter), 2.0)
+
+    def test_resume_ignores_a_cut_line(self):
+        """The line left half written by a killed run is ignored"""
+        job_manifest = manifest.JobManifest(self.work_dir)
+        first = self.write_chapter("c0.mp3")
+        job_manifest.mark(first, "h0", 1.0)
+        with open(job_manifest.path, "a", encoding="UTF-8") as manifest_file:
+            manifest_file.write('{"path": "c1.mp3", "ha')
+        resumed = manifest.JobManifest(self.work_dir, resume=True)
+        self.assertTrue(resumed.is_done(first, "h0"))
+        self.assertEqual(list(resumed.chapters), [first])
+
+    def test_new_run_starts_from_scratch(self):
+        """Without resume the chapters of a previous run are forgotten"""
+        job_manifest = manifest.JobManifest(self.work_dir)
+        chapter = self.write_chapter("c0.mp3")
+        job_manifest.mark(chapter, "h0", 1.0)
+        self.assertFalse(manifest.JobManifest(self.work_dir).is_done(chapter, "h0"))
+        self.assertFalse(manifest.JobManifest(self.work_dir, resume=True).is_done(chapter, "h0"))
+
+if __name__ == '__main__':
+    unittest.main()
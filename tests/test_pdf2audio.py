@@ -0,0 +1,147 @@
+"""
+file: test_pdf2audio.py
+description: used to test the pdf text extraction
+"""
+import sys
+import os
+import io
+import json
+import argparse
+import tempfile
+import unittest
+from unittest.mock import patch
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+import fitz #pylint: disable=C0413
+import pdf2audio #pylint: disable=C0413
+
+TITLE_EVERY = 8
+
+def make_pdf(pdf_path:str, pages:int) -> None:
+    """Write a pdf with a header, a body line and a footer per page,
+    and a title every TITLE_EVERY pages"""
+    pdf_doc = fitz.open()
+    for page_num in range(pages):
+        page = pdf_doc.new_page()
+        page.insert_text((72, 40 + page_num % 2), "Running header", fontsize=9)
+        if page_num % TITLE_EVERY == 0:
+            page.insert_text((72, 100), f"Title {page_num}", fontsize=18)
+        page.insert_text((72, 140), f"Body of page {chr(65 + page_num % 26)}{page_num}.",
+                         fontsize=11)
+        page.insert_text((72, 800), f"pag. {page_num + 1}", fontsize=9)
+    pdf_doc.save(pdf_path)
+
+class TestPdf2Audio(unittest.TestCase):
+    """Unit tests pdf2audio.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+        self.pdf_path = os.path.join(self.temp_dir.name, "doc.pdf")
+        self.pages = 2 * pdf2audio.PAGES_PER_SHARD + 3
+        make_pdf(self.pdf_path, self.pages)
+
+    def test_sharded_extraction_in_page_order(self):
+        """Page ranges extracted by many workers are merged back in page order"""
+        with fitz.open(self.pdf_path) as pdf_doc:
+            serial = list(pdf2audio.iter_spans(pdf_doc, max_workers=1))
+            sharded = list(pdf2audio.iter_spans(pdf_doc, max_workers=3))
+        self.assertEqual(sharded, serial)
+        titles = (self.pages + TITLE_EVERY - 1) // TITLE_EVERY
+        self.assertEqual(len(serial), self.pages + titles)
+        self.assertEqual(serial[-1][2], f"Body of page {chr(65 + (self.pages - 1) % 26)}"
+                                        f"{self.pages - 1}.")
+
+    def test_repeated_lines_detected(self):
+        """Running headers and page numbers are found, titles and body lines are kept"""
+        with fitz.open(self.pdf_path) as pdf_doc:
+            spans = list(pdf2audio.iter_spans(pdf_doc, skip_repeated_lines=False))
+            self.assertEqual(len(spans), 3 * self.pages + (self.pages + TITLE_EVERY - 1)
+                             // TITLE_EVERY)
+            pages = list(pdf2audio.iter_pages(pdf_doc))
+        repeated = pdf2audio.find_repeated_lines(pages)
+        self.assertEqual(len(repeated), 2)
+
+    def test_runs_in_span_store(self):
+        """Runs keep their own font, headers are dropped, font names are interned"""
+        with fitz.open(self.pdf_path) as pdf_doc:
+            store = pdf2audio.get_chapter_text(pdf_doc, pattern_header=r"Title 8$")
+        self.assertEqual(store.font_names, ["Helvetica"])
+        bodies = [f"Body of page {chr(65 + idx)}{idx}." for idx in range(16)]
+        self.assertEqual(list(store.iter_runs())[:4],
+                         [("Helvetica", 18.0, "Title 0"),
+                          ("Helvetica", 11.0, "".join(bodies[:8])),
+                          ("Helvetica", 11.0, "".join(bodies[8:])),
+                          ("Helvetica", 18.0, "Title 16")])
+
+    def test_chapters_from_fonts_and_toc(self):
+        """Chapters start at the larger titles, or at the outline entries when present"""
+        with fitz.open(self.pdf_path) as pdf_doc:
+            store = pdf2audio.cluster_text(pdf2audio.get_chapter_text(pdf_doc),
+                                           pdf2audio.get_fonts(pdf_doc))
+        chapters = pdf2audio.get_chapters(store)
+        self.assertEqual([title for title, _ in chapters],
+                         [f"Title {idx}" for idx in range(0, self.pages, TITLE_EVERY)])
+        self.assertTrue(chapters[1][1].startswith("Title 8 Body of page I8."))
+        toc = [[1, "Intro", 1], [2, "Detail", 2], [1, "Title  16", 17], [1, "Last", 25]]
+        chapters = pdf2audio.get_chapters(store, toc)
+        self.assertEqual([title for title, _ in chapters], ["Intro", "Title  16", "Last"])
+        self.assertTrue(chapters[1][1].startswith("Title 16 "))
+        self.assertTrue(chapters[2][1].startswith("Title 24 "))
+
+    @patch.object(pdf2audio.m4b, 'generate_m4b_chapters')
+    @patch.object(pdf2audio.scheduler, 'synthesize_chapters')
+    def test_convert_closes_document(self, mock_synthesize, mock_generate):
+        """The document is closed before its chapters are synthesized"""
+        opened = []
+        fitz_open = fitz.open
+        def record_open(*open_args):
+            opened.append(fitz_open(*open_args))
+            return opened[-1]
+        def synthesize(jobs, **_):
+            self.assertTrue(opened[0].is_closed)
+            return [1.0] * len(jobs)
+        mock_synthesize.side_effect = synthesize
+        args = argparse.Namespace(file=self.pdf_path, jobs=1, language="it", debug_dump=False,
+                                  output_path=os.path.join(self.temp_dir.name, "doc.m4b"),
+                                  assembly=pdf2audio.m4b.ASSEMBLY_FILTER)
+        with patch.object(pdf2audio.fitz, 'open', side_effect=record_open):
+            pdf2audio.convert(args)
+        self.assertTrue(opened[0].is_closed)
+        mock_generate.assert_called_once()
+
+    @patch.object(fitz.Document, 'extract_font')
+    def test_font_families_from_dictionary(self, mock_extract_font):
+        """Family names come from the font dictionary, without decompiling fonts"""
+        pdf_doc = fitz.open()
+        for fontname in ("tiro", "hebo", "helv"):
+            pdf_doc.new_page().insert_text((72, 72), "text", fontname=fontname)
+        self.assertEqual(pdf2audio.get_fonts(pdf_doc),
+                         {"Times-Roman": {"family-name": "times"},
+                          "Helvetica-Bold": {"family-name": "helvetica"},
+                          "Helvetica": {"family-name": "helvetica"}})
+        self.assertEqual(pdf2audio.get_font_family(pdf_doc, 0, "ABCDEF+Helvetica-Bold"),
+                         "helvetica")
+        mock_extract_font.assert_not_called()
+
+    def test_cluster_and_dump(self):
+        """Consecutive runs with the same size and font family are merged,
+        the dump is valid JSON"""
+        store = pdf2audio.SpanStore()
+        for font_name, size, text in (("A", 10, "a"), ("A", 10, "b"), ("B", 12, "c"),
+                                      ("A", 10, "d"), ("A-Bold", 10, "e"), ("C", 10, "f")):
+            store.append(font_name, size, text)
+        self.assertEqual(list(pdf2audio.cluster_text(store, {}).iter_texts()),
+                         ["a b", "c", "d", "e", "f"])
+        fonts = {"A": {"family-name": "a"}, "A-Bold": {"family-name": "a"}}
+        clustered = pdf2audio.cluster_text(store, fonts)
+        self.assertEqual(list(clustered.iter_texts()), ["a b", "c", "d e", "f"])
+        self.assertEqual(pdf2audio.get_chapters(clustered), [("a b", "a b"), ("c", "c d e f")])
+        out_file = io.StringIO()
+        pdf2audio.dump_span_store(clustered, out_file)
+        self.assertEqual(json.loads(out_file.getvalue())[1],
+                         {"txt": "c", "font": "B", "size": 12.0, "page": 0})
+
+if __name__ == '__main__':
+    unittest.main()
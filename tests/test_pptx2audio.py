@@ -0,0 +1,67 @@
+"""
+file: test_pptx2audio.py
+description: used to test the per slide conversion of presentations
+"""
+import sys
+import os
+import argparse
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+import pptx #pylint: disable=C0413
+from backend_audio import m4b, audio_probe #pylint: disable=C0413
+import pptx2audio #pylint: disable=C0413
+
+def make_pptx(pptx_path:str) -> None:
+    """Write a presentation with a titled slide with notes and an untitled one"""
+    presentation = pptx.Presentation()
+    first = presentation.slides.add_slide(presentation.slide_layouts[1])
+    first.shapes.title.text = "Intro"
+    first.placeholders[1].text = "Body"
+    first.notes_slide.notes_text_frame.text = "Say hello"
+    presentation.slides.add_slide(presentation.slide_layouts[6])
+    presentation.save(pptx_path)
+
+def fake_generate_audio(text_in:str, out_mp3_path:str, **_) -> bool:
+    """Save the text in place of the audio"""
+    Path(out_mp3_path).write_text(text_in, encoding="UTF-8")
+    return True
+
+class TestPptx2Audio(unittest.TestCase):
+    """Unit tests pptx2audio.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+        self.pptx_path = os.path.join(self.temp_dir.name, "deck.pptx")
+        make_pptx(self.pptx_path)
+
+    def test_extract_slides_with_notes(self):
+        """Each slide has its title, or its number, and its speaker notes"""
+        self.assertEqual(pptx2audio.extract_slides(self.pptx_path, "en"),
+                         [("Intro", "slide number:  0\nIntroBody\nNote:\nSay hello"),
+                          ("slide number: 1", "slide number:  1\n")])
+
+    @patch.object(pptx2audio, 'BACK_END_TTS', "GTTS")
+    @patch.object(audio_probe, 'get_duration', side_effect=lambda path: 2.0)
+    @patch.object(m4b, 'generate_audio', side_effect=fake_generate_audio)
+    @patch.object(m4b, 'generate_m4b')
+    def test_chapter_per_slide(self, mock_m4b, mock_generate, _):
+        """Every slide is synthesized on its own and becomes a chapter"""
+        args = argparse.Namespace(file=self.pptx_path, language="en", jobs=2, resume=False,
+                                  assembly=m4b.ASSEMBLY_CONCAT,
+                                  output_path=os.path.join(self.temp_dir.name, "deck.m4b"))
+        pptx2audio.convert(args)
+        self.assertEqual(mock_generate.call_count, 2)
+        _, chapter_paths, metadata = mock_m4b.call_args.args
+        self.assertEqual([os.path.basename(path) for path in chapter_paths],
+                         ["s0.mp3", "s1.mp3"])
+        self.assertIn("title=Intro", metadata)
+        self.assertIn("title=slide number: 1", metadata)
+
+if __name__ == '__main__':
+    unittest.main()
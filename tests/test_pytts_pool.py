@@ -0,0 +1,60 @@
+"""
+file: test_pytts_pool.py
+description: used to test the pool of long-lived TTS worker processes
+"""
+import sys
+import os
+import time
+import unittest
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import pytts_pool #pylint: disable=C0413
+
+engine_inits = 0 #pylint: disable=C0103
+
+def fake_init() -> None:
+    """Count the engine initializations of the process"""
+    global engine_inits #pylint: disable=W0603
+    engine_inits += 1
+
+def fake_job(text_in:str) -> tuple:
+    """Hang on 'hung', fail on 'broken', else report the process and its engine inits"""
+    if text_in == "hung":
+        time.sleep(30)
+    if text_in == "broken":
+        raise ValueError(text_in)
+    return text_in, os.getpid(), engine_inits
+
+class TestPyttsPool(unittest.TestCase):
+    """Unit tests pytts_pool.py"""
+    def test_engine_initialized_once_per_process(self):
+        """Every job of a process reuses the engine initialized at its start"""
+        pool = pytts_pool.PyttsWorkerPool(2, initializer=fake_init)
+        try:
+            results = [future.result(timeout=10)
+                       for future in [pool.submit(fake_job, str(idx)) for idx in range(8)]]
+        finally:
+            pool.shutdown()
+        self.assertEqual([text for text, _, _ in results], [str(idx) for idx in range(8)])
+        self.assertLessEqual(len({pid for _, pid, _ in results}), 2)
+        self.assertEqual({inits for _, _, inits in results}, {1})
+
+    def test_hung_engine_is_replaced(self):
+        """A hung job fails with TimeoutError while the other jobs are completed"""
+        pool = pytts_pool.PyttsWorkerPool(1, timeout=1, initializer=fake_init)
+        start = time.monotonic()
+        try:
+            futures = [pool.submit(fake_job, text) for text in ("hung", "broken", "after")]
+            with self.assertRaises(TimeoutError):
+                futures[0].result(timeout=10)
+            with self.assertRaises(ValueError):
+                futures[1].result(timeout=10)
+            self.assertEqual(futures[2].result(timeout=10)[0], "after")
+        finally:
+            pool.shutdown()
+        self.assertLess(time.monotonic() - start, 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+file: test_scheduler.py
+description: used to test the concurrent chapter synthesis
+"""
+import sys
+import os
+import time
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+from backend_audio import m4b, scheduler, manifest, audio_probe, backends #pylint: disable=C0413
+
+def fake_generate_audio(text_in:str, out_mp3_path:str, **_) -> bool:
+    """Slow down the first chapters so they finish last"""
+    time.sleep(0.05 / len(os.path.basename(out_mp3_path)))
+    if len(text_in.strip()) == 0:
+        return False
+    Path(out_mp3_path).write_text(text_in, encoding="UTF-8")
+    return True
+
+@patch.object(audio_probe, 'get_duration', side_effect=lambda path: os.path.getsize(path) * 1.0)
+class TestScheduler(unittest.TestCase):
+    """Unit tests scheduler.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.work_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @patch.object(m4b, 'generate_audio', side_effect=fake_generate_audio)
+    def test_results_keep_chapter_order(self, mock_generate, _):
+        """Durations are returned in the same order of the jobs"""
+        jobs = [("a", "a"), ("", "bb"), ("ccc", "ccc"), ("dddd", "dddd")]
+        jobs = [(text, os.path.join(self.work_dir, name)) for text, name in jobs]
+        results = scheduler.synthesize_chapters(jobs, backend="GTTS", max_workers=4)
+        self.assertEqual(results, [1.0, None, 3.0, 4.0])
+        self.assertEqual(mock_generate.call_count, len(jobs))
+
+    @patch.object(m4b, 'generate_audio', side_effect=fake_generate_audio)
+    def test_single_worker_is_serial(self, mock_generate, _):
+        """With one worker the chapters are generated in the caller process"""
+        jobs = [("text", os.path.join(self.work_dir, "a")),
+                ("text", os.path.join(self.work_dir, "b"))]
+        results = scheduler.synthesize_chapters(jobs, backend="PYTTS", max_workers=1)
+        self.assertEqual(results, [4.0, 4.0])
+        mock_generate.assert_called_with("text", jobs[1][1], lang="it", backend="PYTTS")
+
+    @patch.object(m4b, 'generate_audio', side_effect=fake_generate_audio)
+    def test_resume_skips_finished_chapters(self, mock_generate, _):
+        """A resumed run synthesizes only the chapters not finished or changed"""
+        jobs = [("one", os.path.join(self.work_dir, "c0.mp3")),
+                ("two", os.path.join(self.work_dir, "c1.mp3"))]
+        scheduler.synthesize_chapters(jobs, backend="GTTS", max_workers=1,
+                                      manifest=manifest.JobManifest(self.work_dir))
+        jobs[1] = ("two changed", jobs[1][1])
+        results = scheduler.synthesize_chapters(jobs, backend="GTTS", max_workers=1,
+                                    manifest=manifest.JobManifest(self.work_dir, resume=True))
+        self.assertEqual(results, [3.0, 11.0])
+        self.assertEqual(mock_generate.call_count, 3)
+        mock_generate.assert_called_with("two changed", jobs[1][1], lang="it", backend="GTTS")
+
+    @patch.object(m4b, 'generate_audio', side_effect=fake_generate_audio)
+    def test_stream_overlaps_extraction(self, mock_generate, _):
+        """Synthesis starts before the last chapter is extracted, within the queue bound"""
+        finished, ahead = [], []
+        def iter_jobs():
+            for idx in range(6):
+                ahead.append(idx - len(finished))
+                yield "x" * (idx + 1), os.path.join(self.work_dir, f"c{idx}")
+        results = scheduler.synthesize_stream(iter_jobs(), backend="GTTS",
+                                              max_workers=2, max_queued=2,
+                                              on_done=lambda idx, done: finished.append(idx))
+        self.assertEqual(results, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(sorted(finished), list(range(6)))
+        self.assertEqual(mock_generate.call_count, 6)
+        self.assertLessEqual(max(ahead), 2)
+
+    @patch.object(m4b, 'generate_audio', side_effect=fake_generate_audio)
+    @patch.object(scheduler, 'create_executor')
+    def test_short_stream_starts_no_pool(self, mock_create, mock_generate, _):
+        """A stream of one chapter is synthesized in the caller, whatever max_workers"""
+        pytts = backends.get_backend("PYTTS")
+        jobs = [("one", os.path.join(self.work_dir, "c0.wav"))]
+        with patch.object(pytts, 'capabilities', pytts.capabilities._replace(max_concurrency=4)):
+            results = scheduler.synthesize_stream(iter(jobs), backend="PYTTS", max_workers=4)
+        self.assertEqual(results, [3.0])
+        mock_create.assert_not_called()
+        mock_generate.assert_called_once()
+
+    @patch.object(m4b, 'generate_audio')
+    def test_failed_chapter_not_saved(self, mock_generate, _):
+        """A chapter raising in its worker is reported as not saved, the others go on"""
+        def failing_generate_audio(text_in:str, out_mp3_path:str, **kwargs) -> bool:
+            if text_in == "bad":
+                raise RuntimeError("TTS worker process exited")
+            return fake_generate_audio(text_in, out_mp3_path, **kwargs)
+        mock_generate.side_effect = failing_generate_audio
+        jobs = [(text, os.path.join(self.work_dir, name))
+                for text, name in (("a", "a"), ("bad", "bb"), ("ccc", "ccc"))]
+        with self.assertLogs(scheduler.logger, "ERROR"):
+            results = scheduler.synthesize_stream(iter(jobs), backend="GTTS", max_workers=3)
+        self.assertEqual(results, [1.0, None, 3.0])
+
+    @patch.object(m4b, 'generate_audio')
+    def test_cancel_drops_pending_chapters(self, mock_generate, _):
+        """A cancelled conversion stops submitting and leaves the shared pool"""
+        started, release, errors = threading.Event(), threading.Event(), []
+        def blocked_generate_audio(*_, **__) -> bool:
+            started.set()
+            release.wait(5)
+            return False
+        mock_generate.side_effect = blocked_generate_audio
+        jobs = [("text", os.path.join(self.work_dir, f"c{idx}")) for idx in range(5)]
+        token = scheduler.CancelToken()
+        def convert():
+            with scheduler.cancel_scope(token):
+                try:
+                    scheduler.synthesize_chapters(jobs, backend="GTTS", max_workers=4)
+                except scheduler.Cancelled as ex:
+                    errors.append(ex)
+        with scheduler.shared_pool("GTTS", 1):
+            thread = threading.Thread(target=convert)
+            thread.start()
+            self.assertTrue(started.wait(5))
+            token.cancel()
+            release.set()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+        mock_generate.assert_called_once()
+
+if __name__ == "__main__":
+    unittest.main()
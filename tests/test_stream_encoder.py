@@ -0,0 +1,142 @@
+"""
+file: test_stream_encoder.py
+description: used to test the streaming audiobook encoder, with ffmpeg mocked
+"""
+import sys
+import os
+import io
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, src_path)
+
+import ffmpeg #pylint: disable=C0413
+from backend_audio import m4b, stream_encoder #pylint: disable=C0413
+
+class RecordingPipe(io.BytesIO):
+    """A stdin pipe keeping what was written after it is closed"""
+    def close(self) -> None:
+        self.written = self.getvalue() #pylint: disable=W0201
+        super().close()
+
+class FakeProcess: #pylint: disable=R0903
+    """An ffmpeg process with its pipes in memory"""
+    def __init__(self, stdout:bytes=b"", stderr:bytes=b"", returncode:int=0):
+        self.stdin = RecordingPipe()
+        self.stdout = io.BytesIO(stdout)
+        self.stderr = io.BytesIO(stderr)
+        self.returncode = returncode
+
+    def wait(self) -> int:
+        """Return the exit code"""
+        return self.returncode
+
+class FakeStream:
+    """An ffmpeg-python stream: every call of the chain returns it, run_async its process"""
+    def __init__(self, process:FakeProcess):
+        self.process = process
+
+    def output(self, *_, **__) -> "FakeStream":
+        """Chain the call"""
+        return self
+
+    global_args = overwrite_output = output
+
+    def run_async(self, **_) -> FakeProcess:
+        """Start the process"""
+        return self.process
+
+def pcm(samples:int, value:int=1) -> bytes:
+    """Stereo PCM of the given number of samples"""
+    return bytes([value]) * samples * stream_encoder.FRAME_SIZE
+
+class TestStreamEncoder(unittest.TestCase):
+    """Unit tests stream_encoder.py"""
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory() #pylint: disable=R1732
+        self.addCleanup(self.temp_dir.cleanup)
+        self.output_path = os.path.join(self.temp_dir.name, "book.m4b")
+        self.encoder_process = FakeProcess()
+        self.decoders = {}
+        patcher = patch.object(stream_encoder.ffmpeg, 'input', side_effect=self.fake_input)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_input(self, path:str, **_) -> FakeStream:
+        """The encoder reads the pipe, each decoder a chapter"""
+        if path == 'pipe:':
+            Path(self.output_path + ".part.m4a").write_bytes(b"")
+            return FakeStream(self.encoder_process)
+        return FakeStream(self.decoders[path])
+
+    def add_chapter(self, name:str, process:FakeProcess) -> str:
+        """Create a chapter audio file decoded by process"""
+        path = os.path.join(self.temp_dir.name, name)
+        Path(path).write_bytes(b"mp3")
+        self.decoders[path] = process
+        return path
+
+    @patch.object(m4b, 'mux_ffmetadata')
+    def test_chapters_encoded_in_order(self, mock_mux):
+        """Chapters finished out of order are piped in order, across many on_done callbacks"""
+        first = self.add_chapter("a.mp3", FakeProcess(pcm(100, 1)))
+        second = self.add_chapter("b.mp3", FakeProcess(pcm(50, 2)))
+        third = self.add_chapter("c.mp3", FakeProcess(pcm(20, 3)))
+        encoder = stream_encoder.M4bStreamEncoder(self.output_path)
+        on_done = encoder.get_on_done([first, second])
+        on_done_next = encoder.get_on_done([third])
+        on_done_next(0, True)
+        on_done(1, True)
+        on_done(0, True)
+        encoder.finish(author="Author", title="Title")
+        self.assertEqual(self.encoder_process.stdin.written,
+                         pcm(100, 1) + pcm(50, 2) + pcm(20, 3))
+        self.assertEqual(encoder.chapter_paths, [first, second, third])
+        self.assertEqual(encoder.get_durations(),
+                         [samples / m4b.SAMPLE_RATE for samples in (100, 50, 20)])
+        self.assertFalse(any(os.path.exists(path) for path in (first, second, third)))
+        self.assertFalse(os.path.exists(self.output_path + ".part.m4a"))
+        self.assertEqual(mock_mux.call_args.args[2], self.output_path)
+
+    @patch.object(m4b, 'mux_ffmetadata')
+    def test_keep_chapters(self, mock_mux):
+        """Chapters are kept for a later resume and the failed ones are skipped"""
+        first = self.add_chapter("a.mp3", FakeProcess(pcm(10)))
+        encoder = stream_encoder.M4bStreamEncoder(self.output_path, remove_chapters=False)
+        on_done = encoder.get_on_done([first, "missing.mp3"])
+        on_done(1, False)
+        on_done(0, True)
+        encoder.finish()
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(encoder.chapter_paths, [first])
+        mock_mux.assert_called_once()
+
+    @patch.object(m4b, 'mux_ffmetadata')
+    def test_decoder_error(self, mock_mux):
+        """A chapter failing to decode is raised by finish with the ffmpeg stderr"""
+        broken = self.add_chapter("a.mp3", FakeProcess(stderr=b"Invalid data found",
+                                                       returncode=1))
+        encoder = stream_encoder.M4bStreamEncoder(self.output_path)
+        encoder.submit(0, broken)
+        with self.assertRaises(ffmpeg.Error) as context:
+            encoder.finish()
+        self.assertEqual(context.exception.stderr, b"Invalid data found")
+        self.assertTrue(os.path.exists(broken))
+        mock_mux.assert_not_called()
+
+    @patch.object(m4b, 'mux_ffmetadata')
+    def test_encoder_error(self, mock_mux):
+        """A failed encoder is raised by finish with the ffmpeg stderr"""
+        self.encoder_process = FakeProcess(stderr=b"Unknown encoder", returncode=1)
+        encoder = stream_encoder.M4bStreamEncoder(self.output_path)
+        encoder.submit(0, self.add_chapter("a.mp3", FakeProcess(pcm(10))))
+        with self.assertRaises(ffmpeg.Error) as context:
+            encoder.finish()
+        self.assertEqual(context.exception.stderr, b"Unknown encoder")
+        mock_mux.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,15 +4,36 @@ description: used to test txt conversion
 """
 import sys
 import os
+import argparse
+import tempfile
 import unittest
+import wave
 from unittest.mock import patch
 from pathlib import Path
 
 src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, src_path)
 
+from backend_audio import m4b, audio_probe, backends #pylint: disable=C0413
 import txt2audio #pylint: disable=C0413
 
+def fake_generate_audio(text_in:str, out_mp3_path:str, **_) -> bool:
+    """Save the text in place of the audio"""
+    Path(out_mp3_path).write_text(text_in, encoding="UTF-8")
+    return True
+
+def fake_save_to_file(_text:str, out_path:str) -> None:
+    """Save a short WAV audio, as pyttsx3 does"""
+    with wave.Wave_write(out_path) as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(22050)
+        wav_file.writeframes(bytes(4410))
+
+def fake_ffmpeg_run(stream, **_) -> None:
+    """Write the output file of an ffmpeg command"""
+    Path(stream.get_args()[-1]).write_bytes(b"mp3")
+
 class TestTxt2Audio(unittest.TestCase):
     """Unit tests txt2audio.py"""
     def setUp(self):
@@ -23,16 +44,22 @@ class TestTxt2Audio(unittest.TestCase):
         Path('./hi.mp3').unlink(missing_ok=True)
 
     @patch.object(txt2audio, 'BACK_END_TTS', 'PYTTS')
-    @patch.object(sys, 'argv', ['txt2audio.py', 'hi.txt'])
+    @patch.object(sys, 'argv', ['txt2audio.py', 'hi.txt', '--no-cache'])
+    @patch.object(m4b.ffmpeg, 'run', side_effect=fake_ffmpeg_run)
     @patch('pyttsx3.init')
-    def test_audio_generate_mp3_pytts(self, mock_init):
+    def test_audio_generate_mp3_pytts(self, mock_init, _):
         """Generate an example mp3 file and look for it using PYTTS"""
         mock_engine = mock_init()
-        txt2audio.main()
+        mock_engine.save_to_file.side_effect = fake_save_to_file
+        pytts = backends.get_backend("PYTTS")
+        # as on a machine with many cores: a one-line text starts no worker process
+        with patch.object(pytts, 'capabilities', pytts.capabilities._replace(max_concurrency=4)):
+            txt2audio.main()
         path_script = os.path.dirname(txt2audio.__file__)
         mp3 = os.path.join(path_script, 'hi.mp3')
-        mock_engine.save_to_file.assert_called_with('hi', mp3)
         mock_engine.runAndWait.assert_called()
+        self.assertTrue(Path(mp3).is_file())
+        self.assertFalse(os.path.isdir(os.path.join(path_script, 'hi.work')))
 
     @patch.object(txt2audio, 'BACK_END_TTS', 'EDGE_TTS')
     @patch.object(sys, 'argv', ['txt2audio.py', 'hi.txt'])
@@ -56,5 +83,58 @@ class TestTxt2Audio(unittest.TestCase):
         with self.assertRaises(FileNotFoundError):
             txt2audio.main()
 
+    @patch.object(txt2audio, 'BACK_END_TTS', 'GTTS')
+    @patch.object(audio_probe, 'get_duration', side_effect=lambda path: 1.0)
+    @patch.object(m4b, 'generate_audio', side_effect=fake_generate_audio)
+    @patch.object(audio_probe, 'iter_audio_frames', side_effect=lambda data: [data + b"|"])
+    def test_large_text_units_joined_in_order(self, _, mock_generate, __):
+        """A long text is synthesized in units, joined in reading order"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text_path = os.path.join(temp_dir, "long.txt")
+            paragraphs = [f"Paragraph {idx}. " + "words " * 100 for idx in range(20)]
+            Path(text_path).write_text("\n\n".join(paragraphs), encoding="UTF-8")
+            args = argparse.Namespace(file=text_path, language="it", jobs=4, resume=False,
+                                      output_path=os.path.join(temp_dir, "long.mp3"))
+            txt2audio.convert(args)
+            unit_texts = Path(args.output_path).read_text(encoding="UTF-8").split("|")[:-1]
+            self.assertGreater(mock_generate.call_count, 2)
+            self.assertEqual(len(unit_texts), mock_generate.call_count)
+            max_chars = backends.get_backend("GTTS").capabilities.max_chars
+            self.assertTrue(all(len(unit) <= max_chars for unit in unit_texts))
+            self.assertEqual(" ".join(unit_texts).split(), " ".join(paragraphs).split())
+            self.assertFalse(os.path.isdir(os.path.join(temp_dir, "long.work")))
+
+    @patch.object(txt2audio, 'BACK_END_TTS', 'GTTS')
+    @patch.object(audio_probe, 'get_duration', side_effect=lambda path: 1.0)
+    @patch.object(audio_probe, 'iter_audio_frames', side_effect=lambda data: [data])
+    def test_failed_unit_keeps_work_dir(self, *_):
+        """A unit not saved leaves its work directory for --resume"""
+        def generate_audio(text_in:str, out_mp3_path:str, **_) -> bool:
+            return "Paragraph 1." not in text_in and fake_generate_audio(text_in, out_mp3_path)
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             patch.object(m4b, 'generate_audio', side_effect=generate_audio):
+            text_path = os.path.join(temp_dir, "long.txt")
+            paragraphs = [f"Paragraph {idx}. " + "words " * 100 for idx in range(3)]
+            Path(text_path).write_text("\n\n".join(paragraphs), encoding="UTF-8")
+            args = argparse.Namespace(file=text_path, language="it", jobs=1, resume=False,
+                                      output_path=os.path.join(temp_dir, "long.mp3"))
+            with self.assertLogs(txt2audio.logger, "ERROR"):
+                txt2audio.convert(args)
+            self.assertNotIn("Paragraph 1.", Path(args.output_path).read_text(encoding="UTF-8"))
+            self.assertTrue(os.path.isdir(os.path.join(temp_dir, "long.work")))
+
+    @patch.object(txt2audio, 'BACK_END_TTS', 'GTTS')
+    @patch.object(m4b, 'generate_audio', return_value=False)
+    def test_no_unit_saved(self, _):
+        """Without any unit saved the conversion fails and writes no output"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text_path = os.path.join(temp_dir, "long.txt")
+            Path(text_path).write_text("one\n\n" * 1000, encoding="UTF-8")
+            args = argparse.Namespace(file=text_path, language="it", jobs=1, resume=False,
+                                      output_path=os.path.join(temp_dir, "long.mp3"))
+            with self.assertRaises(RuntimeError):
+                txt2audio.convert(args)
+            self.assertEqual(sorted(os.listdir(temp_dir)), ["long.txt", "long.work"])
+
 if __name__ == "__main__":
     unittest.main()
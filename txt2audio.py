@@ -8,11 +8,13 @@ Usage example:
     `python txt2audio.py document.txt`
 """
 
-import sys
+from typing import Iterator, Tuple
+import argparse
+import itertools
 import os
+import shutil
 import logging
-import asyncio
-from backend_audio import m4b
+from backend_audio import backends, chunker, m4b, manifest, scheduler
 from frontend import input_tool
 
 logging.basicConfig(level=logging.ERROR)
@@ -22,28 +24,72 @@ BACK_END_TTS = m4b.get_back_end_tts()
 
 LANGUAGE = "it"
 
+def get_unit_path(work_dir:str, idx:int, audio_ext:str=".mp3") -> str:
+    """Get the path of the audio file of a text unit in the work directory."""
+    return os.path.join(work_dir, f"u{idx}{audio_ext}")
+
+def iter_unit_jobs(units:Iterator[str], work_dir:str,
+                   audio_ext:str=".mp3") -> Iterator[Tuple[str, str]]:
+    """Pair each text unit with the path of its audio file, lazily.
+
+    Arguments:
+        units: The text units in reading order.
+        work_dir: The directory where the units audio files are saved.
+        audio_ext: The extension of the audio files, as m4b.get_audio_ext.
+
+    Yields:
+        A (unit text, output audio path) job for each unit.
+    """
+    for idx, unit in enumerate(units):
+        yield unit, get_unit_path(work_dir, idx, audio_ext)
+
+def convert(args:argparse.Namespace) -> None:
+    """Convert a txt file to audio, the TTS backend must be already initialized.
+    The file is read block by block and cut in units as long as the longest request of
+    the TTS engine, synthesized concurrently and joined in order as soon as they finish:
+    only the units in flight are held in memory.
+    If some unit is not saved, the work directory is kept to complete it with --resume.
+
+    Arguments:
+        args: The options supplied by the user, `file` and `output_path` included.
+    """
+    audio_ext = m4b.get_audio_ext(BACK_END_TTS)
+    max_chars = backends.get_backend(BACK_END_TTS).capabilities.max_chars
+    with open(args.file, "r", encoding="UTF-8") as file:
+        units = chunker.iter_file_chunks(file, max_chars)
+        first_units = list(itertools.islice(units, 2))
+        if len(first_units) < 2 and audio_ext == ".mp3":
+            # a short text is synthesized straight into the output file,
+            # unless the engine writes another format, encoded by the joiner
+            scheduler.synthesize_chapters([("".join(first_units), args.output_path)],
+                                          lang=args.language, backend=BACK_END_TTS,
+                                          max_workers=args.jobs)
+            return
+        work_dir = manifest.get_work_dir(args.output_path)
+        job_manifest = manifest.JobManifest(work_dir, resume=args.resume)
+        joiner = m4b.AudioJoiner(args.output_path, copy_frames=audio_ext == ".mp3")
+        def on_done(idx:int, done:bool) -> None:
+            joiner.submit(idx, get_unit_path(work_dir, idx, audio_ext) if done else None)
+        jobs = iter_unit_jobs(itertools.chain(first_units, units), work_dir, audio_ext)
+        scheduler.synthesize_stream(jobs, lang=args.language, backend=BACK_END_TTS,
+                                    max_workers=args.jobs, manifest=job_manifest,
+                                    on_done=on_done, keep_results=False)
+    joiner.finish()
+    if joiner.joined == 0:
+        raise RuntimeError(f"no unit of {args.file} was saved, the work directory "
+                           f"{work_dir} is kept: run again with --resume")
+    if joiner.missing > 0:
+        logger.error("%d of %d units not saved, the work directory %s is kept: "
+                     "run again with --resume", joiner.missing,
+                     joiner.joined + joiner.missing, work_dir)
+        return
+    logger.info("joined %d units", joiner.joined)
+    shutil.rmtree(work_dir)
+
 def main():
     """main function"""
-    _, output_file_path, language = input_tool.get_sys_input(os.path.dirname(__file__),
-                                                   format_output="mp3")
-    text:str = ""
-    with open(sys.argv[1], "r", encoding="UTF-8") as file:
-        text = ''.join(file.readlines())
-
-    m4b.init(BACK_END_TTS)
-    if BACK_END_TTS == "PYTTS":
-        m4b.generate_audio_pytts(text, output_file_path, lang=language)
-    else:
-        loop = asyncio.get_event_loop_policy().get_event_loop()
-        try:
-            voices = loop.run_until_complete(m4b.get_voices_edge_tts(lang=language))
-            voice = voices[0]["Name"]
-            loop.run_until_complete(m4b.generate_audio_edge_tts(text, output_file_path,
-                                                                lang="it-IT", voice=voice))
-        finally:
-            loop.close()
-    #metadata_output = ffmetadata_generator.generate_ffmetadata(audio_paths)
-    #generate_m4b(output_file_path, chapters, metada_output, chapter_metadata=ch_metadatas)
+    args = input_tool.get_sys_args(os.path.dirname(__file__), format_output="mp3")
+    m4b.run_converter(BACK_END_TTS, convert, args)
 
 
 if __name__ == "__main__":